@@ -0,0 +1,328 @@
+"""
+End-to-end latency of scripted sales calls.
+
+Each call is a SalesAgent playing a VideoQueue through its AsyncMediaPlayer
+while a script of interruptions is spoken over the pitch. Nothing leaves the
+machine:
+
+- OBS is FakeOBSWebSocketServer, whose clips "play" for a fixed time;
+- answers render through TalksClient and StreamingDownload against
+  FakeTalksServer, which takes `render_delay` seconds per talk;
+- the LLM is FakeChatModel, streaming a scripted answer word by word;
+- embeddings are FakeEmbeddings.
+
+Reported as p50/p95/p99, in milliseconds:
+
+- interrupt_to_transition_ms: interruption heard to its transition on screen
+- interrupt_to_answer_ms: interruption heard to the first answer clip on screen
+- clip_gap_ms: end of one clip to the start of the next
+- prompt_build_ms: building the agent's system prompt
+- cold_start_ms: importing the agent module and constructing a SalesAgent
+
+Every percentile is compared with benchmarks/baselines.json. One that is
+slower than its baseline by more than the tolerance fails the run.
+
+Usage:
+    python -m benchmarks.latency [--calls 4] [--interruptions 3] [--json]
+    python -m benchmarks.latency --update-baseline
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+from src.interrupt.classifier import InterruptClassifier
+from src.memory.embeddings import CachedEmbeddings
+from src.memory.memory_service import MemoryService
+from src.utils.logger import configure
+from src.utils.metrics import LatencyStats
+from src.utils.startup import measure
+from src.video.obs_async import AsyncOBSClient
+from src.voice.download import StreamingDownload
+from src.voice.talks_client import TalksClient
+from src.voice.text_to_video import DEFAULT_SOURCE_URL
+from tests.fakes.embeddings import FakeEmbeddings
+from tests.fakes.llm import FakeChatModel
+from tests.fakes.obs import FakeOBS
+from tests.fakes.obs_server import FakeOBSWebSocketServer
+from tests.fakes.talks_server import FakeTalksServer
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+METRICS = ('interrupt_to_transition_ms', 'interrupt_to_answer_ms', 'clip_gap_ms', 'prompt_build_ms', 'cold_start_ms')
+PERCENTILES = ('p50', 'p95', 'p99')
+
+# A percentile regresses when it exceeds baseline * (1 + TOLERANCE) + SLACK_MS
+TOLERANCE = 0.5
+SLACK_MS = 10.0
+
+BASE_CLIPS = ('base1.mp4', 'base2.mp4', 'base3.mp4')
+TRANSITIONS = ('transition1.mp4', 'transition2.mp4', 'transition3.mp4', 'transition4.mp4', 'transition4_1.mp4')
+
+# What the prospect says, and the keyword FakeChatModel answers it by
+SCRIPT = [
+    ('how much is it', 'how much',
+     'It is fifty dollars a month per seat. Annual plans get two months free.'),
+    ('does it integrate with hubspot', 'hubspot',
+     'Yes, contacts and calls sync with HubSpot both ways. Setup takes about ten minutes.'),
+    ("that's too expensive for us", 'expensive',
+     'I hear you on budget. Most teams earn it back within their first month of calls.'),
+    ('how does the setup work', 'setup',
+     'You connect your calendar and your CRM. We take care of everything else from there.'),
+]
+
+TURN_TIMEOUT = 30.0  # Seconds an interruption may take to get its answer on screen
+EMBEDDING_DIMS = 16
+
+
+@dataclass
+class BenchmarkConfig:
+    calls: int = 4  # Calls run at once
+    interruptions: int = 3  # Interruptions per call
+    render_delay: float = 0.2  # Seconds the fake talks API takes per render
+    token_delay: float = 0.01  # Seconds per streamed LLM word
+    base_duration: float = 1.0  # Playback length of each pitch clip
+    clip_duration: float = 0.15  # Playback length of transitions and answer clips
+    cold_starts: int = 3  # Fresh interpreters timed for cold_start_ms; 0 to skip
+    seed: int = 7
+
+
+class TalkRenderer:
+    """Render text through the talks API and download the result, as render_talk does on a cache miss"""
+
+    def __init__(self, client: TalksClient, directory: str):
+        self.client = client
+        self.directory = directory
+        self.session = requests.Session()
+
+    def __call__(self, text: str) -> Optional[str]:
+        talk = self.client.create_talk({
+            "source_url": DEFAULT_SOURCE_URL,
+            "script": {"type": "text", "input": text}
+        })
+        result_url = self.client.wait_for_completion(talk["id"])
+        path = os.path.join(self.directory, f"{talk['id']}.mp4")
+        return path if StreamingDownload(result_url, path, session=self.session).run() else None
+
+    def close(self) -> None:
+        self.session.close()
+
+
+@contextlib.contextmanager
+def asset_tree(directory: str) -> Iterator[List[str]]:
+    """Empty clips laid out where VideoQueue looks for them, run from inside `directory`"""
+    assets = os.path.join(directory, 'src', 'assets')
+    os.makedirs(assets, exist_ok=True)
+    for name in BASE_CLIPS + TRANSITIONS:
+        open(os.path.join(assets, name), 'a').close()
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        yield [os.path.join('src', 'assets', name) for name in BASE_CLIPS]
+    finally:
+        os.chdir(previous)
+
+
+class LatencyBenchmark:
+    def __init__(self, config: BenchmarkConfig):
+        self.config = config
+        # Simulated calls; kept out of the live /metrics registry
+        self.stats = {name: LatencyStats(name, registry=None) for name in METRICS}
+        self.failures: List[str] = []
+        self._random = random.Random(config.seed)
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every call concurrently, then time the cold starts"""
+        config = self.config
+        with tempfile.TemporaryDirectory() as directory, asset_tree(directory) as base_clips:
+            answers = os.path.join(directory, 'answers')
+            os.makedirs(answers)
+            obs = FakeOBS(clip_duration=config.clip_duration,
+                          durations={name: config.base_duration for name in BASE_CLIPS})
+            llm = FakeChatModel(answers={keyword: answer for _, keyword, answer in SCRIPT},
+                                token_delay=config.token_delay)
+            embeddings = CachedEmbeddings(FakeEmbeddings(dims=EMBEDDING_DIMS), dims=EMBEDDING_DIMS, cache_dir='')
+            classifier = InterruptClassifier.load()
+            async with FakeOBSWebSocketServer(obs) as server, FakeTalksServer(config.render_delay) as talks:
+                client = TalksClient(api_key='benchmark', api_url=talks.url, pool_size=config.calls * 3)
+                renderer = TalkRenderer(client, answers)
+                try:
+                    # Seed the adaptive polling schedule the way earlier calls would have
+                    for _ in range(3):
+                        await asyncio.to_thread(renderer, 'Warming up the talks client.')
+                    await asyncio.gather(*(self.run_call(f'call-{i}', server, llm, embeddings, classifier,
+                                                         renderer, base_clips, directory)
+                                           for i in range(config.calls)))
+                finally:
+                    renderer.close()
+                    client.close()
+        for _ in range(config.cold_starts):
+            self.stats['cold_start_ms'].observe(measure()['total_ms'])
+        return self.report()
+
+    async def run_call(self, call_id: str, server: FakeOBSWebSocketServer, llm: FakeChatModel,
+                       embeddings: CachedEmbeddings, classifier: InterruptClassifier, renderer: TalkRenderer,
+                       base_clips: List[str], directory: str) -> None:
+        """One call: play the pitch and speak each interruption once the pitch is back on screen"""
+        from src.agents.sales_agent import SalesAgent
+
+        obs_client = AsyncOBSClient(port=server.port)
+        memory = MemoryService(embeddings, dims=EMBEDDING_DIMS, directory=os.path.join(directory, 'memory', call_id))
+        agent = SalesAgent(call_id, llm=llm, embeddings=embeddings, memory=memory, classifier=classifier,
+                           obs_client=obs_client)
+        agent.responder.render = renderer
+        agent.speculator.render = renderer
+        await agent.warmup()
+
+        turn = {'start': None, 'transition': False}
+        answer_started = asyncio.Event()
+        pitch_started = asyncio.Event()
+
+        def on_clip(clip: str) -> None:
+            now = time.perf_counter()
+            name = os.path.basename(clip)
+            if turn['start'] is not None and name in TRANSITIONS and not turn['transition']:
+                turn['transition'] = True
+                self.stats['interrupt_to_transition_ms'].observe((now - turn['start']) * 1000)
+            elif clip.startswith(renderer.directory) and not answer_started.is_set():
+                answer_started.set()
+                if turn['start'] is not None:
+                    self.stats['interrupt_to_answer_ms'].observe((now - turn['start']) * 1000)
+            elif name in BASE_CLIPS:
+                pitch_started.set()
+
+        agent.media_player.clip_listeners.append(on_clip)
+        # The agent loops the pitch from the asset folder, with its transitions, until it is stopped
+        await agent.start_sales_pitch(os.path.dirname(base_clips[0]))
+        script = itertools.islice(itertools.cycle(SCRIPT), self.config.interruptions)
+        try:
+            for text, _, _ in script:
+                await asyncio.wait_for(pitch_started.wait(), TURN_TIMEOUT)
+                # Somewhere in the middle of a pitch clip
+                await asyncio.sleep(self._random.uniform(0.2, 0.6) * self.config.base_duration)
+                answer_started.clear()
+                turn.update(start=time.perf_counter(), transition=False)
+                try:
+                    await asyncio.wait_for(agent.handle_user_interruption(text), TURN_TIMEOUT)
+                    await asyncio.wait_for(answer_started.wait(), TURN_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.failures.append(f'{call_id}: no answer on screen for "{text}"')
+                turn['start'] = None
+                pitch_started.clear()
+        finally:
+            await agent.media_player.stop()
+            await asyncio.gather(agent.playback_task, return_exceptions=True)
+            await agent.close()
+            await obs_client.close()
+
+        for sample in agent.media_player.clip_gaps.samples:
+            self.stats['clip_gap_ms'].observe(sample)
+        for sample in agent.prompt_latency.samples:
+            self.stats['prompt_build_ms'].observe(sample)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'config': asdict(self.config),
+            'failures': self.failures,
+            'metrics': {name: stats.summary() for name, stats in self.stats.items()}
+        }
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(report: Dict[str, Any], path: str = BASELINE_PATH, tolerance: float = TOLERANCE,
+                  slack_ms: float = SLACK_MS) -> None:
+    baseline = {
+        'tolerance': tolerance,
+        'slack_ms': slack_ms,
+        'config': report['config'],
+        'metrics': {name: {p: round(summary[p], 2) for p in PERCENTILES}
+                    for name, summary in report['metrics'].items() if summary['count']}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: Optional[float] = None,
+            slack_ms: Optional[float] = None) -> List[str]:
+    """Percentiles of `report` slower than the baseline allows, as messages"""
+    tolerance = baseline.get('tolerance', TOLERANCE) if tolerance is None else tolerance
+    slack_ms = baseline.get('slack_ms', SLACK_MS) if slack_ms is None else slack_ms
+    regressions = []
+    for name, expected in baseline.get('metrics', {}).items():
+        summary = report['metrics'].get(name)
+        if not summary or not summary['count']:
+            continue
+        for percentile, value in expected.items():
+            limit = value * (1 + tolerance) + slack_ms
+            if summary[percentile] > limit:
+                regressions.append(f"{name} {percentile} {summary[percentile]:.1f} ms is over "
+                                   f"{limit:.1f} ms (baseline {value:.1f} ms)")
+    return regressions
+
+
+def main() -> int:
+    configure()
+    parser = argparse.ArgumentParser(description="End-to-end latency of scripted calls against local fakes")
+    defaults = BenchmarkConfig()
+    parser.add_argument('--calls', type=int, default=defaults.calls)
+    parser.add_argument('--interruptions', type=int, default=defaults.interruptions)
+    parser.add_argument('--render-delay', type=float, default=defaults.render_delay)
+    parser.add_argument('--token-delay', type=float, default=defaults.token_delay)
+    parser.add_argument('--cold-starts', type=int, default=defaults.cold_starts)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, help="Allowed slowdown over the baseline, as a fraction")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    config = BenchmarkConfig(calls=args.calls, interruptions=args.interruptions, render_delay=args.render_delay,
+                             token_delay=args.token_delay, cold_starts=args.cold_starts, seed=args.seed)
+    report = asyncio.run(LatencyBenchmark(config).run())
+    baseline = load_baseline(args.baseline)
+    regressions = []
+    if baseline and not args.update_baseline:
+        if baseline.get('config') == report['config']:
+            regressions = compare(report, baseline, args.tolerance)
+        else:
+            print("The baseline was recorded with other settings; not compared", file=sys.stderr)
+    report['regressions'] = regressions
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{config.calls} calls x {config.interruptions} interruptions, render delay {config.render_delay * 1000:.0f} ms")
+        for name, summary in report['metrics'].items():
+            print(f"  {name:28} n={summary['count']:<4} p50 {summary['p50']:8.1f}  p95 {summary['p95']:8.1f}  "
+                  f"p99 {summary['p99']:8.1f}")
+        for failure in report['failures']:
+            print(f"Failed: {failure}")
+        for regression in regressions:
+            print(f"Regression: {regression}")
+
+    if args.update_baseline:
+        save_baseline(report, args.baseline, TOLERANCE if args.tolerance is None else args.tolerance)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressions or report['failures'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ setup(
     name="edchambers_ai",
     version="0.1.0",
     packages=find_packages(),
+    package_data={"src.interrupt": ["*.json"]},
     install_requires=[
         "langchain",
         "langchain-groq",
@@ -12,5 +13,9 @@ setup(
         "pydantic",
         "python-dotenv",
         "obs-websocket-py"
-    ]
+    ],
+    extras_require={
+        # Opus-encoded audio from the browser extension; PCM needs nothing extra
+        "opus": ["opuslib"]
+    }
 )
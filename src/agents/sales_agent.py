@@ -1,26 +1,38 @@
-from typing import List, Dict, Any, Tuple, Literal
-from langchain_groq import ChatGroq
-from langgraph.prebuilt import create_react_agent
-from langgraph.graph import StateGraph, END
-from langmem import create_manage_memory_tool, create_search_memory_tool
-from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.store.memory import InMemoryStore
+from typing import List, Dict, Any, AsyncIterator, Optional, TYPE_CHECKING
 from dotenv import load_dotenv
-from langchain.tools import Tool, StructuredTool
-from langchain_core.tools import ToolException
 from pydantic import BaseModel, Field
 from datetime import datetime
-import json
-import os
+from pathlib import Path
+import asyncio
+import threading
+import time
 
-# Import video and interrupt services
-from src.video.OBS_media_player_loop import MediaPlayer
+# Import video and interrupt services; LangChain, LangGraph and langmem are imported on first use
+from src.video.asset_manifest import AssetManifest
+from src.video.obs_async import AsyncMediaPlayer, default_client
+from src.video.video_queue import VideoQueue
 from src.interrupt.interrupt_service import handle_interruption
+from src.interrupt.classifier import InterruptClassifier
+from src.memory.embeddings import CachedEmbeddings
+from src.memory.memory_service import MemoryRecord, MemoryService
+from src.interrupt.speculative import ObjectionPredictor, SpeculativeRenderer
+from src.utils.logger import INTERRUPTIONS, call_context, get_logger, span
+from src.utils.metrics import LatencyStats
+from src.voice.streaming_response import ResponseStreamer
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.store.memory import InMemoryStore
 
 # Load environment variables
 load_dotenv()
 
-llm = ChatGroq(temperature=0, model_name="llama-3.3-70b-versatile")
+log = get_logger(__name__)
+
+def create_llm():
+    'Chat model behind the agent; one instance can be shared by every session'
+    from langchain_groq import ChatGroq
+    return ChatGroq(temperature=0, model_name="llama-3.3-70b-versatile")
 
 # Define input schemas for tools
 class VideoPlaybackInput(BaseModel):
@@ -33,55 +45,149 @@ class InterruptionInput(BaseModel):
         description="The text of the user's interruption that needs to be handled"
     )
 
-class Memory(BaseModel):
-    content: str
-    type: str
-    metadata: Dict[str, Any]
-    timestamp: datetime = Field(default_factory=datetime.now)
-
-    def to_string(self) -> str:
-        return (
-            f"Type: {self.type}\n"
-            f"Content: {self.content}\n"
-            f"Context: {json.dumps(self.metadata, indent=2)}\n"
-            f"When: {self.timestamp.isoformat()}"
-        )
+# Static part of the system prompt, ahead of the memories so it is identical on every step
+SYSTEM_PROMPT_PREFIX = (
+    "You are an AI Sales Representative that plays a sequence of videos.\n\n"
+    "## Primary Functions:\n"
+    "1. Play videos in sequence using the play_videos function\n"
+    "2. When an interruption is detected, call handle_interruption\n\n"
+    "## Guidelines:\n"
+    "- Monitor for interruptions during video playback\n"
+    "- Pause video sequence when interrupted\n"
+    "- Resume video sequence after interruption is handled\n\n"
+    "## Error Handling:\n"
+    "- If video playback fails, report the error and try again\n"
+    "- If interruption handling fails, escalate to human operator"
+)
 
 class SalesAgent:
-    def __init__(self):
-        # Initialize store for vector embeddings
-        self.store = InMemoryStore(
-            index={
-                "dims": 1536,
-                "embed": "openai:text-embedding-3-small"
-            }
-        )
-        
-        # Initialize memory namespace
-        self.memory_namespace = ("sales_agent_memories",)
-        
-        # Create memory tools
-        memory_tools = [
+    def __init__(self, session_id: str = "default", llm=None, embeddings: Optional[CachedEmbeddings] = None,
+                 memory: Optional[MemoryService] = None, store: Optional["InMemoryStore"] = None,
+                 checkpointer: Optional["InMemorySaver"] = None, classifier: Optional[InterruptClassifier] = None,
+                 obs_client=None):
+        'One call; the optional arguments are shared between calls by the SessionManager'
+        self.session_id = session_id
+        # Every graph run of this call uses its own thread and memory namespace
+        self.config = {"configurable": {"thread_id": session_id, "session_id": session_id}}
+        self._llm = llm
+        self._store = store
+        self._checkpointer = checkpointer
+        self._classifier = classifier
+        self._workflow = None
+        self._build_lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self.warmup_task: Optional[asyncio.Task] = None
+
+        # Embeddings and the memory store touch disk, so like the workflow they are created on first use
+        self._embeddings = embeddings
+        self._memory = memory
+        self._speculator: Optional[SpeculativeRenderer] = None
+        self._turn_answer = None  # (utterance, pre-rendered answer or None) of the turn being answered
+
+        # Initialize memory namespace, filled in per session from the run config
+        self.memory_namespace = ("sales_agent_memories", "{session_id}")
+
+        # Initialize MediaPlayer on this call's own OBS input and scene; OBS is connected by warmup or first playback.
+        # OBS has one program output, so calls sharing an OBS instance are not seen at once (see session_manager)
+        source_name = "VideoPlayer" if session_id == "default" else f"VideoPlayer-{session_id}"
+        scene_name = "Scene" if session_id == "default" else f"Scene-{session_id}"
+        self.media_player = AsyncMediaPlayer(obs_client if obs_client is not None else default_client(),
+                                             source_name=source_name, scene_name=scene_name)
+        self.playback_task = None
+
+        # Pre-render answers to the objections likely at each point of the pitch
+        self.media_player.clip_listeners.append(lambda clip: self.speculator.prefetch(Path(clip).name))
+
+        # Renders answers sentence by sentence into the playing sequence
+        self.responder = ResponseStreamer(enqueue=self.media_player.enqueue)
+
+        # Memories section of the prompt, reused until the store changes
+        self._context_cache = None
+        self.prompt_latency = LatencyStats("prompt_build_ms")
+        self.warmup_latency: Dict[str, float] = {}
+
+    def _build_once(self, attribute: str, create):
+        'Value of a lazily created attribute, created by one thread only'
+        value = getattr(self, attribute)
+        if value is None:
+            # One lock per attribute, so warmup builds different ones in parallel
+            with self._build_lock:
+                lock = self._build_locks.setdefault(attribute, threading.Lock())
+            with lock:
+                value = getattr(self, attribute)
+                if value is None:
+                    value = create()
+                    setattr(self, attribute, value)
+        return value
+
+    @property
+    def llm(self):
+        return self._build_once("_llm", create_llm)
+
+    @property
+    def embeddings(self) -> CachedEmbeddings:
+        'Recurring texts are embedded once; the model itself is created on first embed'
+        return self._build_once("_embeddings", lambda: CachedEmbeddings("openai:text-embedding-3-small", dims=1536))
+
+    @property
+    def memory(self) -> MemoryService:
+        'Call history and objections, persisted across restarts'
+        return self._build_once("_memory", lambda: MemoryService(self.embeddings, dims=1536))
+
+    @property
+    def speculator(self) -> SpeculativeRenderer:
+        'Pre-renders answers to the objections likely at each point of the pitch'
+        return self._build_once(
+            "_speculator", lambda: SpeculativeRenderer(ObjectionPredictor.from_memories(self.memory.by_type("response"))))
+
+    @speculator.setter
+    def speculator(self, speculator: SpeculativeRenderer):
+        self._speculator = speculator
+
+    @property
+    def store(self):
+        'LangGraph store backing the langmem tools'
+        def create():
+            from langgraph.store.memory import InMemoryStore
+            return InMemoryStore(index={"dims": 1536, "embed": self.embeddings})
+        return self._build_once("_store", create)
+
+    @property
+    def checkpointer(self):
+        'Checkpoint saver for persistence'
+        def create():
+            from langgraph.checkpoint.memory import InMemorySaver
+            return InMemorySaver()
+        return self._build_once("_checkpointer", create)
+
+    @property
+    def classifier(self) -> InterruptClassifier:
+        'Picks the transition locally so it starts before the LLM is involved'
+        return self._build_once("_classifier", InterruptClassifier.load)
+
+    @property
+    def workflow(self):
+        'The agent workflow graph, built on first use'
+        return self._build_once("_workflow", self._create_workflow)
+
+    def _create_tools(self) -> List[Any]:
+        'Create tools with proper schemas'
+        from langchain_core.tools import StructuredTool
+        from langmem import create_manage_memory_tool, create_search_memory_tool
+
+        return [
             create_manage_memory_tool(self.memory_namespace),
-            create_search_memory_tool(self.memory_namespace)
-        ]
-        
-        # Initialize MediaPlayer
-        self.media_player = MediaPlayer()
-        
-        # Create tools with proper schemas
-        self.tools = [
-            *memory_tools,  # Add memory tools
+            create_search_memory_tool(self.memory_namespace),
             StructuredTool.from_function(
-                func=self.media_player.play_videos,
+                coroutine=self.play_videos,
                 name="play_videos",
-                description="Play a sequence of videos from a specified folder in a loop",
+                description="Start playing a sequence of videos from a specified folder in a loop",
                 args_schema=VideoPlaybackInput,
                 handle_tool_error=True,
                 return_direct=False
             ),
             StructuredTool.from_function(
-                func=handle_interruption,
+                coroutine=self.handle_interruption,
                 name="handle_interruption",
                 description="Handle user interruption during video playback by pausing and addressing the interruption",
                 args_schema=InterruptionInput,
@@ -89,108 +195,150 @@ class SalesAgent:
                 return_direct=False
             )
         ]
-        
-        # Checkpoint saver for persistence
-        self.checkpointer = InMemorySaver()
-        
-        # Initialize the agent workflow
-        self.workflow = self._create_workflow()
-
-    async def add_memory(self, content: str, memory_type: str, metadata: Dict[str, Any] = None):
-        'Add a new memory to the store'
-        if metadata is None:
-            metadata = {}
-            
-        memory = Memory(
-            content=content,
-            type=memory_type,
-            metadata=metadata
-        )
-        
-        meta_dict = metadata.copy()
-        meta_dict.update({
-            "type": memory_type,
-            "timestamp": memory.timestamp.isoformat()
-        })
-        
-        await self.store.add(
-            self.memory_namespace,
-            memory.to_string(),
-            metadata=meta_dict
+
+    async def warmup(self) -> Dict[str, float]:
+        'Connect OBS, build the workflow and load the models in parallel; returns ms per step'
+        async def step(name, work):
+            start_time = time.perf_counter()
+            try:
+                await work
+            except Exception as e:
+                # The call can still start; whatever failed is retried on first use
+                log.warning("Warmup of %s failed: %s", name, e, extra={'session_id': self.session_id})
+            self.warmup_latency[name] = (time.perf_counter() - start_time) * 1000
+
+        async def obs():
+            await self.media_player.connect()
+            await self.media_player.setup_media_source()
+
+        start_time = time.perf_counter()
+        await asyncio.gather(
+            step("obs", obs()),
+            step("workflow", asyncio.to_thread(lambda: self.workflow)),
+            step("classifier", asyncio.to_thread(lambda: self.classifier)),
+            step("embeddings", asyncio.to_thread(lambda: self.embeddings.embedder)),
+            step("memory", asyncio.to_thread(lambda: self.speculator))
         )
+        self.warmup_latency["total"] = (time.perf_counter() - start_time) * 1000
+        return self.warmup_latency
+
+    def start_warmup(self) -> asyncio.Task:
+        'Warm up in the background while the call is being set up'
+        if self.warmup_task is None:
+            self.warmup_task = asyncio.ensure_future(self.warmup())
+        return self.warmup_task
+
+    async def play_videos(self, video_folder: str) -> str:
+        'Start looping the pitch clips of a folder in the background and return immediately'
+        if self.playback_task is not None and not self.playback_task.done():
+            return "Videos are already playing"
+        manifest = queue = None
+        try:
+            # Pitch order and transitions, plus sentence starts so an interrupted clip resumes at the sentence it was cut in
+            manifest = await asyncio.to_thread(AssetManifest.load, video_folder)
+            queue = VideoQueue.from_manifest(manifest)
+        except OSError as e:
+            log.warning("Playing %s without transitions: %s", video_folder, e, extra={'session_id': self.session_id})
+        if queue is not None:
+            self.playback_task = asyncio.create_task(self.media_player.play_queue(queue, loop=True))
+        else:
+            if self.media_player.manifest is None:
+                self.media_player.manifest = manifest
+            self.playback_task = asyncio.create_task(self.media_player.play_folder(video_folder))
+        return f"Started playing videos from: {video_folder}"
+
+    def pitch_position(self) -> str:
+        'Name of the clip currently on screen, used as the position in the pitch'
+        current = self.media_player.current
+        return Path(current).name if current else None
 
-    async def search_memories(self, query: str, memory_type: str = None) -> List[str]:
-        'Search memories with optional type filter'
-        filter_dict = {"type": memory_type} if memory_type else {}
-        items = await self.store.search(
-            self.memory_namespace,
-            query=query,
-            filter_dict=filter_dict
+    async def handle_interruption(self, interruption_text: str) -> str:
+        'Answer an interruption, playing a pre-rendered answer straight away when one is ready'
+        # Within a turn the utterance was already looked up; a second lookup would count it twice
+        answer_path = self._turn_answer[1] if self._turn_answer is not None else self.speculator.lookup(interruption_text)
+        return await handle_interruption(interruption_text, answer_path, play=self.media_player.play_now)
+
+    def start_transition(self, interruption_text: str) -> Optional[int]:
+        'Classify an interruption and start its transition clip straight away'
+        classification = self.classifier.classify(interruption_text)
+        if classification.escalate:
+            return None
+        try:
+            self.media_player.handle_interrupt(classification.interrupt_type)
+        except RuntimeError:
+            # The folder had no transitions, so play_videos fell back to looping it
+            log.warning("No transitions to play for this interruption", extra={'session_id': self.session_id})
+        return classification.interrupt_type
+
+    async def add_memory(self, content: str, memory_type: str, metadata: Dict[str, Any] = None) -> MemoryRecord:
+        'Add a new memory to the store, tagged with this call'
+        return await self.memory.add(content, memory_type, {**(metadata or {}), "session_id": self.session_id})
+
+    async def search_memories(self, query: str, memory_type: str = None) -> List[MemoryRecord]:
+        'Search this call\'s memories with optional type filter'
+        return await self.memory.search(query, memory_type=memory_type, session_id=self.session_id)
+
+    async def get_recent_memories(self, memory_type: str = None, limit: int = 5) -> List[MemoryRecord]:
+        'Get most recent memories of this call of a specific type'
+        return self.memory.recent(memory_type, limit, session_id=self.session_id)
+
+    def _latest_user_text(self, messages: List[Any]) -> str:
+        'Content of the newest user message; tool and AI messages do not change the context'
+        from langchain_core.messages import HumanMessage
+
+        for message in reversed(messages):
+            if isinstance(message, dict):
+                if message.get("role") == "user":
+                    return message["content"]
+            elif isinstance(message, HumanMessage):
+                return message.content
+        return messages[-1]["content"] if isinstance(messages[-1], dict) else messages[-1].content
+
+    async def _build_context(self, query: str) -> str:
+        'Memories section of the system prompt'
+        relevant_memories, recent_interruptions = await asyncio.gather(
+            self.search_memories(query),
+            self.get_recent_memories("interruption", limit=3)
         )
-        return items
-
-    async def get_recent_memories(self, memory_type: str = None, limit: int = 5) -> List[str]:
-        'Get most recent memories of a specific type'
-        filter_dict = {"type": memory_type} if memory_type else {}
-        items = await self.store.search(
-            self.memory_namespace,
-            query="",  # Empty query to get all
-            filter_dict=filter_dict,
-            sort_by="timestamp",
-            limit=limit
+        return (
+            f"## Memories:\n"
+            f"## Relevant Context:\n"
+            f"{chr(10).join(m.to_string() for m in relevant_memories)}\n\n"
+            f"## Recent Interruptions:\n"
+            f"{chr(10).join(m.to_string() for m in recent_interruptions)}"
         )
-        return items
 
     async def _create_prompt(self, state: Dict[str, Any]) -> List[Dict[str, str]]:
         'Create the prompt with relevant context and memories'
-        # Get current context
-        current_msg = state["messages"][-1].content
-        
-        # Search for relevant memories
-        relevant_memories = await self.search_memories(current_msg)
-        recent_interruptions = await self.get_recent_memories("interruption", limit=3)
-        
-        # Format memories for the prompt
-        memories_str = (
-            f"## Relevant Context:\n"
-            f"{chr(10).join(str(m) for m in relevant_memories)}\n\n"
-            f"## Recent Interruptions:\n"
-            f"{chr(10).join(str(m) for m in recent_interruptions)}"
-        )
-        
+        start_time = time.perf_counter()
+        query = self._latest_user_text(state["messages"])
+
+        # Every step of the ReAct loop shares the context until this call adds a memory
+        cache_key = (self.memory.session_version(self.session_id), query)
+        if self._context_cache is None or self._context_cache[0] != cache_key:
+            self._context_cache = (cache_key, await self._build_context(query))
+
         system_msg = {
             "role": "system",
-            "content": (
-                f"You are an AI Sales Representative that plays a sequence of videos.\n\n"
-                f"## Memories:\n{memories_str}\n\n"
-                f"## Primary Functions:\n"
-                f"1. Play videos in sequence using the play_videos function\n"
-                f"2. When an interruption is detected, call handle_interruption\n\n"
-                f"## Guidelines:\n"
-                f"- Monitor for interruptions during video playback\n"
-                f"- Pause video sequence when interrupted\n"
-                f"- Resume video sequence after interruption is handled\n\n"
-                f"## Error Handling:\n"
-                f"- If video playback fails, report the error and try again\n"
-                f"- If interruption handling fails, escalate to human operator"
-            )
+            "content": f"{SYSTEM_PROMPT_PREFIX}\n\n{self._context_cache[1]}"
         }
-        
+        self.prompt_latency.observe((time.perf_counter() - start_time) * 1000)
         return [system_msg] + state["messages"]
 
-    def _create_workflow(self) -> StateGraph:
+    def _create_workflow(self):
         'Create the agent workflow graph'
+        from langgraph.graph import END, MessagesState, StateGraph
+        from langgraph.prebuilt import create_react_agent
+
         # Create the main sales agent
         agent = create_react_agent(
-            llm=llm,
+            model=self.llm,
             prompt=self._create_prompt,
-            tools=self.tools,
-            store=self.store,
-            checkpointer=self.checkpointer
+            tools=self._create_tools()
         )
         
         # Create the workflow graph
-        workflow = StateGraph()
+        workflow = StateGraph(MessagesState)
         
         # Add agent node
         workflow.add_node("agent", agent)
@@ -201,58 +349,109 @@ class SalesAgent:
         # Set entry point
         workflow.set_entry_point("agent")
         
-        return workflow.compile()
+        return workflow.compile(checkpointer=self.checkpointer, store=self.store)
 
     async def start_sales_pitch(self, video_folder: str):
         'Start the sales pitch by playing videos from the specified folder'
-        # Record start of sales pitch
-        await self.add_memory(
-            content=f"Started sales pitch with videos from: {video_folder}",
-            memory_type="session",
-            metadata={"video_folder": video_folder}
-        )
+        with call_context(self.session_id):
+            # Start the pitch straight away rather than waiting for the model to choose the tool
+            await self.play_videos(video_folder)
+
+            # Record start of sales pitch
+            await self.add_memory(
+                content=f"Started sales pitch with videos from: {video_folder}",
+                memory_type="session",
+                metadata={"video_folder": video_folder}
+            )
         
-        # Initialize state to start video playback
-        state = {
-            "messages": [{
-                "role": "user", 
-                "content": f"Start playing the sales pitch videos from folder: {video_folder}"
-            }]
-        }
+            # Initialize state to start video playback
+            state = {
+                "messages": [{
+                    "role": "user", 
+                    "content": f"Start playing the sales pitch videos from folder: {video_folder}"
+                }]
+            }
         
-        # Run the workflow
-        await self.workflow.invoke(state)
+            # Run the workflow
+            await self.workflow.ainvoke(state, config=self.config)
     
+    async def _response_tokens(self, state: Dict[str, Any]) -> AsyncIterator[str]:
+        'Text tokens of the agent\'s spoken answer as the model produces them'
+        from langchain_core.messages import AIMessageChunk
+
+        with span("llm") as timing:
+            tokens = 0
+            # The model runs inside the agent subgraph, so its tokens only surface with subgraphs=True
+            async for _, (chunk, metadata) in self.workflow.astream(state, config=self.config, stream_mode="messages",
+                                                                     subgraphs=True):
+                # Skip tool calls and tool output; only the model's own words are spoken
+                if isinstance(chunk, AIMessageChunk) and isinstance(chunk.content, str) and not chunk.tool_call_chunks:
+                    if chunk.content:
+                        tokens += 1
+                        yield chunk.content
+            timing.annotate(tokens=tokens)
+
     async def handle_user_interruption(self, interruption_text: str):
         'Handle user interruption during video playback'
-        # Record the interruption
-        await self.add_memory(
-            content=interruption_text,
-            memory_type="interruption",
-            metadata={
-                "handled": False,
-                "timestamp": datetime.now().isoformat()
-            }
-        )
-        
-        # Create state for interruption handling
-        state = {
-            "messages": [{
-                "role": "user",
-                "content": f"Interruption detected: {interruption_text}"
-            }]
-        }
-        
-        # Run the workflow to handle interruption
-        result = await self.workflow.invoke(state)
+        with call_context(self.session_id):
+            position = self.pitch_position()
+            interrupt_type = self.start_transition(interruption_text)
+            INTERRUPTIONS.inc(type=interrupt_type)
+
+            # Record the interruption
+            await self.add_memory(
+                content=interruption_text,
+                memory_type="interruption",
+                metadata={
+                    "handled": False,
+                    "pitch_position": position,
+                    "interrupt_type": interrupt_type,
+                    "timestamp": datetime.now().isoformat()
+                }
+            )
         
-        # Record the response
-        await self.add_memory(
-            content=result["messages"][-1]["content"],
-            memory_type="response",
-            metadata={
-                "interruption": interruption_text,
-                "handled": True,
-                "timestamp": datetime.now().isoformat()
-            }
-        )
\ No newline at end of file
+            # A predicted objection already has its answer rendered; play that instead of generating it again
+            answer_path = self.speculator.lookup(interruption_text)
+            # Looked up once per turn; the handle_interruption tool reuses the result
+            self._turn_answer = (interruption_text, answer_path)
+            try:
+                if answer_path:
+                    self.media_player.enqueue(answer_path)
+                    response_text = self.speculator.answer_for(interruption_text)
+                else:
+                    # Create state for interruption handling
+                    state = {
+                        "messages": [{
+                            "role": "user",
+                            "content": f"Interruption detected: {interruption_text}"
+                        }]
+                    }
+
+                    # Stream the answer so its first sentence renders while the rest is generated
+                    response = await self.responder.stream(self._response_tokens(state))
+                    response_text = response.text
+            finally:
+                self._turn_answer = None
+
+            # Record the response
+            await self.add_memory(
+                content=response_text,
+                memory_type="response",
+                metadata={
+                    "interruption": interruption_text,
+                    "pitch_position": position,
+                    "handled": True,
+                    "timestamp": datetime.now().isoformat()
+                }
+            )
+            self.speculator.predictor.observe(interruption_text, response_text, position)
+
+    async def close(self):
+        'Stop this call\'s playback and renders; shared clients stay open'
+        if self.playback_task is not None and not self.playback_task.done():
+            self.playback_task.cancel()
+        if self.warmup_task is not None and not self.warmup_task.done():
+            self.warmup_task.cancel()
+        self.responder.shutdown()
+        if self._speculator is not None:
+            self._speculator.shutdown()
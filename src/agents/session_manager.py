@@ -0,0 +1,293 @@
+"""
+Many isolated sales calls in one asyncio process.
+
+Each call is a Session wrapping its own SalesAgent: its own LangGraph thread
+id and langmem namespace, its own OBS media input and scene, and its own
+latency metrics. Whatever is expensive and safe to share is created once by
+the manager and handed to every agent: the chat model, the caching
+embeddings, the persistent memory store, the checkpointer, the interrupt
+classifier and a single pipelined OBS connection.
+
+OBS has one program output, and only the scene on program reaches the
+stream or virtual camera. Per-call scenes keep the calls' media inputs
+apart, but on a shared OBS connection only one call is seen at a time.
+To run several calls at once, give each its own OBS instance through an
+`agent_factory` that passes the call its own `obs_client`.
+
+Admission control caps the number of live calls. Past `max_sessions`, a new
+call waits up to `admission_timeout` seconds for a slot and is then refused
+with AdmissionError, rather than degrading every call already running.
+
+    manager = SessionManager(max_sessions=8)
+    async with manager.session("call-1") as session:
+        await session.start("src/assets/base")
+        await session.handle_interruption("How much is it?")
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from src.utils.logger import configure, get_logger
+from src.utils.metrics import LatencyStats
+
+log = get_logger(__name__)
+
+MAX_SESSIONS = 8
+ADMISSION_TIMEOUT = 0.0  # Refuse at once when full
+
+
+class AdmissionError(Exception):
+    """Raised when no session slot frees up in time"""
+
+
+class Session:
+    def __init__(self, session_id: str, agent: Any):
+        self.id = session_id
+        self.agent = agent
+        self.created_at = time.time()
+        self.turn_latency = LatencyStats('session_turn_ms')  # Interruption heard to response recorded
+        self.turns = 0
+        self._tasks: List[asyncio.Task] = []
+        self._lock = asyncio.Lock()  # One interruption handled at a time per call
+
+    async def start(self, video_folder: str) -> None:
+        """Start the pitch for this call"""
+        await self.agent.start_sales_pitch(video_folder)
+
+    async def handle_interruption(self, text: str) -> None:
+        """Answer what the prospect said, timing the whole turn"""
+        async with self._lock:
+            start_time = time.perf_counter()
+            await self.agent.handle_user_interruption(text)
+            self.turn_latency.observe((time.perf_counter() - start_time) * 1000)
+            self.turns += 1
+
+    def listen(self, call: Any, barge_in: Optional[Any] = None) -> None:
+        """Feed this session from its audio bridge stream
+
+        Final transcripts are handled as interruptions. With a BargeInDetector,
+        the call's media is ducked while the prospect talks.
+        """
+        async def interruptions():
+            async for transcript in call.transcripts():
+                if transcript.is_final and transcript.text:
+                    await self.handle_interruption(transcript.text)
+
+        self._tasks.append(asyncio.ensure_future(interruptions()))
+        if barge_in is not None:
+            player = self.agent.media_player
+            barge_in.on_start = lambda event: player.duck()
+            barge_in.on_end = lambda event: player.unduck()
+
+            async def ducking():
+                async for _ in barge_in.run(call.frames(policy='drop_oldest').samples()):
+                    pass
+
+            self._tasks.append(asyncio.ensure_future(ducking()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        playback = getattr(self.agent, 'playback_task', None)
+        if playback is not None and not playback.done():
+            playback.cancel()
+            await asyncio.gather(playback, return_exceptions=True)
+        close = getattr(self.agent, 'close', None)
+        if close is not None:
+            await close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Latency summaries of this call"""
+        stats = {'turns': self.turns, 'age_s': time.time() - self.created_at, 'turn_ms': self.turn_latency.summary()}
+        for name, path in (('prompt_ms', 'prompt_latency'), ('first_clip_ms', 'responder.first_clip_latency'),
+                           ('interrupt_ms', 'media_player.interrupt_latency')):
+            value = self.agent
+            for attribute in path.split('.'):
+                value = getattr(value, attribute, None)
+            if isinstance(value, LatencyStats):
+                stats[name] = value.summary()
+        return stats
+
+
+class SessionManager:
+    def __init__(self, max_sessions: int = MAX_SESSIONS, admission_timeout: float = ADMISSION_TIMEOUT,
+                 agent_factory: Optional[Callable[[str, 'SessionManager'], Any]] = None,
+                 hitl: Optional[Any] = None):
+        """
+        Args:
+            max_sessions: Calls running at once
+            admission_timeout: Seconds a new call waits for a free slot before it is refused
+            agent_factory: Builds a call's agent from its session id and this manager
+                (defaults to a SalesAgent on the shared resources)
+            hitl: HITLService keeping an escalation summary of every call, if any
+        """
+        # The process hosting the calls logs JSON lines
+        configure()
+        self.max_sessions = max_sessions
+        self.admission_timeout = admission_timeout
+        self.agent_factory = agent_factory or self._sales_agent
+        self.hitl = hitl
+        self.sessions: Dict[str, Session] = {}
+        self._slots = asyncio.Semaphore(max_sessions)
+        self._shared: Dict[str, Any] = {}
+        self._shared_lock = threading.Lock()
+        self._creation_locks: Dict[str, threading.Lock] = {}
+        self._opening: Set[str] = set()  # Ids of calls being admitted, not yet in `sessions`
+
+        self.admitted = 0
+        self.rejected = 0
+        self.admission_latency = LatencyStats('session_admission_ms')  # Request to ready agent
+        self.finished: Dict[str, Dict[str, Any]] = {}  # Final stats of closed sessions
+
+    def shared(self, name: str, create: Callable[[], Any]) -> Any:
+        """A resource shared by every session, created on first use"""
+        if name not in self._shared:
+            # One lock per resource, so different resources can be created in parallel
+            with self._shared_lock:
+                lock = self._creation_locks.setdefault(name, threading.Lock())
+            with lock:
+                if name not in self._shared:
+                    self._shared[name] = create()
+        return self._shared[name]
+
+    def _resources(self) -> Dict[str, Callable[[], Any]]:
+        """How each resource shared by the default SalesAgent sessions is created"""
+        def llm():
+            from src.agents.sales_agent import create_llm
+            return create_llm()
+
+        def embeddings():
+            from src.memory.embeddings import CachedEmbeddings
+            return CachedEmbeddings("openai:text-embedding-3-small", dims=1536)
+
+        def memory():
+            from src.memory.memory_service import MemoryService
+            return MemoryService(self.shared('embeddings', embeddings), dims=1536)
+
+        def store():
+            from langgraph.store.memory import InMemoryStore
+            return InMemoryStore(index={"dims": 1536, "embed": self.shared('embeddings', embeddings)})
+
+        def checkpointer():
+            from langgraph.checkpoint.memory import InMemorySaver
+            return InMemorySaver()
+
+        def classifier():
+            from src.interrupt.classifier import InterruptClassifier
+            return InterruptClassifier.load()
+
+        def obs_client():
+            from src.video.obs_async import default_client
+            return default_client()
+
+        return {'llm': llm, 'embeddings': embeddings, 'memory': memory, 'store': store,
+                'checkpointer': checkpointer, 'classifier': classifier, 'obs_client': obs_client}
+
+    def _sales_agent(self, session_id: str, manager: 'SessionManager') -> Any:
+        from src.agents.sales_agent import SalesAgent
+
+        resources = {name: self.shared(name, create) for name, create in self._resources().items()}
+        return SalesAgent(session_id=session_id, **resources)
+
+    async def warmup(self) -> Dict[str, float]:
+        """Create the shared resources in parallel before the first call arrives; returns ms per resource"""
+        timings: Dict[str, float] = {}
+
+        async def create(name, factory):
+            start_time = time.perf_counter()
+            try:
+                resource = await asyncio.to_thread(self.shared, name, factory)
+                if name == 'obs_client' and not resource.connected:
+                    await resource.connect()
+                elif name == 'embeddings':
+                    await asyncio.to_thread(lambda: resource.embedder)
+            except Exception as e:
+                # Sessions can still open; the resource is created or connected on first use
+                log.warning("Warmup of %s failed: %s", name, e)
+            timings[name] = (time.perf_counter() - start_time) * 1000
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(create(name, factory) for name, factory in self._resources().items()))
+        timings['total'] = (time.perf_counter() - start_time) * 1000
+        return timings
+
+    async def open(self, session_id: Optional[str] = None, timeout: Optional[float] = None) -> Session:
+        """Admit a new call, waiting up to `timeout` (default `admission_timeout`) for a slot"""
+        start_time = time.perf_counter()
+        session_id = session_id or uuid.uuid4().hex
+        if session_id in self.sessions or session_id in self._opening:
+            raise ValueError(f"Session {session_id} is already open")
+        # Reserved before the first await, so a second open of the same id fails instead of racing this one
+        self._opening.add(session_id)
+        try:
+            timeout = self.admission_timeout if timeout is None else timeout
+            try:
+                if timeout > 0:
+                    await asyncio.wait_for(self._slots.acquire(), timeout)
+                elif self._slots.locked():
+                    raise asyncio.TimeoutError
+                else:
+                    await self._slots.acquire()
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise AdmissionError(f"All {self.max_sessions} session slots are busy")
+            try:
+                # Building an agent loads models and opens stores; keep that off the event loop
+                session = Session(session_id, await asyncio.to_thread(self.agent_factory, session_id, self))
+            except BaseException:
+                self._slots.release()
+                raise
+            self.sessions[session_id] = session
+        finally:
+            self._opening.discard(session_id)
+        warmup = getattr(session.agent, 'start_warmup', None)
+        if warmup is not None:
+            # Connect this call's media input and build its workflow while the call is set up
+            warmup()
+        if self.hitl is not None:
+            self.hitl.track(session_id, session.agent.memory)
+        self.admitted += 1
+        self.admission_latency.observe((time.perf_counter() - start_time) * 1000)
+        return session
+
+    async def close(self, session_id: str) -> None:
+        """End a call and free its slot"""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+        if self.hitl is not None:
+            self.hitl.untrack(session_id)
+        try:
+            await session.close()
+        finally:
+            self.finished[session_id] = session.stats()
+            self._slots.release()
+
+    @asynccontextmanager
+    async def session(self, session_id: Optional[str] = None, timeout: Optional[float] = None) -> AsyncIterator[Session]:
+        """`async with` a call that is closed on exit"""
+        session = await self.open(session_id, timeout)
+        try:
+            yield session
+        finally:
+            await self.close(session.id)
+
+    async def shutdown(self) -> None:
+        """Close every open call"""
+        await asyncio.gather(*(self.close(session_id) for session_id in list(self.sessions)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'active': len(self.sessions),
+            'capacity': self.max_sessions,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'admission_ms': self.admission_latency.summary(),
+            'sessions': {session_id: session.stats() for session_id, session in self.sessions.items()}
+        }
@@ -0,0 +1,32 @@
+// Collects microphone samples into fixed-size frames for the audio bridge.
+// The AudioContext runs at 16 kHz, so the browser does the resampling.
+class PcmFrameProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        this.frameSize = options.processorOptions.frameSize;
+        this.frame = new Float32Array(this.frameSize);
+        this.filled = 0;
+    }
+
+    process(inputs) {
+        const channel = inputs[0][0];
+        if (!channel) return true;
+
+        let offset = 0;
+        while (offset < channel.length) {
+            const count = Math.min(this.frameSize - this.filled, channel.length - offset);
+            this.frame.set(channel.subarray(offset, offset + count), this.filled);
+            this.filled += count;
+            offset += count;
+            if (this.filled === this.frameSize) {
+                // Capture time in ms since the epoch, stamped before the frame leaves the audio thread
+                this.port.postMessage({samples: this.frame, capturedAt: Date.now()}, [this.frame.buffer]);
+                this.frame = new Float32Array(this.frameSize);
+                this.filled = 0;
+            }
+        }
+        return true;
+    }
+}
+
+registerProcessor('pcm-frame-processor', PcmFrameProcessor);
@@ -1,3 +1,80 @@
+const BRIDGE_URL = 'ws://127.0.0.1:8765/audio';
+const BRIDGE_SAMPLE_RATE = 16000;
+const BRIDGE_FRAME_SIZE = 320;  // 20 ms at 16 kHz
+const BRIDGE_MAX_BUFFERED = 64 * 1024;  // Drop frames rather than let the socket back up
+
+// Streams microphone frames and transcripts to the Python audio bridge
+class AudioBridgeClient {
+    constructor(callId = 'default') {
+        this.url = `${BRIDGE_URL}/${encodeURIComponent(callId)}`;
+        this.socket = null;
+        this.context = null;
+        this.worklet = null;
+        this.ready = false;
+        this.dropped = 0;
+    }
+
+    async start(mediaStream) {
+        this.socket = new WebSocket(this.url);
+        this.socket.binaryType = 'arraybuffer';
+        this.socket.onopen = () => {
+            this.socket.send(JSON.stringify({
+                type: 'hello', sample_rate: BRIDGE_SAMPLE_RATE, encoding: 'pcm_s16le'
+            }));
+        };
+        this.socket.onmessage = (event) => {
+            const message = JSON.parse(event.data);
+            if (message.type === 'ready') {
+                this.ready = true;
+            } else if (message.type === 'error') {
+                console.error('Audio bridge error:', message.error);
+            }
+        };
+        this.socket.onclose = () => {
+            this.ready = false;
+        };
+
+        // Capture at 16 kHz directly so the browser resamples, not the backend
+        this.context = new AudioContext({sampleRate: BRIDGE_SAMPLE_RATE});
+        await this.context.audioWorklet.addModule('pcm-worklet.js');
+        this.worklet = new AudioWorkletNode(this.context, 'pcm-frame-processor', {
+            processorOptions: {frameSize: BRIDGE_FRAME_SIZE}
+        });
+        this.worklet.port.onmessage = (event) => this.sendFrame(event.data.samples, event.data.capturedAt);
+        this.context.createMediaStreamSource(mediaStream).connect(this.worklet);
+    }
+
+    sendFrame(samples, capturedAt) {
+        if (!this.ready) return;
+        if (this.socket.bufferedAmount > BRIDGE_MAX_BUFFERED) {
+            this.dropped++;
+            return;
+        }
+        // 8-byte capture timestamp followed by 16-bit little-endian PCM
+        const message = new ArrayBuffer(8 + samples.length * 2);
+        const view = new DataView(message);
+        view.setFloat64(0, capturedAt, true);
+        for (let i = 0; i < samples.length; i++) {
+            const sample = Math.max(-1, Math.min(1, samples[i]));
+            view.setInt16(8 + i * 2, sample < 0 ? sample * 0x8000 : sample * 0x7FFF, true);
+        }
+        this.socket.send(message);
+    }
+
+    sendTranscript(text, final) {
+        if (!this.ready || !text.trim()) return;
+        this.socket.send(JSON.stringify({type: 'transcript', text, final, timestamp: Date.now()}));
+    }
+
+    stop() {
+        if (this.worklet) this.worklet.disconnect();
+        if (this.context) this.context.close();
+        if (this.socket) this.socket.close();
+        this.worklet = this.context = this.socket = null;
+        this.ready = false;
+    }
+}
+
 class AudioMonitor {
     constructor() {
         this.audioContext = null;
@@ -15,6 +92,7 @@ class AudioMonitor {
         this.startButton.addEventListener('click', () => this.startMonitoring());
         this.stopButton.addEventListener('click', () => this.stopMonitoring());
         
+        this.bridge = new AudioBridgeClient();
         this.recognition = null;
         this.setupSpeechRecognition();
         this.setupCanvas();
@@ -47,11 +125,14 @@ class AudioMonitor {
                 const transcript = event.results[i][0].transcript;
                 if (event.results[i].isFinal) {
                     finalTranscript += transcript + ' ';
+                    this.bridge.sendTranscript(transcript, true);
                 } else {
                     interimTranscript += transcript;
                 }
             }
 
+            this.bridge.sendTranscript(interimTranscript, false);
+
             this.transcriptionDiv.innerHTML = 
                 finalTranscript + 
                 '<span class="interim">' + interimTranscript + '</span>';
@@ -87,6 +168,13 @@ class AudioMonitor {
             
             this.analyser.fftSize = 2048;
             this.microphone.connect(this.analyser);
+
+            try {
+                await this.bridge.start(mediaStream);
+            } catch (error) {
+                // Monitoring still works without the backend running
+                console.warn('Audio bridge unavailable:', error);
+            }
             
             this.isMonitoring = true;
             this.startButton.disabled = true;
@@ -121,6 +209,7 @@ class AudioMonitor {
         if (this.audioContext) {
             this.microphone.disconnect();
             this.audioContext.close();
+            this.bridge.stop();
             this.isMonitoring = false;
             this.startButton.disabled = false;
             this.stopButton.disabled = true;
@@ -0,0 +1,246 @@
+"""
+Escalation of a call to the account executive.
+
+When a prospect gets frustrated or asks for a person, the account executive
+is contacted with a quick summary of the call so far. Generating that
+summary when escalation fires would delay the notification, so each tracked
+call keeps a running summary instead. It is updated as the agent writes
+its session, interruption and response memories, and its text is
+re-rendered after every turn, so escalating only has to send it.
+
+Escalation fires when:
+
+- the prospect asks to stop or speak to a person (interrupt type 4);
+- their smoothed frustration reaches the sentiment engine's threshold;
+- `escalate` is called directly.
+
+Notifications go out through every configured notifier concurrently (see
+src/integrations for email and SMS). The time from trigger to each
+notification is recorded.
+
+    hitl = HITLService([EmailNotifier(), SMSNotifier()], sentiment=SentimentEngine())
+    hitl.track("call-1", agent.memory)
+"""
+
+import asyncio
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Protocol, Set, Tuple
+
+from src.memory.memory_service import MemoryRecord, MemoryService
+from src.utils.logger import get_logger
+from src.utils.metrics import LatencyStats
+
+log = get_logger(__name__)
+
+# Interrupt type of "stop" / "let me talk to a person"
+HUMAN_REQUEST_TYPE = 4
+
+INTERRUPT_LABELS = {1: 'small talk', 2: 'questions', 3: 'objections', 4: 'requests to stop'}
+
+# Recent exchanges quoted in the summary
+SUMMARY_EXCHANGES = 3
+QUOTE_CHARS = 160
+
+COOLDOWN = 300.0  # Seconds before the same call can escalate again
+NOTIFY_TIMEOUT = 10.0
+
+
+@dataclass
+class Escalation:
+    call_id: str
+    reason: str
+    summary: str
+    frustration: float
+    triggered_at: float  # time.time() when escalation fired
+    delivered: List[str] = field(default_factory=list)  # Names of notifiers that succeeded
+    errors: Dict[str, str] = field(default_factory=dict)
+    latency_ms: float = 0.0  # Trigger to last notification
+
+
+class Notifier(Protocol):
+    name: str
+
+    async def send(self, escalation: Escalation) -> None:
+        ...
+
+
+def _quote(text: str) -> str:
+    text = ' '.join(text.split())
+    return text if len(text) <= QUOTE_CHARS else text[:QUOTE_CHARS - 3].rstrip() + '...'
+
+
+class CallSummary:
+    """Running summary of one call, updated incrementally from memory records"""
+
+    def __init__(self, call_id: str):
+        self.call_id = call_id
+        self.started_at: Optional[str] = None
+        self.pitch: Optional[str] = None
+        self.position: Optional[str] = None
+        self.interruptions: Counter = Counter()
+        self.exchanges: Deque[Tuple[str, Optional[str]]] = deque(maxlen=SUMMARY_EXCHANGES)
+        self.unanswered: Optional[str] = None
+        self.frustration = 0.0
+        self.turns = 0
+        self.text = self.render()
+
+    def update(self, record: MemoryRecord) -> None:
+        metadata = record.metadata or {}
+        if record.type == 'session':
+            self.started_at = self.started_at or record.timestamp
+            self.pitch = metadata.get('video_folder', self.pitch)
+        elif record.type == 'interruption':
+            self.turns += 1
+            self.interruptions[metadata.get('interrupt_type')] += 1
+            self.position = metadata.get('pitch_position') or self.position
+            self.unanswered = record.content
+        elif record.type == 'response':
+            prompt = metadata.get('interruption') or self.unanswered or ''
+            self.exchanges.append((prompt, record.content))
+            self.unanswered = None
+        else:
+            return
+        self.text = self.render()
+
+    def set_frustration(self, frustration: float) -> None:
+        self.frustration = frustration
+        self.text = self.render()
+
+    def render(self) -> str:
+        lines = [f"Call {self.call_id}"]
+        if self.started_at:
+            lines[0] += f", started {self.started_at[:19].replace('T', ' ')}"
+        if self.pitch:
+            lines.append(f"Pitch: {self.pitch}")
+        if self.position:
+            lines.append(f"Stopped at: {self.position}")
+        if self.turns:
+            counts = ', '.join(f"{count} {INTERRUPT_LABELS.get(kind, 'unclassified')}"
+                               for kind, count in sorted(self.interruptions.items(), key=lambda item: str(item[0])))
+            lines.append(f"Interruptions: {self.turns} ({counts})")
+        lines.append(f"Frustration: {self.frustration:.0%}")
+        for prompt, answer in self.exchanges:
+            lines.append(f'Prospect: "{_quote(prompt)}"')
+            lines.append(f'Agent: "{_quote(answer)}"')
+        if self.unanswered:
+            lines.append(f'Unanswered: "{_quote(self.unanswered)}"')
+        return '\n'.join(lines)
+
+
+class HITLService:
+    def __init__(self, notifiers: List[Notifier], sentiment: Optional[Any] = None,
+                 cooldown: float = COOLDOWN, notify_timeout: float = NOTIFY_TIMEOUT):
+        """
+        Args:
+            notifiers: Backends every escalation is sent through
+            sentiment: SentimentEngine scoring the prospect's interruptions, if any
+            cooldown: Seconds before the same call can escalate again
+            notify_timeout: Seconds a notifier gets before it counts as failed
+        """
+        self.notifiers = notifiers
+        self.sentiment = sentiment
+        self.cooldown = cooldown
+        self.notify_timeout = notify_timeout
+        self.summaries: Dict[str, CallSummary] = {}
+        self.escalations: List[Escalation] = []
+        self._listeners: Dict[str, Tuple[MemoryService, Any]] = {}
+        self._last_escalation: Dict[str, float] = {}
+        self._tasks: Set[asyncio.Future] = set()
+        self.notify_latency = LatencyStats('hitl_notify_ms')
+
+    def track(self, call_id: str, memory: MemoryService) -> CallSummary:
+        """Keep a running summary of a call from the memories written from now on"""
+        summary = self.summaries.setdefault(call_id, CallSummary(call_id))
+
+        def listener(records: List[MemoryRecord]) -> None:
+            for record in records:
+                # A memory store shared between sessions also carries other calls' records
+                if (record.metadata or {}).get('session_id', call_id) == call_id:
+                    self.on_record(call_id, record)
+
+        self.untrack(call_id)
+        memory.add_listener(listener)
+        self._listeners[call_id] = (memory, listener)
+        return summary
+
+    def untrack(self, call_id: str) -> Optional[CallSummary]:
+        """Stop following a call, returning its summary"""
+        if call_id in self._listeners:
+            memory, listener = self._listeners.pop(call_id)
+            memory.remove_listener(listener)
+        return self.summaries.get(call_id)
+
+    def on_record(self, call_id: str, record: MemoryRecord) -> None:
+        """Fold a memory record into the call's summary and check the triggers"""
+        summary = self.summaries.setdefault(call_id, CallSummary(call_id))
+        summary.update(record)
+        if record.type != 'interruption':
+            return
+        if (record.metadata or {}).get('interrupt_type') == HUMAN_REQUEST_TYPE:
+            self._spawn(self.escalate(call_id, 'Prospect asked to stop or to speak to a person'))
+        elif self.sentiment is not None:
+            self._spawn(self._check_sentiment(call_id, record.content))
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _check_sentiment(self, call_id: str, text: str) -> None:
+        await self.sentiment.analyze(text, call_id)
+        frustration = self.sentiment.frustration(call_id)
+        self.summaries[call_id].set_frustration(frustration)
+        if self.sentiment.frustrated(call_id):
+            await self.escalate(call_id, f'Prospect frustration at {frustration:.0%}')
+
+    async def escalate(self, call_id: str, reason: str) -> Optional[Escalation]:
+        """Send the call's summary through every notifier, unless it escalated recently"""
+        start_time = time.perf_counter()
+        last = self._last_escalation.get(call_id)
+        if last is not None and time.monotonic() - last < self.cooldown:
+            return None
+        self._last_escalation[call_id] = time.monotonic()
+
+        summary = self.summaries.setdefault(call_id, CallSummary(call_id))
+        escalation = Escalation(call_id, reason, summary.text, summary.frustration, time.time())
+        self.escalations.append(escalation)
+
+        async def notify(notifier: Notifier) -> None:
+            try:
+                await asyncio.wait_for(notifier.send(escalation), self.notify_timeout)
+            except Exception as e:
+                escalation.errors[notifier.name] = str(e) or type(e).__name__
+                log.error("Error sending escalation through %s: %s", notifier.name, escalation.errors[notifier.name],
+                          extra={'call_id': call_id})
+                return
+            self.notify_latency.observe((time.perf_counter() - start_time) * 1000)
+            escalation.delivered.append(notifier.name)
+
+        await asyncio.gather(*(notify(notifier) for notifier in self.notifiers))
+        escalation.latency_ms = (time.perf_counter() - start_time) * 1000
+        return escalation
+
+    async def drain(self) -> None:
+        """Wait for escalations and sentiment checks already triggered"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tracked_calls': len(self._listeners),
+            'escalations': len(self.escalations),
+            'failed_notifications': sum(len(e.errors) for e in self.escalations),
+            'notify_ms': self.notify_latency.summary()
+        }
+
+
+def format_message(escalation: Escalation, max_chars: Optional[int] = None) -> str:
+    """Text of an escalation for a notifier, cut to `max_chars`"""
+    when = datetime.fromtimestamp(escalation.triggered_at).strftime('%H:%M:%S')
+    text = f"Escalation at {when}: {escalation.reason}\n\n{escalation.summary}"
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars - 3].rstrip() + '...'
+    return text
@@ -0,0 +1,69 @@
+"""
+Email notifier for escalations to the account executive.
+
+Sends through any SMTP server with the standard library. The blocking SMTP
+exchange runs in a worker thread so it never stalls the call's event loop.
+"""
+
+import asyncio
+import os
+import smtplib
+from email.message import EmailMessage
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from src.hitl.hitl_service import Escalation, format_message
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_SMTP_PORT = 587
+
+
+class EmailNotifier:
+    name = 'email'
+
+    def __init__(self, recipients: Optional[List[str]] = None, sender: Optional[str] = None,
+                 host: Optional[str] = None, port: Optional[int] = None, username: Optional[str] = None,
+                 password: Optional[str] = None, timeout: float = 10.0):
+        """
+        Args:
+            recipients: Addresses to notify (defaults to ESCALATION_EMAIL_TO, comma separated)
+            sender: From address (defaults to ESCALATION_EMAIL_FROM or the SMTP username)
+            host: SMTP server (defaults to SMTP_HOST)
+            port: SMTP port (defaults to SMTP_PORT or 587), with STARTTLS unless it is 25
+            username: SMTP login (defaults to SMTP_USERNAME)
+            password: SMTP password (defaults to SMTP_PASSWORD)
+            timeout: Connection timeout in seconds
+        """
+        self.recipients = recipients or [r.strip() for r in os.getenv('ESCALATION_EMAIL_TO', '').split(',') if r.strip()]
+        if not self.recipients:
+            raise ValueError("ESCALATION_EMAIL_TO not found in environment variables")
+        self.host = host or os.getenv('SMTP_HOST')
+        if not self.host:
+            raise ValueError("SMTP_HOST not found in environment variables")
+        self.port = port or int(os.getenv('SMTP_PORT', DEFAULT_SMTP_PORT))
+        self.username = username or os.getenv('SMTP_USERNAME')
+        self.password = password or os.getenv('SMTP_PASSWORD')
+        self.sender = sender or os.getenv('ESCALATION_EMAIL_FROM') or self.username
+        self.timeout = timeout
+
+    def _message(self, escalation: Escalation) -> EmailMessage:
+        message = EmailMessage()
+        message['Subject'] = f"Escalation on call {escalation.call_id}: {escalation.reason}"
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content(format_message(escalation))
+        return message
+
+    def _send(self, message: EmailMessage) -> None:
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.port != 25:
+                smtp.starttls()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+    async def send(self, escalation: Escalation) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._send, self._message(escalation))
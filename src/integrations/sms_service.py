@@ -0,0 +1,71 @@
+"""
+SMS notifier for escalations to the account executive.
+
+Posts to the Twilio messages API with aiohttp, keeping one session open so
+an escalation does not pay for a new TLS handshake.
+"""
+
+import base64
+import os
+from typing import List, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+from src.hitl.hitl_service import Escalation, format_message
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_API_URL = "https://api.twilio.com"
+
+# Twilio splits longer bodies into several billed segments; 1600 is its hard limit
+MAX_SMS_CHARS = 1600
+
+
+class SMSNotifier:
+    name = 'sms'
+
+    def __init__(self, recipients: Optional[List[str]] = None, sender: Optional[str] = None,
+                 account_sid: Optional[str] = None, auth_token: Optional[str] = None,
+                 api_url: Optional[str] = None, timeout: float = 10.0):
+        """
+        Args:
+            recipients: Phone numbers to notify (defaults to ESCALATION_SMS_TO, comma separated)
+            sender: Sending number (defaults to TWILIO_FROM_NUMBER)
+            account_sid: Twilio account (defaults to TWILIO_ACCOUNT_SID)
+            auth_token: Twilio auth token (defaults to TWILIO_AUTH_TOKEN)
+            api_url: API base URL (defaults to TWILIO_API_URL or the public API)
+            timeout: Per-request timeout in seconds
+        """
+        self.recipients = recipients or [r.strip() for r in os.getenv('ESCALATION_SMS_TO', '').split(',') if r.strip()]
+        if not self.recipients:
+            raise ValueError("ESCALATION_SMS_TO not found in environment variables")
+        self.sender = sender or os.getenv('TWILIO_FROM_NUMBER')
+        self.account_sid = account_sid or os.getenv('TWILIO_ACCOUNT_SID')
+        self.auth_token = auth_token or os.getenv('TWILIO_AUTH_TOKEN')
+        if not (self.sender and self.account_sid and self.auth_token):
+            raise ValueError("TWILIO_FROM_NUMBER, TWILIO_ACCOUNT_SID or TWILIO_AUTH_TOKEN not found in environment variables")
+        self.api_url = (api_url or os.getenv('TWILIO_API_URL', DEFAULT_API_URL)).rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _client(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            credentials = base64.b64encode(f"{self.account_sid}:{self.auth_token}".encode()).decode()
+            self._session = aiohttp.ClientSession(headers={'Authorization': f"Basic {credentials}"},
+                                                  timeout=self.timeout)
+        return self._session
+
+    async def send(self, escalation: Escalation) -> None:
+        session = await self._client()
+        url = f"{self.api_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        body = format_message(escalation, MAX_SMS_CHARS)
+        for recipient in self.recipients:
+            async with session.post(url, data={'From': self.sender, 'To': recipient, 'Body': body}) as response:
+                if response.status >= 400:
+                    raise RuntimeError(f"Twilio returned {response.status}: {await response.text()}")
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,167 @@
+"""
+Local fast-path classifier for interruptions.
+
+Picking a transition should not wait on memory writes, vector searches and a
+ReAct loop on a hosted LLM. InterruptClassifier maps transcribed text to one
+of the VideoQueue interrupt types in a few milliseconds on the CPU, so the
+transition clip can start straight away while the LLM works on the answer:
+
+    1  acknowledgement or small talk ("yeah", "sounds good")
+    2  question to come back to ("how much does it cost?")
+    3  objection or concern ("we already have a tool for this")
+    4  wants to stop or talk to a human ("I'm not interested")
+
+Text is embedded as hashed word, word-pair and character-trigram features, so
+exact keywords and near spellings both count, and labelled by a similarity
+weighted vote of its nearest labelled examples. Anything that is not close
+enough to a known example is escalated to the LLM (interrupt_type None).
+
+Usage:
+    python -m src.interrupt.classifier --benchmark tests/fixtures/interrupt_cases.jsonl
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.logger import configure, span
+from src.utils.metrics import LatencyStats
+
+DEFAULT_EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), 'interrupt_examples.json')
+ESCALATE_LABEL = 'escalate'
+
+FEATURE_DIM = 4096
+TRIGRAM_WEIGHT = 0.5
+
+# Nearest examples that vote, and the similarity the best one must reach
+NEIGHBOURS = 5
+MIN_SIMILARITY = 0.3
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9']+", text.lower().replace('’', "'"))
+
+
+def _bucket(feature: str) -> int:
+    # crc32 rather than hash() so vectors are stable across processes
+    return zlib.crc32(feature.encode('utf-8')) % FEATURE_DIM
+
+
+def embed(text: str) -> np.ndarray:
+    """L2-normalized hashed bag of words, word pairs and character trigrams"""
+    vector = np.zeros(FEATURE_DIM, dtype=np.float32)
+    words = tokenize(text)
+    for word in words:
+        vector[_bucket('w:' + word)] += 1.0
+        padded = f'<{word}>'
+        for i in range(len(padded) - 2):
+            vector[_bucket('c:' + padded[i:i + 3])] += TRIGRAM_WEIGHT
+    for first, second in zip(words, words[1:]):
+        vector[_bucket(f'b:{first} {second}')] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@dataclass
+class Classification:
+    interrupt_type: Optional[int]  # None: escalate to the LLM
+    confidence: float
+    nearest: str
+    latency_ms: float
+
+    @property
+    def escalate(self) -> bool:
+        return self.interrupt_type is None
+
+
+class InterruptClassifier:
+    def __init__(self, examples: Dict[str, List[str]], neighbours: int = NEIGHBOURS,
+                 min_similarity: float = MIN_SIMILARITY):
+        """
+        Args:
+            examples: Example texts per label ('1'-'4' or 'escalate')
+            neighbours: Nearest examples that vote on the label
+            min_similarity: Escalate when no example is at least this similar
+        """
+        self.neighbours = neighbours
+        self.min_similarity = min_similarity
+        self.texts: List[str] = []
+        self.labels: List[Optional[int]] = []
+        for label, texts in examples.items():
+            interrupt_type = None if label == ESCALATE_LABEL else int(label)
+            for text in texts:
+                self.texts.append(text)
+                self.labels.append(interrupt_type)
+        self.matrix = np.stack([embed(text) for text in self.texts])
+        self.latency = LatencyStats('interrupt_classifier_ms')
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_EXAMPLES_PATH, **kwargs) -> 'InterruptClassifier':
+        """Classifier over the labelled examples in a JSON file"""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    def classify(self, text: str) -> Classification:
+        """Interrupt type for a transcribed interruption"""
+        start_time = time.perf_counter()
+        with span("classification") as timing:
+            similarities = self.matrix @ embed(text)
+            nearest = np.argsort(similarities)[::-1][:self.neighbours]
+
+            best = nearest[0]
+            if similarities[best] < self.min_similarity:
+                interrupt_type, confidence = None, float(similarities[best])
+            else:
+                votes: Dict[Optional[int], float] = defaultdict(float)
+                for index in nearest:
+                    votes[self.labels[index]] += float(similarities[index])
+                interrupt_type = max(votes, key=votes.get)
+                confidence = votes[interrupt_type] / sum(votes.values())
+            timing.annotate(interrupt_type=interrupt_type)
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self.latency.observe(elapsed_ms)
+        return Classification(interrupt_type, confidence, self.texts[best], elapsed_ms)
+
+
+def load_cases(path: str) -> List[Tuple[str, Optional[int]]]:
+    """Labelled (text, interrupt_type) cases from a JSON lines file"""
+    with open(path, encoding='utf-8') as f:
+        return [(case['text'], case['type']) for case in map(json.loads, f) if case]
+
+
+def benchmark(classifier: InterruptClassifier, cases: Iterable[Tuple[str, Optional[int]]],
+              repeat: int = 20) -> Dict[str, object]:
+    """Accuracy and latency of a classifier over labelled cases"""
+    cases = list(cases)
+    latency = LatencyStats('interrupt_classifier_benchmark_ms')
+    errors = []
+    for round_number in range(repeat):
+        for text, expected in cases:
+            result = classifier.classify(text)
+            latency.observe(result.latency_ms)
+            if round_number == 0 and result.interrupt_type != expected:
+                errors.append({'text': text, 'expected': expected, 'got': result.interrupt_type})
+    return {
+        'cases': len(cases),
+        'accuracy': (len(cases) - len(errors)) / len(cases) if cases else 0.0,
+        'errors': errors,
+        'latency_ms': latency.summary()
+    }
+
+
+if __name__ == "__main__":
+    configure()
+    parser = argparse.ArgumentParser(description="Benchmark the interrupt classifier over labelled cases")
+    parser.add_argument('--benchmark', default=os.path.join('tests', 'fixtures', 'interrupt_cases.jsonl'))
+    parser.add_argument('--examples', default=DEFAULT_EXAMPLES_PATH)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(InterruptClassifier.load(args.examples), load_cases(args.benchmark)), indent=2))
@@ -1,9 +1,13 @@
-from typing import Dict, Any
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_groq import ChatGroq
+from typing import Any, Callable, Optional
 
-async def handle_interruption(interruption_text: str) -> str:
-    'Handle user interruption during video playback'
-    # TODO: Implement actual interruption handling logic
-    # For now, just return a placeholder response
-    return f"Handling interruption: {interruption_text}"
\ No newline at end of file
+async def handle_interruption(interruption_text: str, answer_path: Optional[str] = None,
+                              play: Optional[Callable[[str], Any]] = None) -> str:
+    'Handle user interruption during video playback, given the speculative lookup already made for it'
+    # Play a pre-rendered answer when this objection was predicted
+    if answer_path:
+        if play is not None:
+            play(answer_path)
+        return f"Playing pre-rendered answer: {answer_path}"
+
+    # Otherwise the agent's own reply is the answer: it is rendered and played sentence by sentence as it streams
+    return f"No pre-rendered answer for: {interruption_text}. Answer the prospect directly; your reply is spoken as you write it."
@@ -0,0 +1,186 @@
+"""
+Speculative pre-rendering of likely objection answers.
+
+Prospects tend to raise the same objections at the same points of the pitch.
+ObjectionPredictor learns, from the objection/answer history in the agent's
+memory, which objections come up at each pitch position. As the pitch moves
+on, SpeculativeRenderer renders answers to the most likely next objections in
+the background, within a budget, so that when one of them is raised the
+answer plays from a local file instead of waiting on a live render.
+"""
+
+import contextvars
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Weight of how often an objection comes up anywhere vs at this position
+GLOBAL_WEIGHT = 0.25
+
+# Minimum word overlap for an interruption to match a predicted objection
+MATCH_THRESHOLD = 0.6
+
+
+def objection_key(text: str) -> str:
+    """Normalize objection text for counting and matching"""
+    return ' '.join(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard overlap of the words of two normalized objections"""
+    words_a, words_b = set(a.split()), set(b.split())
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+@dataclass
+class Prediction:
+    key: str
+    objection: str
+    answer: str
+    score: float
+
+
+class ObjectionPredictor:
+    def __init__(self):
+        self.by_position: Dict[Optional[str], Counter] = defaultdict(Counter)
+        self.overall = Counter()
+        self.objections: Dict[str, str] = {}  # key -> latest wording
+        self.answers: Dict[str, str] = {}  # key -> latest answer
+
+    def observe(self, objection: str, answer: str, position: Optional[str] = None) -> None:
+        """Record that `objection` was raised at `position` and answered with `answer`"""
+        key = objection_key(objection)
+        if not key:
+            return
+        self.by_position[position][key] += 1
+        self.overall[key] += 1
+        self.objections[key] = objection
+        self.answers[key] = answer
+
+    @classmethod
+    def from_memories(cls, memories: Iterable[Any]) -> 'ObjectionPredictor':
+        """Build from stored `response` memories.
+
+        Accepts the agent's Memory objects or dicts with `type`, `content`
+        and `metadata`; a response's metadata carries the interruption it
+        answered and the pitch position it was raised at.
+        """
+        predictor = cls()
+        for memory in memories:
+            if isinstance(memory, dict):
+                memory_type, content, metadata = memory.get('type'), memory.get('content'), memory.get('metadata', {})
+            else:
+                memory_type, content, metadata = memory.type, memory.content, memory.metadata
+            if memory_type == 'response' and metadata.get('interruption'):
+                predictor.observe(metadata['interruption'], content, metadata.get('pitch_position'))
+        return predictor
+
+    def rank(self, position: Optional[str], limit: int = 3) -> List[Prediction]:
+        """Most likely objections at a pitch position"""
+        local = self.by_position.get(position, Counter())
+        scores = {key: local[key] + GLOBAL_WEIGHT * count for key, count in self.overall.items()}
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [Prediction(key, self.objections[key], self.answers[key], score) for key, score in ranked]
+
+    def match(self, text: str) -> Optional[str]:
+        """Key of the known objection closest to `text`, if close enough"""
+        key = objection_key(text)
+        if key in self.overall:
+            return key
+        best = max(self.overall, key=lambda known: similarity(key, known), default=None)
+        if best is not None and similarity(key, best) >= MATCH_THRESHOLD:
+            return best
+        return None
+
+
+def _rendered(future: Future) -> Optional[str]:
+    """Path a speculative render produced, or None while it runs or if it failed or was cancelled"""
+    # A render cancelled by shutdown raises CancelledError from exception()
+    if not future.done() or future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+class SpeculativeRenderer:
+    def __init__(self, predictor: ObjectionPredictor, render: Optional[Callable[[str], Optional[str]]] = None,
+                 budget: int = 5, per_position: int = 2, max_workers: int = 2):
+        """
+        Args:
+            predictor: Source of likely objections
+            render: Renders answer text to a local video path (defaults to render_talk)
+            budget: Maximum speculative renders for the lifetime of this renderer (one call)
+            per_position: How many of the top objections to prepare at each position
+            max_workers: Renders running at once
+        """
+        if render is None:
+            from src.voice.text_to_video import render_talk
+            render = render_talk
+        self.predictor = predictor
+        self.render = render
+        self.budget = budget
+        self.per_position = per_position
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculative-render')
+        self._lock = threading.Lock()
+        self._renders: Dict[str, Future] = {}
+        self._used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, position: Optional[str]) -> List[str]:
+        """Start rendering answers to the likeliest objections at `position`.
+
+        Returns the keys of the objections newly submitted.
+        """
+        submitted = []
+        with self._lock:
+            for prediction in self.predictor.rank(position, limit=self.per_position):
+                if len(self._renders) >= self.budget:
+                    break
+                if prediction.key in self._renders:
+                    continue
+                self._renders[prediction.key] = self._executor.submit(contextvars.copy_context().run,
+                                                                      self.render, prediction.answer)
+                submitted.append(prediction.key)
+        return submitted
+
+    def lookup(self, interruption_text: str) -> Optional[str]:
+        """Local path of a ready pre-rendered answer for this interruption, if any"""
+        key = self.predictor.match(interruption_text)
+        with self._lock:
+            future = self._renders.get(key) if key else None
+            path = _rendered(future) if future is not None else None
+            if not path:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._used.add(key)
+            return path
+
+    def answer_for(self, interruption_text: str) -> Optional[str]:
+        """Answer text of the known objection matching this interruption"""
+        key = self.predictor.match(interruption_text)
+        return self.predictor.answers.get(key) if key else None
+
+    def report(self) -> Dict[str, Any]:
+        """How well the speculative budget was spent"""
+        with self._lock:
+            completed = [key for key, f in self._renders.items() if _rendered(f)]
+            lookups = self.hits + self.misses
+            return {
+                'renders': len(self._renders),
+                'completed': len(completed),
+                'budget': self.budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'wasted': len([key for key in completed if key not in self._used]),
+                'waste_rate': (len(completed) - len(self._used)) / len(completed) if completed else 0.0
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
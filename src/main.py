@@ -2,9 +2,12 @@
 Main entry point for the Ed Chambers AI application.
 """
 
+from src.utils.logger import configure
+
+
 def main():
     """Main function to initialize and run the application."""
-    pass
+    configure()
 
 if __name__ == "__main__":
     main()
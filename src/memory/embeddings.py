@@ -0,0 +1,331 @@
+"""
+Caching, batching embedding layer for the agent's memory store.
+
+Recurring objections get embedded over and over: once when they are stored
+and again every time they come up in a search. CachedEmbeddings wraps any
+LangChain embeddings model and
+
+- memoizes vectors by a hash of the text in a bounded LRU, backed by an
+  append-only file on disk so they survive restarts; the file is capped in
+  size and compacted down to its most recently used vectors when full;
+- coalesces concurrent async embed requests arriving within a short window
+  into a single batched call to the model;
+- keeps the cached vectors in one contiguous float32 matrix, so consumers
+  can take a block of vectors without converting lists of floats.
+
+It implements the Embeddings interface and can be passed as the `embed` of a
+LangGraph store index.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_DIR = os.path.join('output', 'embedding_cache')
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_DISK_MAX_BYTES = 256 * 1024 ** 2  # 256 MB, about 40k vectors of 1536 dimensions
+
+# A full disk store is compacted to this share of its capacity, so compactions are rare
+COMPACT_TO = 0.75
+
+# How long the first of a group of concurrent requests waits for others to join its batch
+BATCH_WINDOW = 0.005
+MAX_BATCH_SIZE = 256
+
+KEY_BYTES = 32
+
+
+def text_key(text: str) -> bytes:
+    """Cache key for a text"""
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+class DiskVectorStore:
+    """Append-only file of (sha256 key, float32 vector) records.
+
+    Records have a fixed size, so on open only the keys are read into an
+    offset index and vectors are read from a memory map on demand. Above
+    `max_bytes` (or `max_entries`) the file is rewritten with only its most
+    recently used records, least recent first, so recency survives restarts.
+    """
+
+    def __init__(self, path: str, dims: int, max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+                 max_entries: Optional[int] = None):
+        self.path = path
+        self.dims = dims
+        self.record = np.dtype([('key', f'S{KEY_BYTES}'), ('vector', np.float32, (dims,))])
+        self.max_rows = max(1, max_bytes // self.record.itemsize)
+        if max_entries is not None:
+            self.max_rows = min(self.max_rows, max_entries)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._rows: "OrderedDict[bytes, int]" = OrderedDict()  # Least recently used first
+        self._map: Optional[np.memmap] = None
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            # Drop a torn record left by a crash mid-write
+            usable = os.path.getsize(path) // self.record.itemsize * self.record.itemsize
+            if usable != os.path.getsize(path):
+                os.truncate(path, usable)
+        self._remap()
+        if self._map is not None:
+            self._rows = OrderedDict((bytes(key), row) for row, key in enumerate(self._map['key']))
+        if len(self._rows) > self.max_rows:
+            self._compact()
+
+    def _remap(self) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            self._map = np.memmap(self.path, dtype=self.record, mode='r')
+        else:
+            self._map = None
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            self._rows.move_to_end(key)
+            if self._map is None or row >= len(self._map):
+                self._remap()
+            return np.array(self._map[row]['vector'])
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        with self._lock:
+            new = [i for i, key in enumerate(keys) if key not in self._rows]
+            for key in keys:
+                if key in self._rows:
+                    self._rows.move_to_end(key)
+            if not new:
+                return
+            records = np.empty(len(new), dtype=self.record)
+            records['key'] = [keys[i] for i in new]
+            records['vector'] = vectors[new]
+            start = len(self._rows)
+            with open(self.path, 'ab') as f:
+                records.tofile(f)
+            for offset, i in enumerate(new):
+                self._rows[keys[i]] = start + offset
+            if len(self._rows) > self.max_rows:
+                self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the file with only the most recently used records"""
+        keep = list(self._rows.items())[-max(1, int(self.max_rows * COMPACT_TO)):]
+        self._remap()
+        records = self._map[[row for _, row in keep]]
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        records.tofile(tmp_path)
+        os.replace(tmp_path, self.path)
+        self.evictions += len(self._rows) - len(keep)
+        self._rows = OrderedDict((key, row) for row, (key, _) in enumerate(keep))
+        self._remap()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embedder: Union[Embeddings, str], dims: int, cache_dir: Optional[str] = None,
+                 name: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 batch_window: float = BATCH_WINDOW, max_batch_size: int = MAX_BATCH_SIZE,
+                 disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+        """
+        Args:
+            embedder: Embeddings model, or a "provider:model" string initialized on first use
+            dims: Vector dimensions of the model
+            cache_dir: Directory of the on-disk store (defaults to EMBEDDING_CACHE_DIR or
+                output/embedding_cache); '' keeps the cache in memory only
+            name: File name of the on-disk store (defaults to the model string)
+            max_entries: Vectors kept in the in-memory LRU
+            batch_window: Seconds concurrent async requests wait to be batched together
+            max_batch_size: Texts sent to the model in one call
+            disk_max_bytes: Size of the on-disk store above which its least recently used vectors are dropped
+        """
+        self._embedder = embedder
+        self.dims = dims
+        self.max_entries = max_entries
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+
+        self.vectors = np.zeros((max_entries, dims), dtype=np.float32)
+        self._slots: "OrderedDict[bytes, int]" = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+
+        if cache_dir is None:
+            cache_dir = os.getenv('EMBEDDING_CACHE_DIR', DEFAULT_CACHE_DIR)
+        if cache_dir:
+            name = name or (embedder if isinstance(embedder, str) else type(embedder).__name__)
+            file_name = f"{name.replace(':', '-').replace('/', '-')}-{dims}.f32"
+            self.disk: Optional[DiskVectorStore] = DiskVectorStore(os.path.join(cache_dir, file_name), dims,
+                                                                     max_bytes=disk_max_bytes)
+        else:
+            self.disk = None
+
+        self._pending: Dict[bytes, asyncio.Future] = {}
+        self._pending_texts: Dict[bytes, str] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.model_calls = 0
+        self.texts_embedded = 0
+
+    @property
+    def embedder(self) -> Embeddings:
+        if isinstance(self._embedder, str):
+            from langchain.embeddings import init_embeddings
+            self._embedder = init_embeddings(self._embedder)
+        return self._embedder
+
+    def _lookup(self, key: bytes) -> Optional[np.ndarray]:
+        """Cached vector for a key, from memory or disk"""
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._slots.move_to_end(key)
+                self.hits += 1
+                return self.vectors[slot].copy()
+        vector = self.disk.get(key) if self.disk is not None else None
+        if vector is not None:
+            self.disk_hits += 1
+            self._remember([key], vector[None, :], persist=False)
+            return vector
+        return None
+
+    def _remember(self, keys: List[bytes], vectors: np.ndarray, persist: bool = True) -> None:
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                slot = self._slots.get(key)
+                if slot is None:
+                    if self._free:
+                        slot = self._free.pop()
+                    else:
+                        _, slot = self._slots.popitem(last=False)
+                    self._slots[key] = slot
+                self._slots.move_to_end(key)
+                self.vectors[slot] = vector
+        if persist and self.disk is not None:
+            self.disk.put_many(keys, vectors)
+
+    def _split(self, texts: List[str]):
+        """Cached vectors by key, and the keys and texts that still need embedding"""
+        found: Dict[bytes, np.ndarray] = {}
+        missing: Dict[bytes, str] = {}
+        for text in texts:
+            key = text_key(text)
+            if key in found or key in missing:
+                continue
+            vector = self._lookup(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                found[key] = vector
+        return found, missing
+
+    def _store_batch(self, keys: List[bytes], raw: List[List[float]]) -> np.ndarray:
+        vectors = np.asarray(raw, dtype=np.float32).reshape(len(keys), self.dims)
+        self.model_calls += 1
+        self.texts_embedded += len(keys)
+        self.misses += len(keys)
+        self._remember(keys, vectors)
+        return vectors
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """Vectors for `texts` as a (len(texts), dims) float32 matrix"""
+        found, missing = self._split(texts)
+        keys, pending = list(missing), list(missing.values())
+        for start in range(0, len(pending), self.max_batch_size):
+            batch_keys = keys[start:start + self.max_batch_size]
+            vectors = self._store_batch(batch_keys, self.embedder.embed_documents(pending[start:start + self.max_batch_size]))
+            found.update(zip(batch_keys, vectors))
+        return self._assemble(texts, found)
+
+    async def aembed_matrix(self, texts: List[str]) -> np.ndarray:
+        """Async `embed_matrix`, batching misses with other concurrent requests"""
+        found, missing = self._split(texts)
+        if missing:
+            loop = asyncio.get_running_loop()
+            waiting = []
+            for key, text in missing.items():
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = loop.create_future()
+                    self._pending_texts[key] = text
+                waiting.append((key, future))
+            if len(self._pending_texts) >= self.max_batch_size:
+                self._flush(loop)
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_window, self._flush, loop)
+            for key, future in waiting:
+                found[key] = await future
+        return self._assemble(texts, found)
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending_texts:
+            return
+        batch = dict(list(self._pending_texts.items())[:self.max_batch_size])
+        for key in batch:
+            del self._pending_texts[key]
+        futures = {key: self._pending.pop(key) for key in batch}
+        loop.create_task(self._run_batch(batch, futures))
+        if self._pending_texts:
+            self._flush_handle = loop.call_soon(self._flush, loop)
+
+    async def _run_batch(self, batch: Dict[bytes, str], futures: Dict[bytes, asyncio.Future]) -> None:
+        keys = list(batch)
+        try:
+            vectors = self._store_batch(keys, await self.embedder.aembed_documents(list(batch.values())))
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, vector in zip(keys, vectors):
+            if not futures[key].done():
+                futures[key].set_result(vector)
+
+    def _assemble(self, texts: List[str], vectors: Dict[bytes, np.ndarray]) -> np.ndarray:
+        matrix = np.empty((len(texts), self.dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = vectors[text_key(text)]
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_matrix([text])[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return (await self.aembed_matrix(texts)).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_matrix([text]))[0].tolist()
+
+    def stats(self) -> Dict[str, float]:
+        """Cache and batching counters"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'model_calls': self.model_calls,
+            'texts_per_call': self.texts_embedded / self.model_calls if self.model_calls else 0.0,
+            'entries': len(self._slots),
+            'disk_entries': len(self.disk) if self.disk is not None else 0,
+            'disk_evictions': self.disk.evictions if self.disk is not None else 0
+        }
@@ -0,0 +1,417 @@
+"""
+Persistent vector store for the agent's memories and objection history.
+
+Embeddings are unit-normalized and appended to a raw float32 file that is
+opened as a memory map, so a restart maps the file instead of loading or
+re-embedding anything. Each row's content, type and metadata live in a JSON
+lines sidecar with one line per row.
+
+Search is a single matrix-vector product over the mapped rows with an
+argpartition top-k. Filtering by memory type (session, interruption,
+response) uses a precomputed index of the rows of each type, and so does
+filtering by the call (`session_id` metadata) that wrote them. Once the store
+passes `ivf_threshold` rows, an inverted-file index partitions the rows by
+k-means and a query only scores the partitions nearest to it. The index is
+trained on a background thread, so a write never waits for k-means.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.memory.embeddings import CachedEmbeddings
+from src.utils.logger import span
+from src.utils.metrics import LatencyStats
+
+DEFAULT_MEMORY_DIR = os.path.join('output', 'memory')
+
+# Exact search below this many rows, inverted-file index above
+IVF_THRESHOLD = 2000
+IVF_PROBES = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+
+# Most recent memories kept per type for `recent`
+RECENT_SIZE = 50
+
+
+@dataclass
+class MemoryRecord:
+    id: int
+    type: str
+    content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    timestamp: str = ''
+    score: Optional[float] = None
+
+    def to_string(self) -> str:
+        return (
+            f"Type: {self.type}\n"
+            f"Content: {self.content}\n"
+            f"Context: {json.dumps(self.metadata, indent=2)}\n"
+            f"When: {self.timestamp}"
+        )
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _session_of(record: MemoryRecord) -> Optional[str]:
+    return (record.metadata or {}).get('session_id')
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if len(scores) > k:
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+def kmeans(vectors: np.ndarray, n_lists: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids of unit vectors, trained on a sample"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > KMEANS_SAMPLE_PER_LIST * n_lists:
+        vectors = vectors[np.sort(rng.choice(len(vectors), KMEANS_SAMPLE_PER_LIST * n_lists, replace=False))]
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        present, starts = np.unique(assignment[order], return_index=True)
+        # Empty partitions keep their previous centroid
+        centroids[present] = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """Rows partitioned by their nearest k-means centroid"""
+
+    def __init__(self, centroids: np.ndarray, assignment: np.ndarray):
+        self.centroids = centroids
+        self.assignment = assignment
+        self.lists = [np.flatnonzero(assignment == index) for index in range(len(centroids))]
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: Optional[int] = None) -> 'IVFIndex':
+        n_lists = n_lists or max(int(np.sqrt(len(vectors))), 1)
+        centroids = kmeans(vectors, n_lists)
+        return cls(centroids, np.argmax(vectors @ centroids.T, axis=1))
+
+    def add(self, start_row: int, vectors: np.ndarray) -> None:
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        self.assignment = np.concatenate([self.assignment, assignment])
+        for offset, index in enumerate(assignment):
+            self.lists[index] = np.append(self.lists[index], start_row + offset)
+
+    def candidates(self, query: np.ndarray, probes: int) -> np.ndarray:
+        nearest = _top_k(self.centroids @ query, probes)
+        return np.concatenate([self.lists[index] for index in nearest])
+
+
+class MemoryService:
+    def __init__(self, embeddings: Embeddings, dims: int, directory: Optional[str] = None,
+                 ivf_threshold: int = IVF_THRESHOLD, ivf_probes: int = IVF_PROBES):
+        """
+        Args:
+            embeddings: Model used to embed memories and queries
+            dims: Vector dimensions of the model
+            directory: Where the store lives (defaults to MEMORY_DIR or output/memory)
+            ivf_threshold: Row count above which search uses the inverted-file index
+            ivf_probes: Partitions scored per query by the inverted-file index
+        """
+        self.embeddings = embeddings
+        self.dims = dims
+        self.directory = directory or os.getenv('MEMORY_DIR', DEFAULT_MEMORY_DIR)
+        self.ivf_threshold = ivf_threshold
+        self.ivf_probes = ivf_probes
+        self.vectors_path = os.path.join(self.directory, 'vectors.f32')
+        self.records_path = os.path.join(self.directory, 'records.jsonl')
+        self.ivf_path = os.path.join(self.directory, 'ivf.npz')
+
+        self.records: List[MemoryRecord] = []
+        self.type_index: Dict[str, np.ndarray] = {}
+        self.ivf: Optional[IVFIndex] = None
+        self.search_latency = LatencyStats('memory_search_ms')
+        self.session_index: Dict[str, np.ndarray] = {}
+        self.version = 0  # Bumped on every write
+        self.session_versions: Dict[str, int] = {}  # Bumped on every write of that call
+        self.listeners: List[Callable[[List[MemoryRecord]], None]] = []
+        self._recent: Dict[Any, deque] = {}  # By type, or by (session_id, type) for one call
+        self._type_rows: Dict[str, List[int]] = {}
+        self._session_rows: Dict[str, List[int]] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._ivf_build: Optional[threading.Thread] = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        torn = False
+        if os.path.exists(self.records_path):
+            with open(self.records_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.records.append(MemoryRecord(**json.loads(line)))
+                    except (json.JSONDecodeError, TypeError):
+                        torn = True
+                        break
+        row_bytes = self.dims * 4
+        vector_rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+
+        # A crash between the two appends leaves one file ahead of the other
+        rows = min(len(self.records), vector_rows)
+        if torn or rows < len(self.records):
+            del self.records[rows:]
+            self._rewrite_records()
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != rows * row_bytes:
+            os.truncate(self.vectors_path, rows * row_bytes)
+
+        for record in self.records:
+            self._remember(record)
+        self.type_index = {memory_type: np.array(rows, dtype=np.int64) for memory_type, rows in self._type_rows.items()}
+        self.session_index = {session_id: np.array(rows, dtype=np.int64) for session_id, rows in self._session_rows.items()}
+        self._remap()
+        self._load_ivf()
+
+    def _remember(self, record: MemoryRecord) -> None:
+        self._type_rows.setdefault(record.type, []).append(record.id)
+        keys = [None, record.type]
+        session_id = _session_of(record)
+        if session_id is not None:
+            self._session_rows.setdefault(session_id, []).append(record.id)
+            keys += [(session_id, None), (session_id, record.type)]
+        for key in keys:
+            if key not in self._recent:
+                self._recent[key] = deque(maxlen=RECENT_SIZE)
+            self._recent[key].append(record)
+
+    def _rewrite_records(self) -> None:
+        tmp_path = self.records_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(asdict(record)) + '\n')
+        os.replace(tmp_path, self.records_path)
+
+    def _remap(self) -> None:
+        rows = len(self.records)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dims)) if rows else None
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """All stored vectors, (rows, dims) float32 mapped from disk"""
+        if self._vectors is None or len(self._vectors) != len(self.records):
+            self._remap()
+        return self._vectors if self._vectors is not None else np.empty((0, self.dims), dtype=np.float32)
+
+    def _load_ivf(self) -> None:
+        if len(self.records) < self.ivf_threshold:
+            return
+        try:
+            saved = np.load(self.ivf_path)
+            centroids, assignment = saved['centroids'], saved['assignment']
+        except (FileNotFoundError, KeyError, ValueError):
+            self._build_ivf()
+            return
+        assignment = assignment[:len(self.records)]
+        self.ivf = IVFIndex(centroids, assignment)
+        if len(assignment) < len(self.records):
+            self.ivf.add(len(assignment), self.vectors[len(assignment):])
+
+    def _build_ivf(self) -> None:
+        self.ivf = IVFIndex.build(np.asarray(self.vectors))
+        self._save_ivf()
+
+    def _build_ivf_later(self) -> None:
+        """Train a new inverted-file index on a background thread; searches use the current one meanwhile"""
+        if self._ivf_build is not None and self._ivf_build.is_alive():
+            return
+        self._ivf_build = threading.Thread(target=self._rebuild_ivf, name='memory-ivf-build', daemon=True)
+        self._ivf_build.start()
+
+    def _rebuild_ivf(self) -> None:
+        with self._lock:
+            rows = len(self.records)
+            # Stored rows never change, so the mapped prefix can be read without the lock
+            vectors = self.vectors[:rows]
+        ivf = IVFIndex.build(np.asarray(vectors))
+        with self._lock:
+            if len(self.records) > rows:
+                ivf.add(rows, self.vectors[rows:])
+            self.ivf = ivf
+            self._save_ivf()
+
+    def wait_for_index(self, timeout: Optional[float] = None) -> None:
+        """Block until a background index build, if any, has finished"""
+        if self._ivf_build is not None:
+            self._ivf_build.join(timeout)
+
+    def _save_ivf(self) -> None:
+        tmp_path = self.ivf_path + '.tmp.npz'
+        np.savez(tmp_path, centroids=self.ivf.centroids, assignment=self.ivf.assignment)
+        os.replace(tmp_path, self.ivf_path)
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return await self.embeddings.aembed_matrix(texts)
+        return np.asarray(await self.embeddings.aembed_documents(texts), dtype=np.float32)
+
+    def _append(self, vectors: np.ndarray, entries: List[Dict[str, Any]]) -> List[MemoryRecord]:
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(entries), self.dims))
+        with self._lock:
+            start = len(self.records)
+            records = [MemoryRecord(id=start + offset, **entry) for offset, entry in enumerate(entries)]
+            # Vectors first: on load, rows without a record are dropped
+            with open(self.vectors_path, 'ab') as f:
+                vectors.tofile(f)
+            with open(self.records_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(asdict(record)) + '\n')
+            self.records.extend(records)
+            for record in records:
+                self._remember(record)
+            self.version += 1
+            for memory_type in {record.type for record in records}:
+                self.type_index[memory_type] = np.array(self._type_rows[memory_type], dtype=np.int64)
+            for session_id in {_session_of(record) for record in records} - {None}:
+                self.session_index[session_id] = np.array(self._session_rows[session_id], dtype=np.int64)
+                self.session_versions[session_id] = self.session_versions.get(session_id, 0) + 1
+
+            if self.ivf is not None:
+                # Rows added since the last build are reassigned on load rather than saved here
+                self.ivf.add(start, vectors)
+                if len(self.records) >= 2 * len(self.ivf.centroids) ** 2:
+                    self._build_ivf_later()  # Partitions have grown too large
+            elif len(self.records) >= self.ivf_threshold:
+                self._build_ivf_later()
+        return records
+
+    def _notify(self, records: List[MemoryRecord]) -> None:
+        for listener in list(self.listeners):
+            listener(records)
+
+    def add_vectors(self, vectors: np.ndarray, contents: List[str], memory_type: str,
+                    metadata: Optional[List[Dict[str, Any]]] = None) -> List[MemoryRecord]:
+        """Store memories whose embeddings are already known"""
+        records = self._append(vectors, self._entries(contents, memory_type, metadata))
+        self._notify(records)
+        return records
+
+    @staticmethod
+    def _entries(contents: List[str], memory_type: str,
+                 metadata: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        timestamp = datetime.now().isoformat()
+        metadata = metadata or [{} for _ in contents]
+        return [{'type': memory_type, 'content': content, 'metadata': meta, 'timestamp': timestamp}
+                for content, meta in zip(contents, metadata)]
+
+    async def add(self, content: str, memory_type: str, metadata: Optional[Dict[str, Any]] = None) -> MemoryRecord:
+        """Embed and store a memory"""
+        return (await self.add_many([content], memory_type, [metadata or {}]))[0]
+
+    async def add_many(self, contents: List[str], memory_type: str,
+                       metadata: Optional[List[Dict[str, Any]]] = None) -> List[MemoryRecord]:
+        """Embed and store several memories of one type in a single batch"""
+        vectors = await self._embed(contents)
+        # The file appends run off the event loop; listeners are still called on it
+        records = await asyncio.to_thread(self._append, vectors, self._entries(contents, memory_type, metadata))
+        self._notify(records)
+        return records
+
+    def search_vector(self, query: np.ndarray, k: int = 5, memory_type: Optional[str] = None,
+                      session_id: Optional[str] = None) -> List[MemoryRecord]:
+        """Top-k memories by cosine similarity to an embedding, optionally of one type and one call"""
+        start_time = time.perf_counter()
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(1, self.dims))[0]
+
+        # Writes run on worker threads; keep the rows, their types and the index consistent for this search
+        with self._lock:
+            vectors = self.vectors
+            type_rows = self.type_index.get(memory_type, np.empty(0, dtype=np.int64)) if memory_type is not None else None
+            if session_id is not None:
+                # One call's memories are few enough to score exactly
+                rows = self.session_index.get(session_id, np.empty(0, dtype=np.int64))
+                if type_rows is not None:
+                    rows = rows[np.isin(rows, type_rows)]
+            elif type_rows is not None and (self.ivf is None or len(type_rows) < self.ivf_threshold):
+                # Few enough to score exactly, so a rare type is never lost to the partitions probed
+                rows = type_rows
+            elif self.ivf is not None:
+                rows = self._probe(query, k, type_rows)
+            else:
+                rows = None
+
+            if rows is None:
+                scores = vectors @ query
+                best = _top_k(scores, k)
+                best_scores = scores[best]
+            else:
+                scores = vectors[rows] @ query if len(rows) else np.empty(0, dtype=np.float32)
+                ranked = _top_k(scores, k)
+                best, best_scores = rows[ranked], scores[ranked]
+            records = [self.records[row] for row in best]
+
+        results = []
+        for record, score in zip(records, best_scores):
+            results.append(MemoryRecord(record.id, record.type, record.content, record.metadata,
+                                        record.timestamp, float(score)))
+        self.search_latency.observe((time.perf_counter() - start_time) * 1000)
+        return results
+
+    def _probe(self, query: np.ndarray, k: int, type_rows: Optional[np.ndarray]) -> np.ndarray:
+        """Inverted-file candidates, probing more partitions until k of them are of the wanted type"""
+        probes = self.ivf_probes
+        while True:
+            rows = self.ivf.candidates(query, probes)
+            if type_rows is not None:
+                rows = rows[np.isin(rows, type_rows)]
+            if len(rows) >= k or probes >= len(self.ivf.centroids):
+                return rows
+            probes *= 2
+
+    async def search(self, query: str, k: int = 5, memory_type: Optional[str] = None,
+                     session_id: Optional[str] = None) -> List[MemoryRecord]:
+        """Top-k memories most similar to a text"""
+        if not self.records:
+            return []
+        with span("memory_search", k=k, memory_type=memory_type):
+            return self.search_vector((await self._embed([query]))[0], k, memory_type, session_id)
+
+    def recent(self, memory_type: Optional[str] = None, limit: int = 5,
+               session_id: Optional[str] = None) -> List[MemoryRecord]:
+        """Newest memories of a type (or of any type), newest first, without a search"""
+        recent = self._recent.get(memory_type if session_id is None else (session_id, memory_type), ())
+        return [recent[-i] for i in range(1, min(limit, len(recent)) + 1)]
+
+    def add_listener(self, listener: Callable[[List[MemoryRecord]], None]) -> None:
+        """Call `listener` with the records of every later write"""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[List[MemoryRecord]], None]) -> None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def session_version(self, session_id: str) -> int:
+        """Counter bumped by every write of one call, for caches that only read that call's memories"""
+        return self.session_versions.get(session_id, 0)
+
+    def by_type(self, memory_type: str) -> List[MemoryRecord]:
+        """All memories of a type, oldest first"""
+        return [self.records[row] for row in self.type_index.get(memory_type, [])]
+
+    def __len__(self) -> int:
+        return len(self.records)
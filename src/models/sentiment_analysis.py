@@ -0,0 +1,232 @@
+"""
+Sentiment of the prospect's utterances, shared by every call in the process.
+
+The HITL service needs to know when a prospect is getting frustrated. A
+transformer classifier per call would not fit in memory with dozens of
+calls, and running it once per utterance wastes most of each forward pass.
+SentimentEngine therefore holds a single model, loaded on first use, and
+micro-batches utterances from all calls:
+
+- the first utterance queued starts a `max_delay` deadline;
+- the batch runs when the deadline passes or `max_batch_size` utterances
+  are waiting, whichever comes first;
+- utterances queued while a batch is running form the next one.
+
+Results are cached by normalized text, so stock phrases ("okay", "no thanks")
+are scored once. Each call keeps an exponentially smoothed frustration score,
+so the HITL trigger reacts to a trend rather than to a single sharp remark:
+
+    engine = SentimentEngine()
+    sentiment = await engine.analyze("this is a waste of my time", call_id="call-1")
+    if engine.frustrated("call-1"):
+        ...
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from src.utils.metrics import LatencyStats
+
+DEFAULT_MODEL = 'distilbert-base-uncased-finetuned-sst-2-english'
+
+MAX_BATCH_SIZE = 32
+MAX_DELAY = 0.02  # Seconds an utterance waits for others to join its batch
+CACHE_SIZE = 4096
+
+# Weight of the newest utterance in the smoothed frustration score
+SMOOTHING = 0.3
+FRUSTRATION_THRESHOLD = 0.6
+
+
+@dataclass
+class Sentiment:
+    label: str  # 'positive' or 'negative'
+    negative: float  # Probability the utterance is negative, 0-1
+
+
+@dataclass
+class CallMood:
+    frustration: float = 0.0  # Smoothed negative probability
+    peak: float = 0.0
+    utterances: int = 0
+    updated_at: float = 0.0
+
+
+def normalize(text: str) -> str:
+    """Cache key of an utterance: lowercase, collapsed whitespace, no trailing punctuation"""
+    return re.sub(r'\s+', ' ', text.lower()).strip().rstrip('.!?,')
+
+
+class TransformersSentimentModel:
+    """Hugging Face text classification pipeline on the CPU, loaded on first use"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, device: str = 'cpu', torch_threads: Optional[int] = None):
+        self.model_name = model_name
+        self.device = device
+        self.torch_threads = torch_threads
+        self._pipeline = None
+
+    def __call__(self, texts: List[str]) -> List[Sentiment]:
+        if self._pipeline is None:
+            import torch
+            from transformers import pipeline
+            if self.torch_threads:
+                torch.set_num_threads(self.torch_threads)
+            self._pipeline = pipeline('sentiment-analysis', model=self.model_name, device=self.device)
+        results = []
+        for result in self._pipeline(texts, batch_size=len(texts), truncation=True):
+            label = result['label'].lower()
+            negative = result['score'] if label.startswith('neg') else 1 - result['score']
+            results.append(Sentiment('negative' if negative >= 0.5 else 'positive', negative))
+        return results
+
+
+class SentimentEngine:
+    def __init__(self, model: Optional[Callable[[List[str]], List[Sentiment]]] = None,
+                 max_batch_size: int = MAX_BATCH_SIZE, max_delay: float = MAX_DELAY,
+                 cache_size: int = CACHE_SIZE, smoothing: float = SMOOTHING,
+                 threshold: float = FRUSTRATION_THRESHOLD):
+        """
+        Args:
+            model: Scores a batch of texts (defaults to TransformersSentimentModel)
+            max_batch_size: Utterances scored in one forward pass
+            max_delay: Seconds the first utterance of a batch waits for others
+            cache_size: Scored utterances kept by normalized text
+            smoothing: Weight of the newest utterance in a call's frustration
+            threshold: Frustration at which a call counts as frustrated
+        """
+        self.model = model or TransformersSentimentModel()
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.cache_size = cache_size
+        self.smoothing = smoothing
+        self.threshold = threshold
+
+        self.cache: "OrderedDict[str, Sentiment]" = OrderedDict()
+        self.calls: Dict[str, CallMood] = {}
+        # One model instance, one forward pass at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sentiment')
+        self._pending: "OrderedDict[str, Tuple[str, asyncio.Future]]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.batches = 0
+        self.texts_scored = 0
+        self.latency = LatencyStats('sentiment_ms')  # Queue wait plus inference, cache misses only
+        self.batch_latency = LatencyStats('sentiment_batch_ms')
+
+    async def analyze(self, text: str, call_id: Optional[str] = None) -> Sentiment:
+        """Sentiment of one utterance, updating the call's frustration when `call_id` is given"""
+        key = normalize(text)
+        sentiment = self.cache.get(key)
+        if sentiment is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+        else:
+            start_time = time.perf_counter()
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = (text, asyncio.get_running_loop().create_future())
+                self._ensure_worker()
+                self._wakeup.set()
+            sentiment = await asyncio.shield(pending[1])
+            self.latency.observe((time.perf_counter() - start_time) * 1000)
+        if call_id is not None:
+            self._update_mood(call_id, sentiment)
+        return sentiment
+
+    async def analyze_many(self, texts: List[str], call_id: Optional[str] = None) -> List[Sentiment]:
+        """Sentiment of several utterances, batched together"""
+        return list(await asyncio.gather(*(self.analyze(text, call_id) for text in texts)))
+
+    async def stream(self, call_id: str, transcripts: AsyncIterator) -> AsyncIterator[Tuple[object, Sentiment]]:
+        """Score the final transcripts of a call, yielding each with its sentiment"""
+        async for transcript in transcripts:
+            if transcript.is_final and transcript.text:
+                yield transcript, await self.analyze(transcript.text, call_id)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            deadline = loop.time() + self.max_delay
+            while len(self._pending) < self.max_batch_size and loop.time() < deadline:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                self._wakeup.clear()
+            while self._pending:
+                batch = [self._pending.popitem(last=False) for _ in range(min(self.max_batch_size, len(self._pending)))]
+                await self._score(loop, batch)
+
+    async def _score(self, loop: asyncio.AbstractEventLoop, batch) -> None:
+        start_time = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self._executor, self.model, [text for _, (text, _) in batch])
+        except Exception as e:
+            for _, (_, future) in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batch_latency.observe((time.perf_counter() - start_time) * 1000)
+        self.batches += 1
+        self.texts_scored += len(batch)
+        for (key, (_, future)), sentiment in zip(batch, results):
+            self.cache[key] = sentiment
+            if not future.done():
+                future.set_result(sentiment)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _update_mood(self, call_id: str, sentiment: Sentiment) -> None:
+        mood = self.calls.setdefault(call_id, CallMood())
+        mood.frustration += self.smoothing * (sentiment.negative - mood.frustration)
+        mood.peak = max(mood.peak, mood.frustration)
+        mood.utterances += 1
+        mood.updated_at = time.time()
+
+    def frustration(self, call_id: str) -> float:
+        """Smoothed frustration of a call, 0 before its first utterance"""
+        mood = self.calls.get(call_id)
+        return mood.frustration if mood else 0.0
+
+    def frustrated(self, call_id: str) -> bool:
+        return self.frustration(call_id) >= self.threshold
+
+    def end_call(self, call_id: str) -> Optional[CallMood]:
+        """Forget a finished call, returning its final mood"""
+        return self.calls.pop(call_id, None)
+
+    def stats(self) -> Dict[str, object]:
+        """Cache, batching and latency figures"""
+        return {
+            'hits': self.hits,
+            'batches': self.batches,
+            'texts_per_batch': self.texts_scored / self.batches if self.batches else 0.0,
+            'cache_entries': len(self.cache),
+            'calls': len(self.calls),
+            'latency_ms': self.latency.summary(),
+            'batch_ms': self.batch_latency.summary()
+        }
+
+    async def shutdown(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,322 @@
+"""
+Local websocket ingest for audio and transcripts from the Chrome extension.
+
+The extension captures the prospect's microphone in the browser. This
+bridge is how that audio reaches the Python side. Each call connects to
+`ws://127.0.0.1:8765/audio/<call_id>` and sends:
+
+- a `hello` text message first:
+  `{"type": "hello", "sample_rate": 16000, "encoding": "pcm_s16le"}`,
+  where the encoding is `pcm_s16le`, `pcm_f32le` or `opus`;
+- binary audio frames, each an 8-byte little-endian float64 capture time
+  (ms since the epoch) followed by the payload;
+- the browser's speech recognition results as text messages:
+  `{"type": "transcript", "text": "...", "final": false, "timestamp": <ms>}`.
+
+Frames are decoded into a preallocated ring of float32 buffers rather than
+fresh arrays. Each frame is stamped with its receive time and its position
+in the stream, then fanned out to every subscriber of the call
+(transcription, barge-in detection, sentiment, ...). Each subscriber has a
+bounded queue and a policy:
+
+- a `block` subscriber makes the bridge stop reading the socket while its
+  queue is full, which pushes back on the sender;
+- a `drop_oldest` subscriber loses its oldest frames instead.
+
+Frame buffers are reused after `ring_size` frames. A consumer that keeps
+audio longer than that must copy it.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+from aiohttp import WSMsgType, web
+
+from src.transcription.transcription_service import SAMPLE_RATE, Transcript
+from src.utils.metrics import LatencyStats
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+HEADER = struct.Struct('<d')
+ENCODINGS = ('pcm_s16le', 'pcm_f32le', 'opus')
+POLICIES = ('block', 'drop_oldest')
+
+# Largest frame decoded in place: 120 ms at 48 kHz
+MAX_FRAME_SAMPLES = 5760
+
+
+@dataclass
+class AudioFrame:
+    samples: np.ndarray  # float32 view into the ring; copy to keep
+    seq: int
+    stream_time: float  # Seconds of audio before this frame
+    captured_at: Optional[float]  # Sender's capture time, ms since the epoch
+    received_at: float  # time.perf_counter() on arrival
+
+
+class Subscription:
+    """Async iterator over one subscriber's bounded queue"""
+
+    def __init__(self, stream: 'CallStream', maxsize: int, policy: str):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {POLICIES}")
+        self.stream = stream
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items: Deque[Any] = deque()
+        self.dropped = 0
+        self.closed = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+
+    async def put(self, item: Any) -> None:
+        if self.closed:
+            return
+        if self.policy == 'block':
+            while len(self.items) >= self.maxsize and not self.closed:
+                self._writable.clear()
+                await self._writable.wait()
+            if self.closed:
+                return
+        elif len(self.items) >= self.maxsize:
+            self.items.popleft()
+            self.dropped += 1
+        self.items.append(item)
+        self._readable.set()
+
+    def __aiter__(self) -> 'Subscription':
+        return self
+
+    async def __anext__(self):
+        while not self.items:
+            if self.closed:
+                raise StopAsyncIteration
+            self._readable.clear()
+            await self._readable.wait()
+        item = self.items.popleft()
+        self._writable.set()
+        return item
+
+    def end(self) -> None:
+        """Stop accepting items; iteration finishes once the queued ones are consumed"""
+        self.closed = True
+        self._readable.set()
+        self._writable.set()
+
+    def close(self) -> None:
+        """Unsubscribe; the bridge no longer waits on this subscriber"""
+        self.stream._unsubscribe(self)
+        self.end()
+
+
+class AudioSubscription(Subscription):
+    def samples(self):
+        """The frames' samples only, e.g. for TranscriptionService or BargeInDetector"""
+        async def samples():
+            async for frame in self:
+                yield frame.samples
+        return samples()
+
+
+class CallStream:
+    """Fan-out of one call's audio frames and transcripts"""
+
+    def __init__(self, call_id: str, ring_size: int = 64):
+        self.call_id = call_id
+        self.sample_rate = SAMPLE_RATE
+        self.encoding = 'pcm_s16le'
+        self.ring = np.zeros((ring_size, MAX_FRAME_SAMPLES), dtype=np.float32)
+        self._slot = 0
+        self._decoder = None
+        self._frame_subscribers: List[Subscription] = []
+        self._transcript_subscribers: List[Subscription] = []
+        self._utterance = 0
+
+        self.frames_received = 0
+        self.samples_received = 0
+        self.transport_latency = LatencyStats('audio_bridge_transport_ms')
+        self.connected = False
+
+    def frames(self, maxsize: int = 50, policy: str = 'block') -> AudioSubscription:
+        """Subscribe to the call's audio frames"""
+        subscription = AudioSubscription(self, maxsize, policy)
+        self._frame_subscribers.append(subscription)
+        return subscription
+
+    def transcripts(self, maxsize: int = 100, policy: str = 'block') -> Subscription:
+        """Subscribe to transcripts sent by the extension"""
+        subscription = Subscription(self, maxsize, policy)
+        self._transcript_subscribers.append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        for subscribers in (self._frame_subscribers, self._transcript_subscribers):
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+
+    def configure(self, hello: Dict[str, Any]) -> None:
+        encoding = hello.get('encoding', 'pcm_s16le')
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported encoding {encoding!r}")
+        self.encoding = encoding
+        self.sample_rate = int(hello.get('sample_rate', SAMPLE_RATE))
+        if encoding == 'opus':
+            # Optional dependency, only needed when the sender encodes Opus
+            import opuslib
+            self._decoder = opuslib.Decoder(self.sample_rate, 1)
+
+    def _decode(self, payload: bytes) -> np.ndarray:
+        """Samples of one frame; raises ValueError for a frame that cannot be decoded"""
+        if self.encoding == 'opus':
+            try:
+                payload = self._decoder.decode(bytes(payload), MAX_FRAME_SAMPLES)
+            except Exception as e:  # opuslib raises its own OpusError
+                raise ValueError(f"Undecodable Opus frame: {e}") from e
+        source = np.frombuffer(payload, dtype='<f4' if self.encoding == 'pcm_f32le' else '<i2')
+        if len(source) > MAX_FRAME_SAMPLES:
+            return source.astype(np.float32) / (1 if self.encoding == 'pcm_f32le' else 32768.0)
+        buffer = self.ring[self._slot, :len(source)]
+        self._slot = (self._slot + 1) % len(self.ring)
+        if self.encoding == 'pcm_f32le':
+            buffer[:] = source
+        else:
+            np.multiply(source, 1 / 32768.0, out=buffer, casting='unsafe')
+        return buffer
+
+    async def publish_audio(self, message: bytes) -> AudioFrame:
+        """Decode a binary frame and hand it to every frame subscriber"""
+        received_at = time.perf_counter()
+        captured_at = HEADER.unpack_from(message)[0] if len(message) >= HEADER.size else None
+        samples = self._decode(memoryview(message)[HEADER.size:])
+        frame = AudioFrame(samples, self.frames_received, self.samples_received / self.sample_rate,
+                           captured_at or None, received_at)
+        self.frames_received += 1
+        self.samples_received += len(samples)
+        if captured_at:
+            self.transport_latency.observe(max(time.time() * 1000 - captured_at, 0.0))
+        for subscription in list(self._frame_subscribers):
+            await subscription.put(frame)
+        return frame
+
+    async def publish_transcript(self, event: Dict[str, Any]) -> Transcript:
+        """Hand a transcript event from the extension to every transcript subscriber"""
+        is_final = bool(event.get('final'))
+        stream_time = self.samples_received / self.sample_rate
+        timestamp = event.get('timestamp')
+        latency_ms = max(time.time() * 1000 - timestamp, 0.0) if timestamp else 0.0
+        transcript = Transcript(event.get('text', '').strip(), is_final, self._utterance + 1,
+                                stream_time, stream_time, latency_ms)
+        if is_final:
+            self._utterance += 1
+        for subscription in list(self._transcript_subscribers):
+            await subscription.put(transcript)
+        return transcript
+
+    async def close(self) -> None:
+        """End every subscription"""
+        for subscription in self._frame_subscribers + self._transcript_subscribers:
+            subscription.end()
+        self._frame_subscribers.clear()
+        self._transcript_subscribers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'frames': self.frames_received,
+            'seconds': self.samples_received / self.sample_rate,
+            'dropped': sum(s.dropped for s in self._frame_subscribers),
+            'transport_ms': self.transport_latency.summary()
+        }
+
+
+class AudioBridge:
+    def __init__(self, host: str = DEFAULT_HOST, port: Optional[int] = None, ring_size: int = 64):
+        """
+        Args:
+            host: Interface to listen on (local only by default)
+            port: Port to listen on (defaults to AUDIO_BRIDGE_PORT or 8765; 0 picks a free one)
+            ring_size: Decoded frames kept before their buffers are reused
+        """
+        self.host = host
+        self.port = int(os.getenv('AUDIO_BRIDGE_PORT', DEFAULT_PORT)) if port is None else port
+        self.ring_size = ring_size
+        self.calls: Dict[str, CallStream] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    def call(self, call_id: str = 'default') -> CallStream:
+        """Stream of a call, created on first use so consumers can subscribe before it connects"""
+        if call_id not in self.calls:
+            self.calls[call_id] = CallStream(call_id, self.ring_size)
+        return self.calls[call_id]
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/audio"
+
+    async def start(self) -> 'AudioBridge':
+        app = web.Application()
+        app.router.add_get('/audio', self._handle)
+        app.router.add_get('/audio/{call_id}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        for stream in self.calls.values():
+            await stream.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> 'AudioBridge':
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.stop()
+
+    async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=1024 * 1024)
+        await ws.prepare(request)
+        stream = self.call(request.match_info.get('call_id', 'default'))
+        stream.connected = True
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.BINARY:
+                    try:
+                        # Awaiting blocking subscribers here is what pushes back on the sender
+                        await stream.publish_audio(msg.data)
+                    except ValueError as e:
+                        # One bad frame is reported and skipped; the call keeps its connection
+                        await ws.send_json({'type': 'error', 'error': str(e)})
+                elif msg.type == WSMsgType.TEXT:
+                    try:
+                        event = json.loads(msg.data)
+                    except ValueError as e:
+                        await ws.send_json({'type': 'error', 'error': f"Invalid JSON: {e}"})
+                        continue
+                    if not isinstance(event, dict):
+                        await ws.send_json({'type': 'error', 'error': "Expected a JSON object"})
+                        continue
+                    if event.get('type') == 'hello':
+                        try:
+                            stream.configure(event)
+                        except (ValueError, ImportError) as e:
+                            await ws.send_json({'type': 'error', 'error': str(e)})
+                            await ws.close()
+                            break
+                        await ws.send_json({'type': 'ready', 'call_id': stream.call_id})
+                    elif event.get('type') == 'transcript':
+                        await stream.publish_transcript(event)
+        finally:
+            stream.connected = False
+        return ws
@@ -0,0 +1,288 @@
+"""
+Streaming local speech transcription.
+
+Audio arrives as 16 kHz mono PCM frames, from the microphone through
+sounddevice or from a WAV/raw file. A cheap energy-based voice activity
+detector gates the model, so the transcriber only runs while someone is
+talking. During an utterance a local Whisper model is re-run over a sliding
+window of the latest audio every `partial_interval` seconds, giving partial
+transcripts while the prospect is still speaking. A final transcript of the
+whole utterance follows once they stop.
+
+Transcripts are consumed as an async stream:
+
+    service = TranscriptionService(WhisperTranscriber())
+    async for transcript in service.stream(microphone_frames()):
+        if not transcript.is_final:
+            ...  # early interrupt detection on transcript.text
+
+Usage:
+    python -m src.transcription.transcription_service [--file call.wav] [--model tiny.en]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+
+import numpy as np
+
+from src.utils.logger import configure, span
+from src.utils.metrics import LatencyStats
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+
+
+@dataclass
+class Transcript:
+    text: str
+    is_final: bool
+    utterance: int
+    audio_start: float  # Seconds into the stream
+    audio_end: float
+    latency_ms: float  # Since speech onset for partials, since end of speech for finals
+
+
+def _to_float(pcm: np.ndarray) -> np.ndarray:
+    if pcm.dtype == np.int16:
+        return pcm.astype(np.float32) / 32768.0
+    return pcm.astype(np.float32)
+
+
+async def microphone_frames(sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS,
+                            device: Optional[int] = None) -> AsyncIterator[np.ndarray]:
+    """Float32 frames from an input device"""
+    import sounddevice as sd
+
+    loop = asyncio.get_running_loop()
+    frames: asyncio.Queue = asyncio.Queue()
+
+    def callback(indata, frame_count, time_info, status):
+        loop.call_soon_threadsafe(frames.put_nowait, indata[:, 0].copy())
+
+    with sd.InputStream(samplerate=sample_rate, channels=1, dtype='float32', device=device,
+                        blocksize=sample_rate * frame_ms // 1000, callback=callback):
+        while True:
+            yield await frames.get()
+
+
+async def file_frames(path: str, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS,
+                      realtime: bool = False) -> AsyncIterator[np.ndarray]:
+    """Float32 frames from a 16-bit mono WAV file or raw little-endian PCM
+
+    Args:
+        realtime: Pace frames at the speed of speech instead of as fast as possible
+    """
+    if os.path.splitext(path)[1].lower() == '.wav':
+        with wave.open(path, 'rb') as f:
+            if f.getframerate() != sample_rate or f.getnchannels() != 1 or f.getsampwidth() != 2:
+                raise ValueError(f"{path} must be 16-bit mono PCM at {sample_rate} Hz")
+            pcm = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')
+    else:
+        pcm = np.fromfile(path, dtype='<i2')
+
+    samples = _to_float(pcm)
+    frame_size = sample_rate * frame_ms // 1000
+    for start in range(0, len(samples), frame_size):
+        yield samples[start:start + frame_size]
+        await asyncio.sleep(frame_ms / 1000 if realtime else 0)
+
+
+class EnergyVAD:
+    """Voice activity from frame energy against an adaptive noise floor"""
+
+    def __init__(self, ratio: float = 3.0, min_rms: float = 0.01, onset_frames: int = 3,
+                 hangover_frames: int = 15, floor_decay: float = 0.95):
+        """
+        Args:
+            ratio: Speech is this many times louder than the noise floor
+            min_rms: Frames quieter than this are never speech
+            onset_frames: Consecutive loud frames that start an utterance
+            hangover_frames: Consecutive quiet frames that end one
+            floor_decay: Smoothing of the noise floor estimate
+        """
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.onset_frames = onset_frames
+        self.hangover_frames = hangover_frames
+        self.floor_decay = floor_decay
+        self.noise_floor = min_rms / ratio
+        self.speaking = False
+        self._loud = 0
+        self._quiet = 0
+
+    def update(self, frame: np.ndarray) -> bool:
+        """Feed a frame, returning whether an utterance is in progress"""
+        rms = float(np.sqrt(np.mean(np.square(frame)))) if len(frame) else 0.0
+        loud = rms >= max(self.min_rms, self.noise_floor * self.ratio)
+        if not loud:
+            self.noise_floor = self.floor_decay * self.noise_floor + (1 - self.floor_decay) * rms
+        if self.speaking:
+            self._quiet = 0 if loud else self._quiet + 1
+            if self._quiet >= self.hangover_frames:
+                self.speaking, self._loud = False, 0
+        else:
+            self._loud = self._loud + 1 if loud else 0
+            if self._loud >= self.onset_frames:
+                self.speaking, self._quiet = True, 0
+        return self.speaking
+
+
+class WhisperTranscriber:
+    """Local Whisper model, loaded on first use"""
+
+    def __init__(self, model_name: str = 'base.en', language: str = 'en'):
+        self.model_name = model_name
+        self.language = language
+        self._model = None
+
+    def __call__(self, audio: np.ndarray) -> str:
+        if self._model is None:
+            import whisper
+            self._model = whisper.load_model(self.model_name)
+        result = self._model.transcribe(audio, language=self.language, fp16=False,
+                                        condition_on_previous_text=False)
+        return result['text'].strip()
+
+
+class TranscriptionService:
+    def __init__(self, transcriber: Callable[[np.ndarray], str], sample_rate: int = SAMPLE_RATE,
+                 vad: Optional[EnergyVAD] = None, partial_interval: float = 0.3,
+                 window_seconds: float = 8.0, preroll_seconds: float = 0.2):
+        """
+        Args:
+            transcriber: Turns float32 audio into text
+            sample_rate: Sample rate of the incoming frames
+            vad: Voice activity detector (defaults to EnergyVAD)
+            partial_interval: Seconds of new speech between partial transcripts
+            window_seconds: Partials transcribe at most this much of the latest audio
+            preroll_seconds: Audio kept from before the detected onset
+        """
+        self.transcriber = transcriber
+        self.sample_rate = sample_rate
+        self.vad = vad or EnergyVAD()
+        self.partial_interval = partial_interval
+        self.window_seconds = window_seconds
+        self.preroll_seconds = preroll_seconds
+        # One worker: a partial is skipped rather than queued behind a slow one
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='transcriber')
+        self.partial_latency = LatencyStats('transcription_first_partial_ms')
+        self.final_latency = LatencyStats('transcription_final_ms')
+
+    async def stream(self, frames: AsyncIterator[np.ndarray]) -> AsyncIterator[Transcript]:
+        """Partial and final transcripts of the utterances in a stream of frames"""
+        loop = asyncio.get_running_loop()
+        preroll = np.zeros(0, dtype=np.float32)
+        preroll_size = int(self.preroll_seconds * self.sample_rate)
+        chunks = []
+        utterance = 0
+        samples_seen = 0
+        speech_start = 0
+        onset_at = None
+        last_partial_samples = 0
+        partial: Optional[asyncio.Future] = None
+        partial_text = ''
+        has_partial = False
+
+        def audio() -> np.ndarray:
+            return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+        async for frame in frames:
+            frame = _to_float(np.asarray(frame)).reshape(-1)
+            samples_seen += len(frame)
+            was_speaking = self.vad.speaking
+            speaking = self.vad.update(frame)
+
+            if speaking and not was_speaking:
+                utterance += 1
+                onset_at = time.perf_counter()
+                chunks = [preroll]
+                speech_start = samples_seen - len(frame) - len(preroll)
+                last_partial_samples = 0
+                partial_text, has_partial = '', False
+
+            if speaking or was_speaking:
+                chunks.append(frame)
+            else:
+                preroll = np.concatenate([preroll, frame])[-preroll_size:] if preroll_size else preroll
+
+            if partial is not None and partial.done():
+                text, partial = partial.result(), None
+                if text and text != partial_text:
+                    latency_ms = (time.perf_counter() - onset_at) * 1000
+                    if not has_partial:
+                        self.partial_latency.observe(latency_ms)
+                        has_partial = True
+                    partial_text = text
+                    yield Transcript(text, False, utterance, speech_start / self.sample_rate,
+                                     samples_seen / self.sample_rate, latency_ms)
+
+            if speaking:
+                speech_samples = samples_seen - speech_start
+                if partial is None and speech_samples - last_partial_samples >= self.partial_interval * self.sample_rate:
+                    last_partial_samples = speech_samples
+                    window = audio()[-int(self.window_seconds * self.sample_rate):]
+                    partial = loop.run_in_executor(self._executor, self.transcriber, window)
+            elif was_speaking:
+                ended_at = time.perf_counter()
+                if partial is not None:
+                    await asyncio.wait([partial])
+                    partial = None
+                with span("transcription", utterance=utterance):
+                    text = await loop.run_in_executor(self._executor, self.transcriber, audio())
+                latency_ms = (time.perf_counter() - ended_at) * 1000
+                self.final_latency.observe(latency_ms)
+                chunks = []
+                if text:
+                    yield Transcript(text, True, utterance, speech_start / self.sample_rate,
+                                     samples_seen / self.sample_rate, latency_ms)
+
+        # The stream ended mid-utterance
+        if self.vad.speaking and chunks:
+            if partial is not None:
+                await asyncio.wait([partial])
+            ended_at = time.perf_counter()
+            with span("transcription", utterance=utterance):
+                text = await loop.run_in_executor(self._executor, self.transcriber, audio())
+            latency_ms = (time.perf_counter() - ended_at) * 1000
+            self.final_latency.observe(latency_ms)
+            if text:
+                yield Transcript(text, True, utterance, speech_start / self.sample_rate,
+                                 samples_seen / self.sample_rate, latency_ms)
+
+    def stats(self):
+        """Latency summaries of first partials and finals"""
+        return {'first_partial_ms': self.partial_latency.summary(), 'final_ms': self.final_latency.summary()}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _main(args) -> None:
+    service = TranscriptionService(WhisperTranscriber(args.model))
+    frames = file_frames(args.file, realtime=True) if args.file else microphone_frames()
+    try:
+        async for transcript in service.stream(frames):
+            kind = 'final' if transcript.is_final else 'partial'
+            print(f"[{transcript.audio_start:6.2f}s #{transcript.utterance} {kind} {transcript.latency_ms:5.0f}ms] "
+                  f"{transcript.text}")
+    finally:
+        print(json.dumps(service.stats(), indent=2))
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    configure()
+    parser = argparse.ArgumentParser(description="Transcribe the microphone or a file with partial results")
+    parser.add_argument('--file', help="16 kHz mono WAV or raw 16-bit PCM; the microphone when omitted")
+    parser.add_argument('--model', default='base.en')
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
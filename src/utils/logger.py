@@ -0,0 +1,392 @@
+"""
+Structured logs, stage timings and a Prometheus endpoint for live calls.
+
+Every record is one JSON line carrying the call and session ids of the code
+that logged it. The ids live in context variables, so they follow a call
+through its asyncio tasks:
+
+    log = get_logger(__name__)
+    with call_context("call-1"):
+        log.info("Playing clip", extra={"clip": "base1.mp4"})
+
+Spans time the stages of a turn: transcription, classification, memory
+search, LLM, render, download and the OBS switch. Each span feeds a
+histogram per stage and, at debug level, logs its duration:
+
+    with span("render", chars=len(text)):
+        path = render_talk(text)
+
+A render covers creating the talk and waiting for it; downloading the
+result is a span of its own. The latest spans are kept in memory, so
+`recent_spans(call_id)` shows where a slow turn spent its time. Counters and histograms are served in the Prometheus text
+format by MetricsServer (GET /metrics), along with every LatencyStats
+(src.utils.metrics), each of which feeds a histogram of this registry.
+
+Importing this module installs no handler. Process entry points (the
+SessionManager and each CLI `__main__`) call configure() to send JSON lines
+to stderr.
+
+TELEMETRY=off (or configure(enabled=False)) turns spans and metrics into
+no-ops and drops info and debug records. Warnings and errors are still
+logged.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+ROOT_LOGGER = 'src'
+
+STAGES = ('transcription', 'classification', 'memory_search', 'llm', 'render', 'download', 'obs_switch')
+
+DURATION_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+RECENT_SPANS = 2000
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9464
+
+ENABLED = os.getenv('TELEMETRY', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+call_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('call_id', default=None)
+session_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('session_id', default=None)
+
+
+@contextlib.contextmanager
+def call_context(call_id: Optional[str], session_id: Optional[str] = None) -> Iterator[None]:
+    """Tag logs and spans of the enclosed code (and tasks it creates) with a call"""
+    call_token = call_id_var.set(call_id)
+    session_token = session_id_var.set(session_id or call_id)
+    try:
+        yield
+    finally:
+        session_id_var.reset(session_token)
+        call_id_var.reset(call_token)
+
+
+# Metrics
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if not ENABLED:
+            return
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels: Any) -> float:
+        return self.values.get(tuple(str(labels.get(name, '')) for name in self.labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self.values.items())
+        lines.extend(f'{self.name}{_labels(self.labels, key)} {value:g}' for key, value in values)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DURATION_BUCKETS_MS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: observations per bucket (the last one is +Inf), sum, count
+        self.values: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not ENABLED:
+            return
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        entry = self.values.get(tuple(str(labels.get(name, '')) for name in self.labels))
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items())
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, observed in zip(self.buckets + (float('inf'),), counts):
+                cumulative += observed
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, key)} {total:g}')
+            lines.append(f'{self.name}_count{_labels(self.labels, key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name: str, help: str, labels: Tuple[str, ...], **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = kind(name, help, labels, **kwargs)
+            elif not isinstance(metric, kind):
+                raise ValueError(f"Metric {name} is already registered as a {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DURATION_BUCKETS_MS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = [self.metrics[name] for name in sorted(self.metrics)]
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.histogram('edchambers_stage_duration_ms', 'Duration of each stage of a call turn', ('stage',))
+STAGE_ERRORS = REGISTRY.counter('edchambers_stage_errors_total', 'Stages that raised', ('stage',))
+CLIP_GAP = REGISTRY.histogram('edchambers_clip_gap_ms', 'Dead air between the end of a clip and the start of the next')
+INTERRUPTIONS = REGISTRY.counter('edchambers_interruptions_total', 'Interruptions handled, by interrupt type', ('type',))
+
+
+# Spans
+
+_recent: Deque[Dict[str, Any]] = deque(maxlen=RECENT_SPANS)
+
+
+class Span:
+    __slots__ = ('stage', 'fields', 'start', 'duration_ms')
+
+    def __init__(self, stage: str, fields: Dict[str, Any]):
+        self.stage = stage
+        self.fields = fields
+        self.start = 0.0
+        self.duration_ms = 0.0
+
+    def annotate(self, **fields: Any) -> None:
+        """Add fields known only once the stage has run, e.g. a token count"""
+        self.fields.update(fields)
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        STAGE_DURATION.observe(self.duration_ms, stage=self.stage)
+        entry = {'stage': self.stage, 'duration_ms': round(self.duration_ms, 3), 'call_id': call_id_var.get(),
+                 'session_id': session_id_var.get(), **self.fields}
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.stage)
+            entry['error'] = exc_type.__name__
+        _recent.append(entry)
+        if _span_log.isEnabledFor(logging.DEBUG):
+            _span_log.debug('span', extra=entry)
+        return False
+
+
+class _NoopSpan:
+    """Stands in for every span while telemetry is off"""
+    __slots__ = ()
+    stage = None
+    duration_ms = 0.0
+
+    def annotate(self, **fields: Any) -> None:
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(stage: str, **fields: Any):
+    """Time a stage of the current call: `with span("llm"):`"""
+    if not ENABLED:
+        return NOOP_SPAN
+    return Span(stage, fields)
+
+
+def traced(stage: str) -> Callable:
+    """Decorator running every call of a function, sync or async, in a span"""
+    def decorate(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with span(stage):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with span(stage):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def recent_spans(call_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """The latest spans, oldest first, optionally of one call only"""
+    spans = list(_recent)
+    return spans if call_id is None else [entry for entry in spans if entry['call_id'] == call_id]
+
+
+# Logs
+
+class JsonFormatter(logging.Formatter):
+    # Attributes every LogRecord has; anything else came in through `extra`
+    STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'call_id', 'session_id'}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key in ('call_id', 'session_id'):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        for key, value in record.__dict__.items():
+            if key not in self.STANDARD and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class CallContextFilter(logging.Filter):
+    """Copies the call and session ids onto records, in the thread that logs them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'call_id', None) is None:
+            record.call_id = call_id_var.get()
+        if getattr(record, 'session_id', None) is None:
+            record.session_id = session_id_var.get()
+        return True
+
+
+_handler: Optional[logging.Handler] = None
+
+
+def configure(enabled: Optional[bool] = None, level: Optional[str] = None, stream=None) -> None:
+    """Switch telemetry on or off and (re)install the JSON handler
+
+    Args:
+        enabled: Record spans and metrics and keep info/debug logs (defaults to TELEMETRY)
+        level: Log level (defaults to LOG_LEVEL or INFO)
+        stream: Where JSON lines go (defaults to stderr)
+    """
+    global ENABLED, _handler
+    if enabled is not None:
+        ENABLED = enabled
+    root = logging.getLogger(ROOT_LOGGER)
+    if _handler is None:
+        _handler = logging.StreamHandler(stream or sys.stderr)
+        _handler.setFormatter(JsonFormatter())
+        _handler.addFilter(CallContextFilter())
+        root.addHandler(_handler)
+        root.propagate = False
+    elif stream is not None:
+        _handler.setStream(stream)
+    level = logging.getLevelName((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
+    root.setLevel(level if ENABLED else max(level, logging.WARNING))
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger writing JSON lines; modules pass their __name__"""
+    if name != ROOT_LOGGER and not name.startswith(ROOT_LOGGER + '.'):
+        # Scripts run as __main__ still go through the JSON handler
+        name = f'{ROOT_LOGGER}.{name}'
+    return logging.getLogger(name)
+
+
+_span_log = get_logger('src.utils.spans')
+
+
+# Endpoint
+
+class MetricsServer:
+    """Serves the registry at http://host:port/metrics for Prometheus to scrape"""
+
+    def __init__(self, host: str = METRICS_HOST, port: Optional[int] = None, registry: Registry = REGISTRY):
+        self.host = host
+        self.port = int(os.getenv('METRICS_PORT', METRICS_PORT)) if port is None else port
+        self.registry = registry
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/metrics'
+
+    async def _metrics(self, request):
+        from aiohttp import web
+        return web.Response(body=self.registry.render().encode(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def start(self) -> 'MetricsServer':
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', self._metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> 'MetricsServer':
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.stop()
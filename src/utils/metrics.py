@@ -0,0 +1,68 @@
+"""
+Lightweight latency metrics shared by the playback, voice and agent services.
+
+Every LatencyStats also feeds the histogram edchambers_<name> of the metrics
+registry, so what a service measures is served on /metrics as well.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from src.utils.logger import REGISTRY, Registry
+
+
+class LatencyStats:
+    """Collects latency samples in milliseconds and reports percentiles.
+
+    Only the most recent `max_samples` observations are kept so long-running
+    calls do not grow memory without bound. Instances sharing a name share
+    one registry histogram; pass registry=None to keep the samples local.
+    """
+
+    def __init__(self, name: str, max_samples: int = 10000, registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self._lock = threading.Lock()
+        self.histogram = None
+        if registry is not None:
+            self.histogram = registry.histogram(f'edchambers_{name}', f'{name} latency samples')
+
+    def observe(self, value_ms: float) -> None:
+        """Record one latency sample"""
+        with self._lock:
+            self.samples.append(value_ms)
+            self.count += 1
+        if self.histogram is not None:
+            self.histogram.observe(value_ms)
+
+    def percentile(self, p: float) -> float:
+        """Nearest-rank percentile of the retained samples (0 when empty)"""
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        rank = max(int(round(p / 100 * len(ordered))) - 1, 0)
+        return ordered[min(rank, len(ordered) - 1)]
+
+    @property
+    def last(self) -> float:
+        """Most recent sample (0 when empty)"""
+        with self._lock:
+            return self.samples[-1] if self.samples else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean and p50/p95/p99/max of the retained samples"""
+        with self._lock:
+            samples = list(self.samples)
+        if not samples:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "count": self.count,
+            "mean": sum(samples) / len(samples),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": max(samples)
+        }
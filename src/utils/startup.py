@@ -0,0 +1,127 @@
+"""
+Cold-start benchmark for a call worker.
+
+Each run starts a fresh interpreter with `python -X importtime`. It imports
+the agent module and constructs a SalesAgent with no OBS, LLM or embedding
+service reachable. It reports:
+
+- the import time of the module, from the importtime trace;
+- the modules that cost the most, by self time;
+- the construction time of the agent;
+- which heavy libraries were loaded eagerly.
+
+With a budget set, the benchmark fails when the median cold start exceeds it.
+
+Usage:
+    python -m src.utils.startup [--runs 5] [--top 15] [--budget-ms 1500] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULE = 'src.agents.sales_agent'
+
+# Libraries that should only load once a call needs them
+LAZY_MODULES = ('langgraph', 'langmem', 'langchain_groq', 'langchain', 'openai', 'transformers', 'torch', 'whisper')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+# Runs in the fresh interpreter; prints one JSON line after the importtime trace
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module} as target
+imported = time.perf_counter()
+{construct}
+ready = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "construct_ms": (ready - imported) * 1000,
+    "loaded": [name for name in {lazy!r} if name in sys.modules]
+}}))
+'''
+
+
+def parse_importtime(trace: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, nesting depth) of each line of an importtime trace"""
+    entries = []
+    for line in trace.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    return entries
+
+
+def measure(module: str = DEFAULT_MODULE, construct: str = 'target.SalesAgent()') -> Dict[str, object]:
+    """One cold start in a fresh interpreter"""
+    probe = PROBE.format(module=module, construct=construct or 'pass', lazy=LAZY_MODULES)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, MEMORY_DIR=os.path.join(tmp, 'memory'),
+                   EMBEDDING_CACHE_DIR=os.path.join(tmp, 'embeddings'), PYTHONDONTWRITEBYTECODE='1')
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], capture_output=True,
+                                text=True, env=env, cwd=os.getcwd())
+    if result.returncode != 0:
+        raise RuntimeError(f"Cold start failed:\n{result.stderr[-2000:]}")
+    entries = parse_importtime(result.stderr)
+    cumulative = {name: total for name, _, total, _ in entries}
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['importtime_ms'] = cumulative.get(module, 0) / 1000
+    report['modules'] = entries
+    report['total_ms'] = report['import_ms'] + report['construct_ms']
+    return report
+
+
+def benchmark(module: str = DEFAULT_MODULE, runs: int = 5, top: int = 15,
+              construct: str = 'target.SalesAgent()') -> Dict[str, object]:
+    """Median of several cold starts, with the slowest modules of the last one"""
+    reports = [measure(module, construct) for _ in range(runs)]
+    last = reports[-1]
+    slowest = sorted(last['modules'], key=lambda entry: entry[1], reverse=True)[:top]
+    return {
+        'module': module,
+        'runs': runs,
+        'import_ms': statistics.median(r['import_ms'] for r in reports),
+        'construct_ms': statistics.median(r['construct_ms'] for r in reports),
+        'total_ms': statistics.median(r['total_ms'] for r in reports),
+        'eager_heavy_modules': last['loaded'],
+        'slowest_modules': [{'module': name, 'self_ms': own / 1000, 'cumulative_ms': total / 1000}
+                            for name, own, total, _ in slowest]
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure the cold start of a call worker")
+    parser.add_argument('--module', default=DEFAULT_MODULE)
+    parser.add_argument('--construct', default='target.SalesAgent()',
+                        help="Statement run after the import, with the module bound to `target`")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, help="Fail when the median cold start is slower")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    result = benchmark(args.module, args.runs, args.top, args.construct)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['module']}: import {result['import_ms']:.0f} ms, construct {result['construct_ms']:.0f} ms, "
+              f"total {result['total_ms']:.0f} ms (median of {result['runs']})")
+        if result['eager_heavy_modules']:
+            print(f"Loaded eagerly: {', '.join(result['eager_heavy_modules'])}")
+        for entry in result['slowest_modules']:
+            print(f"  {entry['self_ms']:8.1f} ms self {entry['cumulative_ms']:8.1f} ms cumulative  {entry['module']}")
+    if args.budget_ms is not None and result['total_ms'] > args.budget_ms:
+        print(f"Cold start of {result['total_ms']:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,48 +1,121 @@
 import obsws_python as obs
+import itertools
+import threading
 import time
 import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from src.utils.logger import CLIP_GAP, configure, get_logger, span
+from src.video.obs_settings import CENTERED_1080P, media_settings
+
+log = get_logger(__name__)
+
 # Load environment variables
 load_dotenv()
 OBS_SERVER_PWD = os.getenv('OBS_SERVER_PWD')
 VIDEO_FOLDER = os.getenv('VIDEO_FOLDER')
 
-# Validate environment variables
-if not OBS_SERVER_PWD:
-    raise ValueError("OBS_SERVER_PWD not found in environment variables. Check your .env file.")
-if not VIDEO_FOLDER:
-    raise ValueError("VIDEO_FOLDER not found in environment variables. Check your .env file.")
+MEDIA_END_STATES = ["OBS_MEDIA_STATE_STOPPED", "OBS_MEDIA_STATE_ENDED", "OBS_MEDIA_STATE_ERROR"]
+
+# How long to wait on events before double-checking the media state with a request
+EVENT_FALLBACK_INTERVAL = 5.0
+
+# The two sources the gapless player alternates between
+GAPLESS_SOURCES = ('VideoPlayerA', 'VideoPlayerB')
+
+
+class MediaEventTracker:
+    """Records OBS media started/ended events per input so playback can block on them."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._counts = {}
+        self._times = {}
+
+    def record(self, input_name, kind):
+        """Record an event of `kind` ('started' or 'ended') for an input"""
+        with self._cond:
+            key = (input_name, kind)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._times[key] = time.perf_counter()
+            self._cond.notify_all()
+
+    def count(self, input_name, kind):
+        """Number of `kind` events seen so far for an input"""
+        with self._cond:
+            return self._counts.get((input_name, kind), 0)
+
+    def wait(self, input_name, kind, after, timeout=None, abort=None):
+        """Wait until more than `after` events of `kind` have been seen.
+
+        Returns the perf_counter timestamp of the latest event, or None if the
+        timeout expired or `abort()` returned True.
+        """
+        key = (input_name, kind)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._counts.get(key, 0) <= after:
+                if abort is not None and abort():
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._times[key]
+
+    def wake(self):
+        """Wake all waiters so they re-check their abort condition"""
+        with self._cond:
+            self._cond.notify_all()
+
 
 class MediaPlayer:
-    def __init__(self, host='localhost', port=4455, password=OBS_SERVER_PWD):
+    def __init__(self, host='localhost', port=4455, password=None, event_driven=True):
+        # Validated here rather than at import, so importing this module never needs OBS configured
+        password = password or os.getenv('OBS_SERVER_PWD')
+        if not password:
+            raise ValueError("OBS_SERVER_PWD not found in environment variables. Check your .env file.")
+        self.events = MediaEventTracker()
+        self.event_client = None
+        self.clip_gaps = []  # Per-clip dead air between clips, in milliseconds
+        self._scene_item_ids = {}
         try:
-            print(f"Connecting to OBS WebSocket server on {host}:{port}...")
+            log.info("Connecting to OBS WebSocket server on %s:%s", host, port)
             self.client = obs.ReqClient(host=host, port=port, password=password)
-            print("Successfully connected to OBS!")
+            log.info("Connected to OBS")
         except obs.error.OBSSDKError as e:
-            print("\nConnection Error! Please check:")
-            print("1. Is OBS running?")
-            print("2. Is the WebSocket server enabled? (Tools -> obs-websocket Settings)")
-            print("3. Is the port correct? (Should be 4455)")
-            print("4. Is the password correct?")
-            print(f"\nError details: {str(e)}")
+            log.error("Could not connect to OBS. Check that OBS is running, its WebSocket server is enabled "
+                      "(Tools -> obs-websocket Settings), and the port (4455) and password are correct: %s", e)
             raise
-        
-    def setup_media_source(self, source_name='VideoPlayer'):
+
+        if event_driven:
+            try:
+                self.event_client = obs.EventClient(host=host, port=port, password=password)
+                self.event_client.callback.register([
+                    self.on_media_input_playback_started,
+                    self.on_media_input_playback_ended
+                ])
+            except (obs.error.OBSSDKError, OSError) as e:
+                log.warning("Could not subscribe to OBS media events, falling back to polling: %s", e)
+                self.event_client = None
+
+    @property
+    def event_driven(self):
+        """True when media events are being received from OBS"""
+        return self.event_client is not None
+
+    def on_media_input_playback_started(self, data):
+        self.events.record(data.input_name, 'started')
+
+    def on_media_input_playback_ended(self, data):
+        self.events.record(data.input_name, 'ended')
+
+    def setup_media_source(self, source_name='VideoPlayer', visible=True):
         """Create or get the media source"""
         try:
             # First try to create a new media source with required settings
-            input_settings = {
-                'is_local_file': True,
-                'local_file': '',  # Will be set later for each video
-                'looping': False,
-                'restart_on_activate': False,
-                'close_when_inactive': False,
-                'hw_decode': True,
-                'clear_on_media_end': False
-            }
+            input_settings = media_settings()  # File will be set later for each video
             
             # Create the input if it doesn't exist
             self.client.create_input(
@@ -50,125 +123,242 @@ class MediaPlayer:
                 inputName=source_name,
                 inputKind='ffmpeg_source',
                 inputSettings=input_settings,
-                sceneItemEnabled=True
+                sceneItemEnabled=visible
             )
-            print(f"Created new media source: {source_name}")
-            
-            # Set the transform to make it visible in the center
-            transform = {
-                "alignment": 5,  # Center
-                "height": 1080.0,
-                "positionX": 960.0,  # Half of 1920 for center
-                "positionY": 540.0,  # Half of 1080 for center
-                "rotation": 0.0,
-                "scaleX": 1.0,
-                "scaleY": 1.0,
-                "width": 1920.0
-            }
+            log.info("Created new media source %s", source_name)
             
             # Get the scene item ID first
             scene_item_id = self.client.get_scene_item_id("Scene", source_name).scene_item_id
             
-            # Set the transform
-            self.client.set_scene_item_transform("Scene", scene_item_id, transform)
-            print("Set video transform to be visible in preview")
+            # Set the transform to make it visible in the center
+            self.client.set_scene_item_transform("Scene", scene_item_id, CENTERED_1080P)
             
         except obs.error.OBSSDKError as e:
             if "already exists" in str(e):
-                print(f"Using existing media source: {source_name}")
+                log.info("Using existing media source %s", source_name)
                 # Still try to set transform for existing source
                 try:
                     scene_item_id = self.client.get_scene_item_id("Scene", source_name).scene_item_id
-                    transform = {
-                        "alignment": 5,  # Center
-                        "height": 1080.0,
-                        "positionX": 960.0,  # Half of 1920 for center
-                        "positionY": 540.0,  # Half of 1080 for center
-                        "rotation": 0.0,
-                        "scaleX": 1.0,
-                        "scaleY": 1.0,
-                        "width": 1920.0
-                    }
-                    self.client.set_scene_item_transform("Scene", scene_item_id, transform)
-                    print("Updated existing source transform")
+                    self.client.set_scene_item_transform("Scene", scene_item_id, CENTERED_1080P)
+                    self.set_source_visible(source_name, visible)
                 except Exception as e:
-                    print(f"Warning: Could not update transform: {e}")
+                    log.warning("Could not update the transform of %s: %s", source_name, e)
             else:
                 raise
         return source_name
 
-    def wait_for_media_end(self, source_name):
-        """Wait for media to finish playing"""
+    def set_source_visible(self, source_name, visible):
+        """Show or hide a source's scene item"""
+        if source_name not in self._scene_item_ids:
+            self._scene_item_ids[source_name] = self.client.get_scene_item_id("Scene", source_name).scene_item_id
+        self.client.set_scene_item_enabled("Scene", self._scene_item_ids[source_name], visible)
+
+    def media_ended(self, source_name):
+        """Check the media state with a request"""
+        media_info = self.client.get_media_input_status(source_name)
+        return media_info.media_state in MEDIA_END_STATES
+
+    def wait_for_media_start(self, source_name, after, timeout=EVENT_FALLBACK_INTERVAL):
+        """Wait for the next media-started event, returning its timestamp"""
+        if not self.event_driven:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                media_info = self.client.get_media_input_status(source_name)
+                if media_info.media_state == "OBS_MEDIA_STATE_PLAYING":
+                    break
+                time.sleep(0.05)
+            return time.perf_counter()
+
+        started_at = self.events.wait(source_name, 'started', after, timeout=timeout)
+        if started_at is None:
+            # Event never arrived (e.g. OBS was already playing); fall back to now
+            started_at = time.perf_counter()
+        return started_at
+
+    def wait_for_media_end(self, source_name, after=None, abort=None):
+        """Wait for media to finish playing, returning the time it ended.
+
+        Returns None if `abort()` became true first; callers waking the wait
+        early should call `self.events.wake()` after setting their flag.
+        """
+        if self.event_driven:
+            if after is None:
+                after = self.events.count(source_name, 'ended')
+            while True:
+                ended_at = self.events.wait(source_name, 'ended', after,
+                                            timeout=EVENT_FALLBACK_INTERVAL, abort=abort)
+                if ended_at is not None:
+                    return ended_at
+                if abort is not None and abort():
+                    return None
+                try:
+                    # Safety net for stops/errors, which do not emit an ended event
+                    if self.media_ended(source_name):
+                        return time.perf_counter()
+                except Exception as e:
+                    log.error("Error checking media state of %s: %s", source_name, e)
+                    return time.perf_counter()
+
         while True:
             try:
-                media_info = self.client.get_media_input_status(source_name)
-                state = media_info.media_state
-                if state in ["OBS_MEDIA_STATE_STOPPED", "OBS_MEDIA_STATE_ENDED", "OBS_MEDIA_STATE_ERROR"]:
-                    return
-                time.sleep(0.5)
+                if self.media_ended(source_name):
+                    return time.perf_counter()
+                next_poll = time.monotonic() + 0.5
+                while time.monotonic() < next_poll:
+                    if abort is not None and abort():
+                        return None
+                    time.sleep(0.01)
             except Exception as e:
-                print(f"Error checking media state: {e}")
-                return
+                log.error("Error checking media state of %s: %s", source_name, e)
+                return time.perf_counter()
+
+    def play_clip(self, video_file, source_name='VideoPlayer', previous_end=None):
+        """Load and play a single clip, blocking until it has finished.
+
+        Returns the time the clip ended so the next call can measure the gap.
+        """
+        video_file = Path(video_file)
+        started_count = self.events.count(source_name, 'started')
+        ended_count = self.events.count(source_name, 'ended')
+        requested_at = time.perf_counter()
+
+        if not self.event_driven:
+            # Stop current playback
+            self.client.trigger_media_input_action(source_name, "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_STOP")
+            time.sleep(1)  # Give it a moment to stop
+
+        with span("obs_switch", clip=video_file.name):
+            # Set the media file path
+            self.client.set_input_settings(source_name, media_settings(video_file), True)
+            if not self.event_driven:
+                time.sleep(1)  # Give OBS a moment to load the file
+
+            # Start playing
+            self.client.trigger_media_input_action(source_name, "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY")
+
+            if self.event_driven:
+                started_at = self.wait_for_media_start(source_name, started_count)
+            else:
+                media_info = self.client.get_media_input_status(source_name)
+                log.debug("Initial state of %s: %s", source_name, media_info.media_state)
+                started_at = time.perf_counter()
+
+        gap_ms = (started_at - (previous_end or requested_at)) * 1000
+        self.clip_gaps.append({'clip': video_file.name, 'gap_ms': gap_ms})
+        CLIP_GAP.observe(gap_ms)
+        log.debug("Gap before %s: %.1f ms", video_file.name, gap_ms, extra={'clip': video_file.name, 'gap_ms': gap_ms})
+
+        # Wait for the video to actually finish
+        return self.wait_for_media_end(source_name, after=ended_count)
+
+    def preload_clip(self, video_file, source_name, start_at=0.0):
+        """Open a clip on a hidden source and leave it paused `start_at` seconds in (its first frame by default)"""
+        started_count = self.events.count(source_name, 'started')
+        self.client.set_input_settings(source_name, media_settings(video_file), True)
+        self.client.trigger_media_input_action(source_name, "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY")
+        self.wait_for_media_start(source_name, started_count)
+        self.client.trigger_media_input_action(source_name, "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PAUSE")
+        self.client.set_media_input_cursor(source_name, int(start_at * 1000))
+
+    def switch_to(self, source_name, hide=None):
+        """Start a preloaded source and bring it on screen, returning when it was shown"""
+        with span("obs_switch", source=source_name):
+            self.client.trigger_media_input_action(source_name, "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY")
+            # Show the new source before hiding the old one so there is never an empty frame
+            self.set_source_visible(source_name, True)
+            if hide is not None:
+                self.set_source_visible(hide, False)
+        return time.perf_counter()
+
+    def play_gapless(self, clips, sources=GAPLESS_SOURCES):
+        """Play clips back to back on two alternating sources.
+
+        While one source is on screen the next clip is loaded and paused on the
+        hidden one, so moving to the next clip is a visibility flip at
+        end-of-media rather than a file reload.
+
+        Args:
+            clips: Iterable of video file paths, consumed lazily
+            sources: Names of the two ffmpeg sources to alternate between
+        """
+        front = self.setup_media_source(sources[0], visible=True)
+        back = self.setup_media_source(sources[1], visible=False)
+        clips = iter(clips)
 
-    def play_videos(self, video_folder, source_name='VideoPlayer'):
+        current = next(clips, None)
+        if current is None:
+            return
+        self.preload_clip(current, front)
+        upcoming = next(clips, None)
+        previous_end = None
+
+        while current is not None:
+            ended_count = self.events.count(front, 'ended')
+            shown_at = self.switch_to(front, hide=back)
+            if previous_end is not None:
+                gap_ms = (shown_at - previous_end) * 1000
+                self.clip_gaps.append({'clip': Path(current).name, 'gap_ms': gap_ms})
+                CLIP_GAP.observe(gap_ms)
+                log.debug("Gap before %s: %.1f ms", Path(current).name, gap_ms,
+                          extra={'clip': Path(current).name, 'gap_ms': gap_ms})
+
+            # Load the next clip on the hidden source while this one plays
+            if upcoming is not None:
+                self.preload_clip(upcoming, back)
+
+            previous_end = self.wait_for_media_end(front, after=ended_count)
+            log.debug("Finished playing %s", Path(current).name)
+            current, upcoming = upcoming, next(clips, None)
+            front, back = back, front
+
+    def play_videos(self, video_folder, source_name='VideoPlayer', loop=True, gapless=False):
         """Continuously play videos from the specified folder"""
         video_files = list(Path(video_folder).glob('*.mp4'))
         if not video_files:
             raise ValueError(f"No MP4 files found in {video_folder}")
 
-        print(f"Found {len(video_files)} MP4 files in {video_folder}")
+        log.info("Found %d MP4 files in %s", len(video_files), video_folder)
+        if gapless:
+            try:
+                self.play_gapless(itertools.cycle(video_files) if loop else video_files)
+            except KeyboardInterrupt:
+                log.info("Stopping video playback")
+            return
+
         source_name = self.setup_media_source(source_name)
-        
+        previous_end = None
+
         try:
             while True:  # Outer loop for continuous playlist
-                print("\nStarting playlist...")
+                log.debug("Starting playlist")
                 for video_file in video_files:
                     try:
-                        print(f"\nPlaying: {video_file.name}")
-                        
-                        # Stop current playback
-                        self.client.trigger_media_input_action(source_name, "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_STOP")
-                        time.sleep(1)  # Give it a moment to stop
-                        
-                        # Set the media file path
-                        settings = {
-                            'is_local_file': True,
-                            'local_file': str(video_file),
-                            'looping': False,
-                            'restart_on_activate': False,
-                            'close_when_inactive': False,
-                            'hw_decode': True,
-                            'clear_on_media_end': False
-                        }
-                        self.client.set_input_settings(source_name, settings, True)
-                        time.sleep(1)  # Give OBS a moment to load the file
-                        
-                        # Start playing
-                        self.client.trigger_media_input_action(source_name, "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY")
-                        
-                        # Get initial media state
-                        media_info = self.client.get_media_input_status(source_name)
-                        print(f"Initial state: {media_info.media_state}")
-                        
-                        # Wait for the video to actually finish
-                        self.wait_for_media_end(source_name)
-                        print(f"Finished playing: {video_file.name}")
+                        log.debug("Playing %s", video_file.name)
+                        previous_end = self.play_clip(video_file, source_name, previous_end)
+                        log.debug("Finished playing %s", video_file.name)
                         
                     except Exception as e:
-                        print(f"Error playing {video_file.name}: {str(e)}")
+                        log.error("Error playing %s: %s", video_file.name, e)
+                        previous_end = None
                         time.sleep(2)  # Wait a bit before trying next video
                         continue
-                
-                print("\nRestarting playlist from beginning...")
+
+                if not loop:
+                    break
+                log.debug("Restarting playlist from beginning")
                 
         except KeyboardInterrupt:
-            print("\nStopping video playback...")
+            log.info("Stopping video playback")
         except Exception as e:
-            print(f"\nPlayback error: {str(e)}")
+            log.error("Playback error: %s", e)
             raise
 
 if __name__ == "__main__":
+    configure()
     try:
+        if not VIDEO_FOLDER:
+            raise ValueError("VIDEO_FOLDER not found in environment variables. Check your .env file.")
+
         # Initialize the player
         player = MediaPlayer()
         
@@ -1,3 +1,4 @@
+from .asset_manifest import AssetManifest
 from .video_queue import VideoQueue
 
-__all__ = ['VideoQueue']
+__all__ = ['AssetManifest', 'VideoQueue']
@@ -0,0 +1,427 @@
+"""
+Precomputed manifest of the clip assets.
+
+The asset folder is scanned once. Each clip gets its duration, resolution,
+codecs and keyframe times, read straight from the MP4 boxes so no ffprobe is
+needed, plus the paragraph of the pitch script it speaks and an estimate of where
+each of its sentences starts. The manifest is
+cached as JSON next to the clips. A clip is only re-probed when its size or
+mtime changed and its content hash differs too, so a fresh checkout or a
+touched file costs a hash rather than a parse.
+
+Lookups are dictionary hits. VideoQueue uses them to validate clips without
+touching the disk, and the players use them to predict when a clip will end
+and to pick an interrupted clip up again at the sentence that was cut off.
+
+Usage:
+    python -m src.video.asset_manifest --assets src/assets/base --script src/assets/base_script.txt
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import re
+import struct
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.logger import configure, get_logger
+from src.voice.streaming_response import SENTENCE_END
+
+log = get_logger(__name__)
+
+DEFAULT_ASSET_DIR = os.path.join('src', 'assets', 'base')
+DEFAULT_SCRIPT = os.path.join('src', 'assets', 'base_script.txt')
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 2
+
+# base1, objection1, transition4_1; misspelt transitions such as transntion4_1 are accepted
+CLIP_NAME = re.compile(r'^(?P<kind>base|objection|tran\w*?tion)(?P<number>\d+(?:_\d+)?)$')
+
+class MP4ParseError(ValueError):
+    """Raised when a file is not an MP4 the probe can read"""
+
+
+@dataclass
+class ClipInfo:
+    name: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    kind: str = 'other'
+    key: Optional[str] = None  # Normalized name, e.g. transition4_1 for transntion4_1.mp4
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    keyframes: List[float] = field(default_factory=list)  # Seconds from the start of the clip
+    script_index: Optional[int] = None  # Position of the script paragraph this clip speaks
+    script_line: Optional[int] = None  # 1-based line of that paragraph in the script file
+    script_text: Optional[str] = None
+    sentences: List[float] = field(default_factory=list)  # Estimated start of each sentence of script_text, in seconds
+    error: Optional[str] = None  # Why the probe failed, if it did
+
+
+def classify_clip(name: str) -> Tuple[str, Optional[str]]:
+    """Kind (base, objection, transition or other) and normalized key of a clip file name"""
+    match = CLIP_NAME.match(os.path.splitext(name)[0])
+    if not match:
+        return 'other', None
+    kind = 'transition' if match.group('kind').startswith('tran') else match.group('kind')
+    return kind, f"{kind}{match.group('number')}"
+
+
+def sentence_starts(text: str, duration: float) -> List[float]:
+    """Estimated start time of each sentence of `text` spoken over `duration` seconds.
+
+    Rendered talks carry no word timings, so the speaking rate is taken as
+    steady and each sentence gets a share of the clip proportional to its
+    characters.
+    """
+    weight = lambda part: len(re.sub(r'\s+', '', part))
+    total = weight(text)
+    if not total:
+        return []
+    starts = [0] + [m.end() for m in SENTENCE_END.finditer(text) if m.end() < len(text)]
+    return [round(duration * weight(text[:start]) / total, 3) for start in starts]
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _boxes(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload start, box end) of the boxes between start and end"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise MP4ParseError(f"Truncated {box_type!r} box at offset {offset}")
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _children(f: BinaryIO, start: int, end: int) -> Dict[bytes, List[Tuple[int, int]]]:
+    found: Dict[bytes, List[Tuple[int, int]]] = {}
+    for box_type, payload, box_end in _boxes(f, start, end):
+        found.setdefault(box_type, []).append((payload, box_end))
+    return found
+
+
+def _find(f: BinaryIO, start: int, end: int, path: List[bytes]) -> Optional[Tuple[int, int]]:
+    """Payload range of the first box at `path` below start..end"""
+    for box_type, payload, box_end in _boxes(f, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            return _find(f, payload, box_end, path[1:])
+    return None
+
+
+def _read(f: BinaryIO, box: Tuple[int, int]) -> bytes:
+    f.seek(box[0])
+    return f.read(box[1] - box[0])
+
+
+def _timescale_and_duration(payload: bytes) -> Tuple[int, int]:
+    """Timescale and duration of an mvhd or mdhd payload"""
+    if payload[0] == 1:
+        return struct.unpack_from('>IQ', payload, 20)
+    return struct.unpack_from('>II', payload, 12)
+
+
+def _sample_times(stts: bytes) -> List[int]:
+    """Decode time of every sample, in media timescale units"""
+    times = []
+    elapsed = 0
+    (count,) = struct.unpack_from('>I', stts, 4)
+    for index in range(count):
+        samples, delta = struct.unpack_from('>II', stts, 8 + index * 8)
+        for _ in range(samples):
+            times.append(elapsed)
+            elapsed += delta
+    return times
+
+
+def _probe_track(f: BinaryIO, start: int, end: int) -> Dict[str, object]:
+    track: Dict[str, object] = {}
+    tkhd = _find(f, start, end, [b'tkhd'])
+    if tkhd is not None:
+        payload = _read(f, tkhd)
+        width, height = struct.unpack_from('>II', payload, len(payload) - 8)
+        track['width'], track['height'] = width >> 16, height >> 16
+    mdia = _find(f, start, end, [b'mdia'])
+    if mdia is None:
+        return track
+    boxes = _children(f, *mdia)
+    if b'mdhd' in boxes:
+        track['timescale'], track['duration'] = _timescale_and_duration(_read(f, boxes[b'mdhd'][0]))
+    if b'hdlr' in boxes:
+        track['handler'] = _read(f, boxes[b'hdlr'][0])[8:12]
+    stbl = _find(f, *mdia, [b'minf', b'stbl'])
+    if stbl is None:
+        return track
+    tables = _children(f, *stbl)
+    if b'stsd' in tables:
+        track['codec'] = _read(f, tables[b'stsd'][0])[12:16].decode('latin-1')
+    if b'stts' in tables:
+        track['sample_times'] = _sample_times(_read(f, tables[b'stts'][0]))
+    if b'stss' in tables:
+        stss = _read(f, tables[b'stss'][0])
+        (count,) = struct.unpack_from('>I', stss, 4)
+        track['sync_samples'] = struct.unpack_from(f'>{count}I', stss, 8)
+    return track
+
+
+def probe_mp4(path: str) -> Dict[str, object]:
+    """Duration, resolution, frame rate, codecs and keyframe times of an MP4.
+
+    Raises:
+        MP4ParseError: If the file has no readable movie header
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        try:
+            moov = _find(f, 0, size, [b'moov'])
+            if moov is None:
+                raise MP4ParseError(f"No moov box in {path}")
+            boxes = _children(f, *moov)
+            if b'mvhd' not in boxes:
+                raise MP4ParseError(f"No mvhd box in {path}")
+            timescale, duration = _timescale_and_duration(_read(f, boxes[b'mvhd'][0]))
+            tracks = [_probe_track(f, *trak) for trak in boxes.get(b'trak', [])]
+        except struct.error as e:
+            raise MP4ParseError(f"Malformed MP4 {path}: {e}") from e
+
+    info: Dict[str, object] = {'duration': round(duration / timescale, 3) if timescale else None}
+    for track in tracks:
+        if track.get('handler') == b'vide' and 'video_codec' not in info:
+            info['video_codec'] = track.get('codec')
+            info['width'], info['height'] = track.get('width'), track.get('height')
+            times, scale = track.get('sample_times', []), track.get('timescale')
+            if times and scale and track.get('duration'):
+                info['fps'] = round(len(times) * scale / track['duration'], 3)
+                # Without an stss box every sample is a sync sample
+                sync = track.get('sync_samples') or range(1, len(times) + 1)
+                info['keyframes'] = [round(times[n - 1] / scale, 3) for n in sync if 0 < n <= len(times)]
+        elif track.get('handler') == b'soun' and 'audio_codec' not in info:
+            info['audio_codec'] = track.get('codec')
+    return info
+
+
+def _script_segments(script_path: Optional[str]) -> Dict[str, Tuple[int, object]]:
+    """Script paragraphs by segment name, with their position in the script"""
+    if not script_path or not os.path.exists(script_path):
+        return {}
+    # batch_render brings in aiohttp; only needed when the script changed
+    from src.voice.batch_render import load_script_segments
+    return {segment.name: (index, segment) for index, segment in enumerate(load_script_segments(script_path))}
+
+
+def _match_segments(clips: Dict[str, ClipInfo], segments: Dict[str, Tuple[int, object]]) -> Dict[str, Tuple[int, object]]:
+    """Script segment of each clip: by file name or key, then base clips in order over the paragraphs left"""
+    matches = {}
+    for clip in clips.values():
+        match = segments.get(os.path.splitext(clip.name)[0]) or segments.get(clip.key)
+        if match:
+            matches[clip.name] = match
+    # A script whose paragraphs are named some other way still lines its paragraphs up with base1..N
+    claimed = {index for index, _ in matches.values()}
+    spare = iter(sorted((match for match in segments.values()
+                         if match[0] not in claimed and classify_clip(match[1].name)[0] in ('base', 'other')),
+                        key=lambda match: match[0]))
+    unmatched = [clip for clip in clips.values() if clip.kind == 'base' and clip.name not in matches]
+    for clip in sorted(unmatched, key=lambda clip: tuple(int(n) for n in re.findall(r'\d+', clip.key))):
+        match = next(spare, None)
+        if match is None:
+            break
+        matches[clip.name] = match
+    return matches
+
+
+class AssetManifest:
+    """Clip metadata of one asset folder, keyed by absolute path"""
+
+    def __init__(self, asset_dir: str, clips: Dict[str, ClipInfo], script_path: Optional[str] = None,
+                 script_hash: Optional[str] = None):
+        self.asset_dir = os.path.abspath(asset_dir)
+        self.clips = clips
+        self.script_path = script_path
+        self.script_hash = script_hash
+        self._by_path = {os.path.join(self.asset_dir, name): clip for name, clip in clips.items()}
+        self._by_key = {clip.key: os.path.join(self.asset_dir, clip.name) for clip in clips.values() if clip.key}
+
+    @classmethod
+    def load(cls, asset_dir: str = DEFAULT_ASSET_DIR, script_path: Optional[str] = DEFAULT_SCRIPT,
+             manifest_path: Optional[str] = None, save: bool = True) -> 'AssetManifest':
+        """Load the cached manifest of `asset_dir`, re-probing only the clips that changed.
+
+        Args:
+            asset_dir: Folder holding the MP4 clips
+            script_path: Script whose tagged paragraphs are mapped to clips
+            manifest_path: Cache file (defaults to manifest.json in the asset folder)
+            save: Write the cache back when anything changed
+        """
+        manifest_path = manifest_path or os.path.join(asset_dir, MANIFEST_NAME)
+        cached: Dict[str, ClipInfo] = {}
+        cached_script_hash = None
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                cached = {name: ClipInfo(**entry) for name, entry in data['clips'].items()}
+                cached_script_hash = data.get('script_hash')
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError, KeyError) as e:
+            log.warning("Ignoring unreadable asset manifest %s: %s", manifest_path, e)
+
+        names = sorted(name for name in os.listdir(asset_dir) if name.lower().endswith('.mp4'))
+        clips: Dict[str, ClipInfo] = {}
+        changed = set(cached) != set(names)
+        probed = False
+        for name in names:
+            path = os.path.join(asset_dir, name)
+            stat = os.stat(path)
+            clip = cached.get(name)
+            if clip is not None and (clip.size, clip.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                clips[name] = clip
+                continue
+            changed = True
+            digest = file_hash(path)
+            if clip is not None and clip.sha256 == digest:
+                clip.size, clip.mtime_ns = stat.st_size, stat.st_mtime_ns
+            else:
+                clip, probed = cls.probe(path, stat, digest), True
+            clips[name] = clip
+
+        script_hash = file_hash(script_path) if script_path and os.path.exists(script_path) else None
+        if probed or script_hash != cached_script_hash:
+            changed = True
+            matches = _match_segments(clips, _script_segments(script_path))
+            for clip in clips.values():
+                index, segment = matches.get(clip.name) or (None, None)
+                clip.script_index = index
+                clip.script_line = segment.line if segment else None
+                clip.script_text = segment.text if segment else None
+                clip.sentences = sentence_starts(segment.text, clip.duration) if segment and clip.duration else []
+
+        manifest = cls(asset_dir, clips, script_path, script_hash)
+        if changed and save:
+            try:
+                manifest.save(manifest_path)
+            except OSError as e:
+                # A read-only asset tree still gets a manifest, just not a cached one
+                log.warning("Could not write asset manifest %s: %s", manifest_path, e)
+        return manifest
+
+    @staticmethod
+    def probe(path: str, stat: Optional[os.stat_result] = None, digest: Optional[str] = None) -> ClipInfo:
+        """Probe one clip; unreadable files get an entry with the error instead of media fields"""
+        stat = stat or os.stat(path)
+        name = os.path.basename(path)
+        kind, key = classify_clip(name)
+        clip = ClipInfo(name=name, size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                        sha256=digest or file_hash(path), kind=kind, key=key)
+        try:
+            for attribute, value in probe_mp4(path).items():
+                setattr(clip, attribute, value)
+        except (MP4ParseError, OSError) as e:
+            clip.error = str(e)
+            log.warning("Could not probe %s: %s", path, e)
+        return clip
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or os.path.join(self.asset_dir, MANIFEST_NAME)
+        # Every session loads the manifest, so concurrent saves need their own temp files
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'script_hash': self.script_hash,
+                'clips': {name: asdict(clip) for name, clip in self.clips.items()}
+            }, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def get(self, video_path) -> Optional[ClipInfo]:
+        return self._by_path.get(os.path.abspath(video_path))
+
+    def __contains__(self, video_path) -> bool:
+        return os.path.abspath(video_path) in self._by_path
+
+    def __len__(self) -> int:
+        return len(self.clips)
+
+    def path(self, key: str) -> str:
+        """Path of the clip with a normalized key such as transition4_1
+
+        Raises:
+            KeyError: If no clip has that key
+        """
+        return self._by_key[key]
+
+    @property
+    def transitions(self) -> Dict[str, str]:
+        return {key: path for key, path in self._by_key.items() if key.startswith('transition')}
+
+    def paths(self, kind: str) -> List[str]:
+        """Clips of one kind in pitch order (base1, base2, ..., base10)"""
+        clips = [clip for clip in self.clips.values() if clip.kind == kind]
+        clips.sort(key=lambda clip: [int(part) for part in re.findall(r'\d+', clip.key or '')] or [0])
+        return [os.path.join(self.asset_dir, clip.name) for clip in clips]
+
+    @property
+    def base_clips(self) -> List[str]:
+        return self.paths('base')
+
+    def duration(self, video_path) -> Optional[float]:
+        clip = self.get(video_path)
+        return clip.duration if clip is not None else None
+
+    def ends_at(self, video_path, started_at: float, offset: float = 0.0) -> Optional[float]:
+        """When a clip started at `started_at` (from `offset` seconds in) will end, or None if unknown"""
+        duration = self.duration(video_path)
+        return started_at + duration - offset if duration is not None else None
+
+    def resume_point(self, video_path, cursor: float) -> float:
+        """Where to continue a clip that was cut `cursor` seconds in: the start of the sentence being spoken.
+
+        Returns 0.0, replaying the clip, when it has no sentence index.
+        """
+        clip = self.get(video_path)
+        if clip is None or not clip.sentences:
+            return 0.0
+        index = bisect.bisect_right(clip.sentences, cursor)
+        return clip.sentences[index - 1] if index else 0.0
+
+
+if __name__ == "__main__":
+    configure()
+    parser = argparse.ArgumentParser(description="Build or refresh the clip manifest of an asset folder")
+    parser.add_argument('--assets', default=DEFAULT_ASSET_DIR)
+    parser.add_argument('--script', default=DEFAULT_SCRIPT)
+    args = parser.parse_args()
+    manifest = AssetManifest.load(args.assets, args.script)
+    for clip in manifest.clips.values():
+        script = f"script paragraph {clip.script_index + 1}" if clip.script_index is not None else "no script"
+        if clip.error:
+            print(f"{clip.name:22} {clip.error}")
+        else:
+            print(f"{clip.name:22} {clip.kind:10} {clip.duration:7.2f}s {clip.width}x{clip.height} "
+                  f"{clip.video_codec}/{clip.audio_codec} {len(clip.keyframes):3} keyframes  {script}")
@@ -0,0 +1,600 @@
+"""
+Asyncio client for obs-websocket v5.
+
+Unlike obsws_python's blocking ReqClient, requests are pipelined: every call
+is written to the socket straight away and matched to its response by
+requestId, so concurrent callers never wait on each other's round trips.
+Related requests can also be sent as a single RequestBatch.
+"""
+
+import asyncio
+import base64
+import hashlib
+import itertools
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from src.utils.logger import get_logger, span
+from src.utils.metrics import LatencyStats
+from src.video.obs_settings import CENTERED_1080P, media_settings
+
+if TYPE_CHECKING:
+    from src.video.asset_manifest import AssetManifest
+
+log = get_logger(__name__)
+
+# obs-websocket opcodes
+OP_HELLO = 0
+OP_IDENTIFY = 1
+OP_IDENTIFIED = 2
+OP_EVENT = 5
+OP_REQUEST = 6
+OP_REQUEST_RESPONSE = 7
+OP_REQUEST_BATCH = 8
+OP_REQUEST_BATCH_RESPONSE = 9
+
+# Event subscription bits (General through Ui; excludes the high-volume events)
+EVENT_SUBS_ALL = (1 << 11) - 1
+
+# RequestBatch execution types
+BATCH_SERIAL_REALTIME = 0
+BATCH_SERIAL_FRAME = 1
+BATCH_PARALLEL = 2
+
+# Request status code for "ResourceAlreadyExists"
+STATUS_RESOURCE_ALREADY_EXISTS = 601
+
+MEDIA_ACTION_PLAY = "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY"
+MEDIA_ACTION_PAUSE = "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PAUSE"
+MEDIA_ACTION_STOP = "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_STOP"
+
+# Volume multiplier of a ducked clip
+DUCK_VOLUME = 0.2
+
+class OBSRequestError(Exception):
+    """Raised when OBS reports a failed request"""
+
+    def __init__(self, request_type: str, code: int, comment: str = ""):
+        super().__init__(f"{request_type} failed with code {code}: {comment}")
+        self.request_type = request_type
+        self.code = code
+        self.comment = comment
+
+
+def auth_response(password: str, salt: str, challenge: str) -> str:
+    """Authentication string for the Identify message"""
+    secret = base64.b64encode(hashlib.sha256((password + salt).encode()).digest()).decode()
+    return base64.b64encode(hashlib.sha256((secret + challenge).encode()).digest()).decode()
+
+
+class AsyncOBSClient:
+    def __init__(self, host: str = 'localhost', port: int = 4455, password: Optional[str] = None,
+                 event_subscriptions: int = EVENT_SUBS_ALL, timeout: float = 5.0):
+        self.url = f"ws://{host}:{port}"
+        self.password = password
+        self.event_subscriptions = event_subscriptions
+        self.timeout = timeout
+        self.request_latency = LatencyStats("obs_request_ms")
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._ids = itertools.count(1)
+        self._pending: Dict[str, Tuple[asyncio.Future, float]] = {}
+        self._handlers: Dict[str, List[Callable]] = {}
+        self._waiters: List[Tuple[str, Callable, asyncio.Future]] = []
+
+    @property
+    def connected(self) -> bool:
+        # Without its reader nothing would ever answer a request
+        reader_alive = self._reader is None or not self._reader.done()
+        return self._ws is not None and not self._ws.closed and reader_alive
+
+    async def connect(self) -> None:
+        """Open the websocket and identify with the server"""
+        self._session = aiohttp.ClientSession()
+        try:
+            self._ws = await asyncio.wait_for(self._session.ws_connect(self.url), self.timeout)
+            hello = await self._ws.receive_json(timeout=self.timeout)
+            identify = {"rpcVersion": 1, "eventSubscriptions": self.event_subscriptions}
+            auth = hello["d"].get("authentication")
+            if auth:
+                if not self.password:
+                    raise ValueError("OBS requires a password but none was provided")
+                identify["authentication"] = auth_response(self.password, auth["salt"], auth["challenge"])
+            await self._ws.send_json({"op": OP_IDENTIFY, "d": identify})
+            identified = await self._ws.receive_json(timeout=self.timeout)
+            if identified.get("op") != OP_IDENTIFIED:
+                raise ConnectionError(f"Unexpected reply to Identify: {identified}")
+        except Exception:
+            await self.close()
+            raise
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._fail_pending(ConnectionError("OBS connection closed"))
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _fail_pending(self, error: Exception) -> None:
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        for _, _, future in self._waiters:
+            if not future.done():
+                future.set_exception(error)
+        self._waiters.clear()
+
+    async def _read_loop(self) -> None:
+        try:
+            async for msg in self._ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                try:
+                    self._handle_message(msg.json())
+                except Exception as e:
+                    # One bad message must not stop the replies to every later request
+                    log.warning("Ignoring OBS message %.200s: %r", msg.data, e)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error("OBS connection lost: %r", e)
+        finally:
+            # The reader is done, so `connected` is now False and nobody waits for a reply that cannot come
+            self._fail_pending(ConnectionError("OBS connection lost"))
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        op, data = message.get("op"), message.get("d") or {}
+        if op in (OP_REQUEST_RESPONSE, OP_REQUEST_BATCH_RESPONSE):
+            future, sent_at = self._pending.pop(data.get("requestId"), (None, None))
+            if future is not None and not future.done():
+                self.request_latency.observe((time.perf_counter() - sent_at) * 1000)
+                future.set_result(data)
+        elif op == OP_EVENT:
+            self._dispatch(data.get("eventType"), data.get("eventData") or {})
+
+    def _dispatch(self, event_type: str, event_data: Dict[str, Any]) -> None:
+        for callback in self._handlers.get(event_type, []):
+            try:
+                result = callback(event_data)
+            except Exception:
+                log.exception("%s listener failed", event_type)
+                continue
+            if asyncio.iscoroutine(result):
+                asyncio.create_task(result)
+        received_at = time.perf_counter()
+        for wanted_type, predicate, future in self._waiters:
+            if wanted_type == event_type and not future.done() and predicate(event_data):
+                future.set_result((received_at, event_data))
+        # Drop resolved and abandoned (cancelled) expectations
+        self._waiters = [w for w in self._waiters if not w[2].done()]
+
+    def on(self, event_type: str, callback: Callable[[Dict[str, Any]], Any]) -> None:
+        """Call `callback(event_data)` for every event of `event_type`"""
+        self._handlers.setdefault(event_type, []).append(callback)
+
+    def expect_event(self, event_type: str, predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> asyncio.Future:
+        """Future resolving to (perf_counter time, event data) for the next matching event.
+
+        Register the expectation before sending the request that causes the
+        event, so a fast reply cannot slip past it.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Expectations the caller gave up on are dropped here as well as on the next event
+        self._waiters = [w for w in self._waiters if not w[2].done()]
+        self._waiters.append((event_type, predicate or (lambda data: True), future))
+        return future
+
+    async def _send(self, op: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.connected:
+            raise ConnectionError("Not connected to OBS")
+        request_id = str(next(self._ids))
+        data["requestId"] = request_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (future, time.perf_counter())
+        await self._ws.send_json({"op": op, "d": data})
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def call(self, request_type: str, request_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Send one request and return its responseData"""
+        response = await self._send(OP_REQUEST, {"requestType": request_type, "requestData": request_data or {}})
+        status = response["requestStatus"]
+        if not status["result"]:
+            raise OBSRequestError(request_type, status.get("code"), status.get("comment", ""))
+        return response.get("responseData") or {}
+
+    async def call_batch(self, requests: List[Tuple[str, Dict[str, Any]]], halt_on_failure: bool = False,
+                         execution_type: int = BATCH_SERIAL_REALTIME) -> List[Dict[str, Any]]:
+        """Send several requests in one RequestBatch round trip.
+
+        Returns the responseData of each request in order and raises
+        OBSRequestError for the first failed request.
+        """
+        response = await self._send(OP_REQUEST_BATCH, {
+            "haltOnFailure": halt_on_failure,
+            "executionType": execution_type,
+            "requests": [{"requestType": t, "requestData": d or {}} for t, d in requests]
+        })
+        results = []
+        for result in response["results"]:
+            status = result["requestStatus"]
+            if not status["result"]:
+                raise OBSRequestError(result["requestType"], status.get("code"), status.get("comment", ""))
+            results.append(result.get("responseData") or {})
+        return results
+
+
+class AsyncMediaPlayer:
+    """Non-blocking counterpart of MediaPlayer built on AsyncOBSClient.
+
+    Like MediaPlayer.play_gapless it alternates between two sources: while one
+    is on screen the next clip is loaded and paused on the hidden one, so
+    moving on is a single play-and-flip batch rather than a file reload. The
+    end of each clip is awaited from the MediaInputPlaybackEnded event, so
+    playback runs as a task next to the agent, transcription and interrupt
+    handling on one event loop.
+    """
+
+    def __init__(self, client: AsyncOBSClient, source_name: str = 'VideoPlayer',
+                 manifest: Optional["AssetManifest"] = None, scene_name: str = 'Scene'):
+        self.client = client
+        self.source_name = source_name
+        self.scene_name = scene_name  # Created on setup if missing, so each call can have its own output
+        self.sources = (source_name, f"{source_name}-B")
+        self.manifest = manifest  # Clip durations; defaults to the manifest of the playing VideoQueue
+        self.clip_gaps = LatencyStats("clip_gap_ms")
+        self.interrupt_latency = LatencyStats("interrupt_to_first_frame_ms")
+        self.history: List[str] = []
+        self._scene_item_ids: Dict[str, int] = {}
+        self._front = 0  # Index into `sources` of the source on screen
+        self._loaded: Dict[str, Optional[Tuple[str, float]]] = {}  # (clip, offset) paused on a hidden source
+        self._preload_task: Optional[asyncio.Future] = None
+        self._upcoming: Optional[Callable[[], Optional[Tuple[str, float]]]] = None  # Peeks at the next clip
+        self._preempt = asyncio.Event()
+        self._interrupted_at: Optional[float] = None
+        self._queue = None
+        self._inserted = deque()  # Clips to play next in folder mode
+        self._stopping = False
+        self.current: Optional[str] = None
+        self.expected_end: Optional[float] = None  # perf_counter time the current clip will end, if known
+        self._clip_started_at: Optional[float] = None
+        self._clip_offset = 0.0  # Seconds into the file the current clip started from
+        self._paused_at: Optional[float] = None  # perf_counter time of pause(), while paused
+        self._cut_cursors: Dict[str, float] = {}  # Where each preempted folder clip was cut
+        self.clip_listeners: List[Callable[[str], Any]] = []  # Called with each clip as it starts
+
+    async def connect(self) -> None:
+        if not self.client.connected:
+            await self.client.connect()
+
+    async def _create_scene(self) -> None:
+        try:
+            await self.client.call("CreateScene", {"sceneName": self.scene_name})
+        except OBSRequestError as e:
+            if e.code != STATUS_RESOURCE_ALREADY_EXISTS:
+                raise
+
+    async def _create_source(self, source_name: str, visible: bool) -> None:
+        try:
+            await self.client.call("CreateInput", {
+                "sceneName": self.scene_name,
+                "inputName": source_name,
+                "inputKind": "ffmpeg_source",
+                "inputSettings": media_settings(),
+                "sceneItemEnabled": visible
+            })
+        except OBSRequestError as e:
+            if e.code != STATUS_RESOURCE_ALREADY_EXISTS:
+                raise
+        item = await self.client.call("GetSceneItemId", {"sceneName": self.scene_name, "sourceName": source_name})
+        self._scene_item_ids[source_name] = item["sceneItemId"]
+
+    async def setup_media_source(self) -> str:
+        """Create or get the scene and both media sources, centred, with only the first one on screen"""
+        await self._settle_preload()
+        await self._create_scene()
+        await asyncio.gather(*(self._create_source(name, index == 0) for index, name in enumerate(self.sources)))
+        requests = []
+        for index, name in enumerate(self.sources):
+            item_id = self._scene_item_ids[name]
+            requests.append(("SetSceneItemTransform", {"sceneName": self.scene_name, "sceneItemId": item_id, "sceneItemTransform": CENTERED_1080P}))
+            requests.append(("SetSceneItemEnabled", {"sceneName": self.scene_name, "sceneItemId": item_id, "sceneItemEnabled": index == 0}))
+        await self.client.call_batch(requests)
+        self._front = 0
+        self._loaded.clear()
+        return self.source_name
+
+    def _active_manifest(self) -> Optional["AssetManifest"]:
+        return self.manifest if self.manifest is not None else getattr(self._queue, 'manifest', None)
+
+    def cursor(self) -> Optional[float]:
+        """Seconds into the current clip, from the clock rather than a round trip to OBS"""
+        if self.current is None:
+            return None
+        if self._clip_started_at is None:
+            # Still loading; nothing of it has been seen yet
+            return self._clip_offset
+        now = self._paused_at if self._paused_at is not None else time.perf_counter()
+        return now - self._clip_started_at + self._clip_offset
+
+    async def preload_clip(self, video_file, source_name: str, start_at: float = 0.0) -> None:
+        """Open a clip on a hidden source and leave it paused `start_at` seconds in"""
+        video_file = str(video_file)
+        self._loaded[source_name] = None
+        started = self.client.expect_event("MediaInputPlaybackStarted", lambda data: data.get("inputName") == source_name)
+        try:
+            await self.client.call_batch([
+                ("SetInputSettings", {"inputName": source_name, "inputSettings": media_settings(video_file), "overlay": True}),
+                ("SetSceneItemTransform", {"sceneName": self.scene_name, "sceneItemId": self._scene_item_ids[source_name], "sceneItemTransform": CENTERED_1080P}),
+                ("TriggerMediaInputAction", {"inputName": source_name, "mediaAction": MEDIA_ACTION_PLAY})
+            ])
+            try:
+                await asyncio.wait_for(started, self.client.timeout)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            if not started.done():
+                started.cancel()
+        await self.client.call_batch([
+            ("TriggerMediaInputAction", {"inputName": source_name, "mediaAction": MEDIA_ACTION_PAUSE}),
+            ("SetMediaInputCursor", {"inputName": source_name, "mediaCursor": int(start_at * 1000)})
+        ])
+        self._loaded[source_name] = (video_file, start_at)
+
+    async def _settle_preload(self) -> None:
+        """Wait for a background preload so two loads never race on one source"""
+        task, self._preload_task = self._preload_task, None
+        if task is None:
+            return
+        try:
+            await task
+        except Exception as e:
+            log.warning("Preloading the next clip failed: %r", e)
+
+    def _preload_upcoming(self) -> None:
+        upcoming = self._upcoming() if self._upcoming is not None else None
+        if upcoming is not None:
+            self._preload_task = asyncio.ensure_future(self.preload_clip(upcoming[0], self.sources[1 - self._front], upcoming[1]))
+
+    async def switch_to(self, source_name: str) -> float:
+        """Start a preloaded source and bring it on screen, returning when it was shown"""
+        hide = self.sources[self._front]
+        await self.client.call_batch([
+            ("TriggerMediaInputAction", {"inputName": source_name, "mediaAction": MEDIA_ACTION_PLAY}),
+            # Show the new source before hiding the old one so there is never an empty frame
+            ("SetSceneItemEnabled", {"sceneName": self.scene_name, "sceneItemId": self._scene_item_ids[source_name], "sceneItemEnabled": True}),
+            ("SetSceneItemEnabled", {"sceneName": self.scene_name, "sceneItemId": self._scene_item_ids[hide], "sceneItemEnabled": False}),
+            # The hidden clip may have been cut short; make sure it does not keep playing
+            ("TriggerMediaInputAction", {"inputName": hide, "mediaAction": MEDIA_ACTION_STOP})
+        ])
+        shown_at = time.perf_counter()
+        self._front = self.sources.index(source_name)
+        self._loaded.pop(source_name, None)
+        return shown_at
+
+    async def play_clip(self, video_file, previous_end: Optional[float] = None, start_at: float = 0.0) -> Optional[float]:
+        """Play one clip from `start_at` seconds in, returning when it ended or None if it was preempted"""
+        video_file = Path(video_file)
+        back = self.sources[1 - self._front]
+        # Current from the moment it is taken, so an interrupt while it loads puts this clip back, not the last one
+        self.current, self._clip_started_at, self._clip_offset = str(video_file), None, start_at
+        self._paused_at = None
+
+        ended = None
+        try:
+            with span("obs_switch", clip=video_file.name):
+                await self._settle_preload()
+                if self._loaded.get(back) != (str(video_file), start_at):
+                    # Not the clip preloaded while the last one played, e.g. a transition after an interrupt
+                    await self.preload_clip(video_file, back, start_at)
+                if self._preempt.is_set():
+                    # Interrupted while loading; the clip was requeued and plays after the transitions
+                    return None
+                ended = self.client.expect_event("MediaInputPlaybackEnded", lambda data: data.get("inputName") == back)
+                started_at = await self.switch_to(back)
+        except BaseException:
+            if ended is not None:
+                ended.cancel()
+            raise
+        self.history.append(str(video_file))
+        self._clip_started_at = started_at
+        manifest = self._active_manifest()
+        self.expected_end = manifest.ends_at(video_file, started_at, start_at) if manifest is not None else None
+        if start_at > 0:
+            log.info("Resuming %s at %.2f s", video_file.name, start_at, extra={'clip': video_file.name, 'offset_s': start_at})
+        for listener in self.clip_listeners:
+            listener(self.current)
+
+        if self._interrupted_at is not None:
+            self.interrupt_latency.observe((started_at - self._interrupted_at) * 1000)
+            self._interrupted_at = None
+        elif previous_end is not None:
+            # Like play_gapless, only a clip that follows another one has a gap before it
+            gap_ms = (started_at - previous_end) * 1000
+            self.clip_gaps.observe(gap_ms)
+
+        # Load the next clip on the now hidden source while this one plays
+        self._preload_upcoming()
+        preempted = asyncio.ensure_future(self._preempt.wait())
+        try:
+            done, _ = await asyncio.wait({ended, preempted}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            preempted.cancel()
+            if not ended.done():
+                ended.cancel()
+        if ended in done:
+            self.current = None
+            return ended.result()[0]
+        return None
+
+    def _cut(self) -> None:
+        """Note where the current clip is being cut, so it can carry on from there"""
+        self._interrupted_at = time.perf_counter()
+        if self.current is None:
+            return
+        cursor = self.cursor()
+        if self._queue is None:
+            self._cut_cursors[self.current] = cursor
+        elif self.current in self._queue.base_videos:
+            # Only the script carries on; a cut answer is superseded by the next one
+            self._queue.resume_later(self.current, cursor)
+
+    def handle_interrupt(self, interrupt_type: int) -> None:
+        """Queue transitions on the playing VideoQueue and cut the current clip"""
+        if self._queue is None:
+            raise RuntimeError("No queue is playing")
+        self._cut()
+        self._queue.handle_interrupt(interrupt_type)
+        self._preempt.set()
+
+    def enqueue(self, video_file) -> None:
+        """Play `video_file` after the current clip, pending transitions and earlier enqueued clips"""
+        if self._queue is not None:
+            self._queue.add_response(str(video_file))
+        else:
+            self._inserted.append(str(video_file))
+
+    def play_now(self, video_file) -> None:
+        """Cut the current clip and play `video_file`, then carry on where playback left off"""
+        self._cut()
+        self.enqueue(video_file)
+        self._preempt.set()
+
+    async def play_queue(self, queue, loop: bool = False) -> None:
+        """Play a VideoQueue until it is empty, or start its base videos over with `loop`"""
+        await self.connect()
+        await self.setup_media_source()
+        self._queue = queue
+        self._stopping = False
+
+        def upcoming():
+            clip = queue.peek_next_video()
+            if clip is None and loop and queue.base_videos:
+                clip = queue.base_videos[0]
+            return (clip, queue.start_offset(clip)) if clip is not None else None
+        self._upcoming = upcoming
+        previous_end = None
+        try:
+            while not self._stopping:
+                if queue.is_empty():
+                    if not loop or not queue.base_videos:
+                        break
+                    queue.restart()
+                self._preempt.clear()
+                clip = queue.get_next_video()
+                previous_end = await self.play_clip(clip, previous_end, queue.take_start_offset(clip))
+        finally:
+            self._queue = self._upcoming = None
+            self.current = self.expected_end = None
+            await self._settle_preload()
+
+    async def play_folder(self, video_folder, loop: bool = True) -> None:
+        """Play the MP4 files of a folder in sequence, looping by default"""
+        video_files = sorted(Path(video_folder).glob('*.mp4'))
+        if not video_files:
+            raise ValueError(f"No MP4 files found in {video_folder}")
+        await self.connect()
+        await self.setup_media_source()
+        self._stopping = False
+        previous_end = None
+        index = 0
+        resume_at = 0.0
+        advance = False
+
+        def upcoming():
+            if self._inserted:
+                return str(self._inserted[0]), 0.0
+            if not advance:
+                return str(video_files[index]), resume_at
+            if index + 1 < len(video_files):
+                return str(video_files[index + 1]), 0.0
+            return (str(video_files[0]), 0.0) if loop else None
+        self._upcoming = upcoming
+        try:
+            while not self._stopping:
+                if self._inserted:
+                    clip, advance, start_at = self._inserted.popleft(), False, 0.0
+                else:
+                    clip, advance, start_at = video_files[index], True, resume_at
+                self._preempt.clear()
+                previous_end = await self.play_clip(clip, previous_end, start_at)
+                # Its own cut, not that of an inserted clip cut in turn
+                cut = self._cut_cursors.pop(str(clip), None)
+                # A preempted folder clip carries on from the cut-off sentence once the inserted clips are done
+                if advance and previous_end is None:
+                    manifest = self._active_manifest()
+                    resume_at = manifest.resume_point(clip, cut) if manifest is not None and cut is not None else 0.0
+                elif advance:
+                    resume_at = 0.0
+                    index += 1
+                    if index == len(video_files):
+                        if not loop:
+                            break
+                        index = 0
+        finally:
+            self._upcoming = None
+            self.current = self.expected_end = None
+            self._cut_cursors.clear()
+            await self._settle_preload()
+
+    async def pause(self) -> None:
+        """Freeze the current clip where it is"""
+        paused_at = time.perf_counter()
+        await self.client.call("TriggerMediaInputAction", {"inputName": self.sources[self._front], "mediaAction": MEDIA_ACTION_PAUSE})
+        # Stop the clock, so cursor() and cuts made while paused see where the clip froze
+        if self._clip_started_at is not None and self._paused_at is None:
+            self._paused_at = paused_at
+
+    async def resume(self) -> None:
+        """Continue a paused clip"""
+        await self.client.call("TriggerMediaInputAction", {"inputName": self.sources[self._front], "mediaAction": MEDIA_ACTION_PLAY})
+        if self._paused_at is not None:
+            paused_for = time.perf_counter() - self._paused_at
+            self._clip_started_at += paused_for
+            if self.expected_end is not None:
+                self.expected_end += paused_for
+            self._paused_at = None
+
+    async def duck(self, volume: float = DUCK_VOLUME) -> None:
+        """Lower the clip's volume, e.g. while the prospect is talking"""
+        # Both sources, so the clip switched to next is ducked as well
+        await self.client.call_batch([("SetInputVolume", {"inputName": name, "inputVolumeMul": volume}) for name in self.sources])
+
+    async def unduck(self) -> None:
+        """Restore full volume"""
+        await self.duck(1.0)
+
+    async def stop(self) -> None:
+        """Stop the current clip and end playback"""
+        self._stopping = True
+        self._preempt.set()
+        await self.client.call_batch([("TriggerMediaInputAction", {"inputName": name, "mediaAction": MEDIA_ACTION_STOP}) for name in self.sources])
+        self._loaded.clear()
+
+
+def default_client() -> AsyncOBSClient:
+    """Client for the local OBS configured in the environment"""
+    return AsyncOBSClient(password=os.getenv('OBS_SERVER_PWD'))
@@ -0,0 +1,30 @@
+"""
+OBS input settings shared by the blocking MediaPlayer and AsyncMediaPlayer.
+"""
+
+from typing import Any, Dict
+
+# Scene item transform that centers a 1920x1080 source on a 1080p canvas
+CENTERED_1080P = {
+    "alignment": 5,  # Center
+    "height": 1080.0,
+    "positionX": 960.0,  # Half of 1920 for center
+    "positionY": 540.0,  # Half of 1080 for center
+    "rotation": 0.0,
+    "scaleX": 1.0,
+    "scaleY": 1.0,
+    "width": 1920.0
+}
+
+
+def media_settings(video_file='') -> Dict[str, Any]:
+    """Input settings for an ffmpeg_source playing a single local file"""
+    return {
+        'is_local_file': True,
+        'local_file': str(video_file),
+        'looping': False,
+        'restart_on_activate': False,
+        'close_when_inactive': False,
+        'hw_decode': True,
+        'clear_on_media_end': False
+    }
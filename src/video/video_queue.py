@@ -1,15 +1,37 @@
 from collections import deque
 import os
-from typing import List
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from src.video.asset_manifest import AssetManifest
+
+TRANSITION_KEYS = ('transition1', 'transition2', 'transition3', 'transition4', 'transition4_1')
 
 class VideoQueue:
-    def __init__(self, base_videos: List[str]):
+    def __init__(self, base_videos: List[str], manifest: Optional['AssetManifest'] = None):
         """Initialize the video queue with base videos.
         
         Args:
             base_videos: List of paths to base video files
+            manifest: Optional AssetManifest; transitions are resolved from it and
+                clips it knows are validated without touching the disk
         """
+        self.base_videos = list(base_videos)
         self.queue = deque(base_videos)
+        self.responses = set()  # Queued response clips that have not played yet
+        self.start_offsets = {}  # Interrupted clips to continue from this many seconds in
+        self.manifest = manifest
+        
+        if manifest is not None:
+            # The manifest knows where each transition lives, whatever its file is called
+            self.base_path = manifest.asset_dir
+            transitions = manifest.transitions
+            missing = [key for key in TRANSITION_KEYS if key not in transitions]
+            if missing:
+                raise FileNotFoundError(f"Transition videos not found in {manifest.asset_dir}: {', '.join(missing)}")
+            self.transitions = {key: transitions[key] for key in TRANSITION_KEYS}
+            return
+        
         self.base_path = os.path.join('src', 'assets')
         
         # Define transition video paths
@@ -26,6 +48,17 @@ class VideoQueue:
             if not os.path.exists(path):
                 raise FileNotFoundError(f"Transition video not found: {path}")
 
+    @classmethod
+    def from_manifest(cls, manifest: 'AssetManifest') -> 'VideoQueue':
+        """Queue of the manifest's base clips in pitch order, with its transitions"""
+        return cls(manifest.base_clips, manifest=manifest)
+
+    def _check_exists(self, video_path: str) -> None:
+        if self.manifest is not None and video_path in self.manifest:
+            return
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video not found: {video_path}")
+
     def handle_interrupt(self, interrupt_type: int) -> None:
         """Handle different types of interrupts by adding appropriate transition videos.
         
@@ -63,7 +96,29 @@ class VideoQueue:
         """
         if not self.queue:
             raise IndexError("Video queue is empty")
-        return self.queue.popleft()
+        video_path = self.queue.popleft()
+        self.responses.discard(video_path)
+        return video_path
+
+    def restart(self) -> None:
+        """Queue the base videos again, e.g. to loop the pitch"""
+        self.queue.extend(self.base_videos)
+
+    def peek_next_video(self) -> Optional[str]:
+        """Look at the next video without removing it.
+        
+        Returns:
+            Path to the next video file, or None if the queue is empty
+        """
+        return self.queue[0] if self.queue else None
+
+    def is_transition(self, video_path: str) -> bool:
+        """Check whether a video is one of the interrupt transitions.
+        
+        Args:
+            video_path: Path to the video file
+        """
+        return video_path in self.transitions.values()
     
     def add_video(self, video_path: str, to_front: bool = False) -> None:
         """Add a video to the queue.
@@ -72,14 +127,75 @@ class VideoQueue:
             video_path: Path to the video file
             to_front: If True, add to front of queue, else add to back
         """
-        if not os.path.exists(video_path):
-            raise FileNotFoundError(f"Video not found: {video_path}")
+        self._check_exists(video_path)
             
         if to_front:
             self.queue.appendleft(video_path)
         else:
             self.queue.append(video_path)
     
+    def resume_later(self, video_path: str, cursor: float) -> float:
+        """Put an interrupted clip back at the front of the queue.
+        
+        With a manifest the clip continues from the start of the sentence that
+        was cut off instead of being replayed from the beginning.
+        
+        Args:
+            video_path: Path to the interrupted video file
+            cursor: Seconds into the clip when it was interrupted
+        
+        Returns:
+            Seconds into the clip where it will continue
+        """
+        offset = self.manifest.resume_point(video_path, cursor) if self.manifest is not None else 0.0
+        self.add_video(video_path, to_front=True)
+        if offset > 0:
+            self.start_offsets[video_path] = offset
+        else:
+            self.start_offsets.pop(video_path, None)
+        return offset
+    
+    def start_offset(self, video_path: str) -> float:
+        """Seconds into `video_path` its next play starts from, without consuming it"""
+        return self.start_offsets.get(video_path, 0.0)
+    
+    def take_start_offset(self, video_path: str) -> float:
+        """Seconds into `video_path` to start the play just taken from the queue"""
+        return self.start_offsets.pop(video_path, 0.0)
+    
+    def add_response(self, video_path: str) -> None:
+        """Queue a response clip after any pending transitions and earlier responses.
+        
+        Responses are added in the order they are spoken, ahead of the base
+        videos, so a multi-clip answer plays in order before the pitch resumes.
+        
+        Args:
+            video_path: Path to the video file
+        """
+        self._check_exists(video_path)
+            
+        index = 0
+        while index < len(self.queue) and (self.is_transition(self.queue[index]) or self.queue[index] in self.responses):
+            index += 1
+        self.queue.insert(index, video_path)
+        self.responses.add(video_path)
+    
+    def expected_duration(self) -> Optional[float]:
+        """Seconds of video left in the queue according to the manifest.
+        
+        Returns:
+            Total duration, or None without a manifest or if a queued clip is not in it
+        """
+        if self.manifest is None:
+            return None
+        total = 0.0
+        for video_path in self.queue:
+            duration = self.manifest.duration(video_path)
+            if duration is None:
+                return None
+            total += duration
+        return total
+    
     def is_empty(self) -> bool:
         """Check if queue is empty.
         
@@ -91,6 +207,8 @@ class VideoQueue:
     def clear(self) -> None:
         """Clear all videos from the queue."""
         self.queue.clear()
+        self.responses.clear()
+        self.start_offsets.clear()
     
     def __len__(self) -> int:
         """Get number of videos in queue."""
@@ -0,0 +1,231 @@
+"""
+Asynchronous batch pre-rendering of the pitch script through D-ID talks.
+
+The script is split into segments (one per paragraph) which are submitted
+with bounded concurrency through the shared TalksClient, so renders get its
+pooled connection, retries, adaptive polling and latency stats, and 429/5xx
+responses back off for every worker at once. Each segment is downloaded as
+soon as its render finishes, so completions stream in instead of waiting on
+the slowest clip.
+
+A paragraph can name its clip with a tag line, e.g.
+
+    [base1]
+    Hey, thanks for taking the time to speak with me...
+
+Untagged paragraphs are the base pitch and are named base1, base2, ... in
+script order, matching the clips VideoQueue plays. Transition dialogue is
+tagged with its transition's name ([transition1] ... [transition4_1]), so
+it does not shift the base numbering; a script whose base paragraphs do not
+line up with the base clips in the asset folder is reported before rendering.
+
+Usage:
+    python -m src.voice.batch_render --script src/assets/base_script.txt --output src/assets/base
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+import requests
+from dotenv import load_dotenv
+
+from src.utils.logger import configure, get_logger
+from src.video.asset_manifest import DEFAULT_ASSET_DIR, classify_clip
+from src.voice.talk_cache import TalkCache, get_talk_cache, talk_key
+from src.voice.talks_client import TalkRenderError, TalksClient, get_talks_client
+from src.voice.text_to_video import DEFAULT_CONFIG, DEFAULT_PROVIDER, DEFAULT_SOURCE_URL, DEFAULT_VOICE_ID
+
+# Load environment variables
+load_dotenv()
+
+log = get_logger(__name__)
+
+TAG_PATTERN = re.compile(r'^\[([\w\-]+)\]$')
+
+
+@dataclass
+class ScriptSegment:
+    name: str
+    text: str
+    line: int = 0  # 1-based line of the paragraph in the script file
+
+
+def load_script_segments(path: str) -> List[ScriptSegment]:
+    """Split a script file into named segments, one per paragraph"""
+    with open(path, encoding='utf-8') as f:
+        script = f.read()
+    paragraphs = [(script.count('\n', 0, m.start()) + 1, m.group().strip())
+                  for m in re.finditer(r'\S.*?(?=\n\s*\n|\s*\Z)', script, re.S)]
+
+    segments = []
+    base_count = 0
+    for line, paragraph in paragraphs:
+        lines = paragraph.splitlines()
+        match = TAG_PATTERN.match(lines[0].strip())
+        if match:
+            name, text = match.group(1), ' '.join(l.strip() for l in lines[1:])
+        else:
+            base_count += 1
+            name, text = f'base{base_count}', ' '.join(l.strip() for l in lines)
+        if text:
+            segments.append(ScriptSegment(name, text, line))
+    return segments
+
+
+def check_base_segments(segments: List[ScriptSegment], asset_dir: str = DEFAULT_ASSET_DIR) -> bool:
+    """Warn when the script's base paragraphs and the base clips in `asset_dir` differ in number"""
+    scripted = sum(1 for s in segments if classify_clip(s.name)[0] == 'base')
+    try:
+        on_disk = sum(1 for name in os.listdir(asset_dir) if classify_clip(name)[0] == 'base')
+    except FileNotFoundError:
+        return True
+    if scripted != on_disk:
+        log.warning("Script has %d base paragraphs but %s holds %d base clips; tag transition dialogue "
+                    "so base1..N line up with the clips", scripted, asset_dir, on_disk)
+        return False
+    return True
+
+
+class BatchRenderer:
+    def __init__(self, client: Optional[TalksClient] = None, concurrency: int = 4, render_timeout: float = 600.0,
+                 provider: str = DEFAULT_PROVIDER, voice_id: str = DEFAULT_VOICE_ID,
+                 source_url: str = DEFAULT_SOURCE_URL, config: Optional[dict] = None,
+                 cache: Optional[TalkCache] = None):
+        """
+        Args:
+            client: Talks API client (defaults to the process-wide one)
+            concurrency: Maximum renders in flight at once
+            render_timeout: Give up on a talk after this many seconds
+            cache: Optional TalkCache; cached segments are not re-rendered
+        """
+        self.client = client if client is not None else get_talks_client()
+        self.concurrency = concurrency
+        self.render_timeout = render_timeout
+        self.provider = provider
+        self.voice_id = voice_id
+        self.source_url = source_url
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.cache = cache
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _render(self, segment: ScriptSegment) -> Tuple[str, str]:
+        """Submit one talk and wait for it on the calling thread, returning (talk id, result URL)"""
+        submitted_at = time.monotonic()
+        talk = self.client.create_talk({
+            "source_url": self.source_url,
+            "script": {
+                "type": "text",
+                "subtitles": False,
+                "provider": {"type": self.provider, "voice_id": self.voice_id},
+                "input": segment.text
+            },
+            "config": self.config
+        })
+        try:
+            return talk['id'], self.client.wait_for_completion(talk['id'], self.render_timeout, submitted_at)
+        except TalkRenderError as e:
+            raise TalkRenderError(f"Talk for {segment.name}: {e}") from e
+
+    async def _download(self, session: aiohttp.ClientSession, url: str, output_path: str) -> None:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        tmp_path = output_path + '.part'
+        async with session.get(url) as response:
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(256 * 1024):
+                    f.write(chunk)
+        os.replace(tmp_path, output_path)
+
+    async def render_segment(self, session: aiohttp.ClientSession, segment: ScriptSegment,
+                             output_dir: str) -> Tuple[ScriptSegment, str]:
+        """Render, poll and download one segment, returning its local path"""
+        output_path = os.path.join(output_dir, f'{segment.name}.mp4')
+        key = talk_key(segment.text, self.provider, self.voice_id, self.source_url, self.config)
+        if self.cache is not None:
+            cached_path = self.cache.get(key)
+            if cached_path:
+                os.makedirs(output_dir, exist_ok=True)
+                shutil.copyfile(cached_path, output_path)
+                return segment, output_path
+
+        async with self._semaphore:
+            # The client is blocking; the semaphore bounds the worker threads as well as the renders
+            talk_id, result_url = await asyncio.to_thread(self._render, segment)
+
+        # Download outside the semaphore so the next render can be submitted
+        if self.cache is not None:
+            staging_path = self.cache.staging_path(key)
+            await self._download(session, result_url, staging_path)
+            cached_path = self.cache.put(key, staging_path, metadata={
+                "talk_id": talk_id, "script": segment.text, "voice_id": self.voice_id
+            })
+            os.makedirs(output_dir, exist_ok=True)
+            shutil.copyfile(cached_path, output_path)
+        else:
+            await self._download(session, result_url, output_path)
+        return segment, output_path
+
+    async def render_stream(self, segments: List[ScriptSegment],
+                            output_dir: str) -> AsyncIterator[Tuple[ScriptSegment, Optional[str], Optional[Exception]]]:
+        """Yield (segment, path, error) for each segment as soon as it completes"""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(session, segment):
+            try:
+                _, path = await self.render_segment(session, segment, output_dir)
+                return segment, path, None
+            except (TalkRenderError, requests.RequestException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                return segment, None, e
+
+        async with aiohttp.ClientSession() as session:
+            tasks = [asyncio.ensure_future(run(session, s)) for s in segments]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def render_all(self, segments: List[ScriptSegment], output_dir: str) -> Dict[str, str]:
+        """Render every segment and return a mapping of segment name to local path"""
+        results = {}
+        async for segment, path, error in self.render_stream(segments, output_dir):
+            if error is not None:
+                raise error
+            results[segment.name] = path
+        return results
+
+
+async def _main(args) -> None:
+    segments = load_script_segments(args.script)
+    check_base_segments(segments, args.assets)
+    renderer = BatchRenderer(concurrency=args.concurrency, cache=get_talk_cache() if args.cache else None)
+    start_time = time.time()
+    failures = 0
+    async for segment, path, error in renderer.render_stream(segments, args.output):
+        elapsed_time = time.time() - start_time
+        if error is not None:
+            failures += 1
+            print(f"[{elapsed_time:6.1f}s] {segment.name} failed: {error}")
+        else:
+            print(f"[{elapsed_time:6.1f}s] {segment.name} -> {path}")
+    print(f"\nRendered {len(segments) - failures}/{len(segments)} segments in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    configure()
+    parser = argparse.ArgumentParser(description="Pre-render every segment of the pitch script")
+    parser.add_argument('--script', default=os.path.join('src', 'assets', 'base_script.txt'))
+    parser.add_argument('--output', default=os.path.join('output', 'videos'))
+    parser.add_argument('--assets', default=DEFAULT_ASSET_DIR, help="Asset folder whose base clips the script numbers")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--no-cache', dest='cache', action='store_false')
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,188 @@
+"""
+Streaming download of rendered talk videos.
+
+The video is written to a `.part` file that is renamed into place once it is
+complete, so readers never see a truncated file at the final path. Chunk size
+adapts to the connection: it starts small so the first bytes land quickly
+and grows while reads keep filling up fast. A dropped connection is resumed
+with an HTTP Range request from the last byte written.
+
+Playback does not have to wait for the whole file. Once `ready_bytes` are
+on disk, `wait_ready()` returns the growing file so the player can open it
+while the rest streams in. This relies on the MP4 having its index (moov
+atom) at the front, which is how the talks API serves its results. A file
+handed out early should be downloaded with `atomic=False`: it is then written
+at its final path from the start, so the player's path is never renamed
+under it, and `wait()` or `on_complete` tell when it is whole.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+from src.utils.logger import get_logger, span
+from src.voice.talks_client import get_download_session
+
+log = get_logger(__name__)
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+DEFAULT_READY_BYTES = 512 * 1024
+
+# Reads faster than this grow the chunk size, slower ones shrink it
+FAST_READ_SECONDS = 0.02
+SLOW_READ_SECONDS = 0.2
+
+
+class StreamingDownload:
+    def __init__(self, url: str, output_path: str, ready_bytes: int = DEFAULT_READY_BYTES,
+                 max_resumes: int = 3, session: Optional[requests.Session] = None,
+                 on_ready: Optional[Callable[[str], None]] = None, timeout: float = 30.0,
+                 atomic: bool = True, on_complete: Optional[Callable[[str], None]] = None,
+                 on_failed: Optional[Callable[[Exception], None]] = None):
+        """
+        Args:
+            url: Video URL
+            output_path: Final location of the file
+            ready_bytes: Bytes that must be on disk before playback may start
+            max_resumes: Range requests allowed after dropped connections
+            session: HTTP session (defaults to the shared download session)
+            on_ready: Called with the playable path as soon as it is ready
+            timeout: Connect/read timeout per request
+            atomic: Download to a `.part` file renamed into place when complete;
+                otherwise write `output_path` directly so an early reader keeps a stable path
+            on_complete: Called on the download thread with `output_path` once the whole file is there
+            on_failed: Called on the download thread with the error if the download gives up
+        """
+        self.url = url
+        self.output_path = output_path
+        self.part_path = output_path + '.part' if atomic else output_path
+        self.ready_bytes = ready_bytes
+        self.max_resumes = max_resumes
+        self.session = session or get_download_session()
+        self.on_ready = on_ready
+        self.on_complete = on_complete
+        self.on_failed = on_failed
+        self.timeout = timeout
+
+        self.bytes_written = 0
+        self.total_bytes: Optional[int] = None
+        self.resumes = 0
+        self.time_to_ready: Optional[float] = None
+        self.error: Optional[Exception] = None
+        self._ready = threading.Event()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _open(self) -> requests.Response:
+        headers = {'Range': f'bytes={self.bytes_written}-'} if self.bytes_written else {}
+        response = self.session.get(self.url, headers=headers, stream=True, timeout=self.timeout)
+        response.raise_for_status()
+        if self.bytes_written and response.status_code != 206:
+            # Server ignored the range; start over
+            self.bytes_written = 0
+        if self.total_bytes is None:
+            length = response.headers.get('Content-Length')
+            if length is not None:
+                self.total_bytes = int(length) + self.bytes_written
+        return response
+
+    def _mark_ready(self, path: str, started_at: float) -> None:
+        if self._ready.is_set():
+            return
+        self.time_to_ready = time.perf_counter() - started_at
+        self._ready.set()
+        if self.on_ready is not None:
+            self.on_ready(path)
+
+    def run(self) -> bool:
+        """Download synchronously, returning True on success"""
+        with span("download") as timing:
+            ok = self._download()
+            timing.annotate(bytes=self.bytes_written, resumes=self.resumes, ok=ok)
+        return ok
+
+    def _download(self) -> bool:
+        started_at = time.perf_counter()
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        chunk_size = MIN_CHUNK_SIZE
+        try:
+            with open(self.part_path, 'wb') as f:
+                while True:
+                    try:
+                        response = self._open()
+                        f.seek(self.bytes_written)
+                        f.truncate()
+                        while True:
+                            read_started = time.perf_counter()
+                            chunk = response.raw.read(chunk_size, decode_content=True)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            f.flush()
+                            self.bytes_written += len(chunk)
+
+                            elapsed = time.perf_counter() - read_started
+                            if elapsed < FAST_READ_SECONDS and len(chunk) == chunk_size:
+                                chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+                            elif elapsed > SLOW_READ_SECONDS:
+                                chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+
+                            if self.bytes_written >= self.ready_bytes:
+                                self._mark_ready(self.part_path, started_at)
+                        if self.total_bytes is not None and self.bytes_written < self.total_bytes:
+                            raise requests.ConnectionError("Connection closed before the end of the video")
+                        break
+                    except (requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError, Urllib3HTTPError) as e:
+                        if self.resumes >= self.max_resumes:
+                            raise
+                        self.resumes += 1
+                        log.warning("Download interrupted at %d bytes, resuming: %s", self.bytes_written, e)
+
+            if self.part_path != self.output_path:
+                os.replace(self.part_path, self.output_path)
+            # Small files are only playable once complete
+            self._mark_ready(self.output_path, started_at)
+            if self.on_complete is not None:
+                self.on_complete(self.output_path)
+            return True
+        except Exception as e:
+            self.error = e
+            log.error("Error downloading video from %s: %s", self.url, e)
+            if self.on_failed is not None:
+                self.on_failed(e)
+            return False
+        finally:
+            self._ready.set()
+            self._done.set()
+
+    def start(self) -> 'StreamingDownload':
+        """Download on a background thread"""
+        # The thread logs under the caller's call id
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self.run,), daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_ready(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Block until enough is buffered to start playback.
+
+        Returns the path to hand to the player (the growing file, or the
+        final file if the download already finished), or None if the download
+        failed or the timeout expired. Only a non-atomic download returns the
+        same path in both cases.
+        """
+        if not self._ready.wait(timeout) or self.error is not None:
+            return None
+        if self._done.is_set() or not os.path.exists(self.part_path):
+            return self.output_path
+        return self.part_path
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the download finished, returning True on success"""
+        return self._done.wait(timeout) and self.error is None
@@ -0,0 +1,161 @@
+"""
+Streaming LLM responses into talk videos, one sentence at a time.
+
+Instead of waiting for the full answer and then rendering it as a single
+clip, tokens are consumed as the model produces them and cut into sentences.
+Each sentence is submitted for rendering as soon as it is complete, so the
+first clip renders while the rest of the answer is still being generated.
+By default a clip is handed over as soon as enough of its download is on
+disk to start playing.
+Finished clips are handed to `enqueue` strictly in sentence order, whatever
+order the renders finish in.
+"""
+
+import asyncio
+import contextvars
+import functools
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from src.utils.logger import get_logger
+from src.utils.metrics import LatencyStats
+
+log = get_logger(__name__)
+
+# Words whose trailing period does not end a sentence
+ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'st', 'vs', 'etc', 'e.g', 'i.e', 'inc', 'approx'}
+
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+SOFT_BREAK = re.compile(r'[,;:]\s+')
+
+
+class SentenceChunker:
+    def __init__(self, min_chars: int = 20, max_chars: int = 250):
+        """
+        Args:
+            min_chars: Shorter sentences are merged into the next one
+            max_chars: Longer runs without a sentence end are split at a comma or space
+        """
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ''
+
+    def _boundary(self) -> Optional[int]:
+        for match in SENTENCE_END.finditer(self.buffer):
+            end = match.end()
+            words = self.buffer[:match.start() + 1].split()
+            if words and words[-1].rstrip('.').lower() in ABBREVIATIONS:
+                continue
+            if len(self.buffer[:end].strip()) >= self.min_chars:
+                return end
+        if len(self.buffer) > self.max_chars:
+            head = self.buffer[:self.max_chars]
+            breaks = [m.end() for m in SOFT_BREAK.finditer(head)]
+            if breaks:
+                return breaks[-1]
+            space = head.rfind(' ')
+            return space + 1 if space > 0 else self.max_chars
+        return None
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text, returning the sentences it completed"""
+        self.buffer += text
+        sentences = []
+        end = self._boundary()
+        while end is not None:
+            sentence, self.buffer = self.buffer[:end].strip(), self.buffer[end:]
+            sentences.append(sentence)
+            end = self._boundary()
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """The unfinished last sentence, if any"""
+        sentence, self.buffer = self.buffer.strip(), ''
+        return sentence or None
+
+
+@dataclass
+class StreamedResponse:
+    text: str = ''
+    sentences: List[str] = field(default_factory=list)
+    clips: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)  # Sentences whose render failed
+
+
+class ResponseStreamer:
+    def __init__(self, enqueue: Callable[[str], Any], render: Optional[Callable[[str], Optional[str]]] = None,
+                 max_renders: int = 3, chunker: Optional[Callable[[], SentenceChunker]] = None):
+        """
+        Args:
+            enqueue: Called with each rendered clip path, in sentence order
+            render: Renders text to a local video path (defaults to render_talk,
+                handing each clip over as soon as its download can be played)
+            max_renders: Sentences rendered at once
+            chunker: Factory for the sentence chunker of each response
+        """
+        if render is None:
+            from src.voice.download import DEFAULT_READY_BYTES
+            from src.voice.text_to_video import render_talk
+            render = functools.partial(render_talk, ready_bytes=DEFAULT_READY_BYTES)
+        self.enqueue = enqueue
+        self.render = render
+        self.chunker = chunker or SentenceChunker
+        self._executor = ThreadPoolExecutor(max_workers=max_renders, thread_name_prefix='response-render')
+        self.first_sentence_latency = LatencyStats('response_first_sentence_ms')
+        self.first_clip_latency = LatencyStats('response_first_clip_ms')
+
+    async def stream(self, tokens: AsyncIterator[str]) -> StreamedResponse:
+        """Render and enqueue a streamed response sentence by sentence"""
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        response = StreamedResponse()
+        renders: asyncio.Queue = asyncio.Queue()
+
+        async def deliver():
+            # Enqueue in sentence order even when later renders finish first
+            while True:
+                item = await renders.get()
+                if item is None:
+                    return
+                sentence, render = item
+                try:
+                    path = await render
+                except Exception as e:
+                    log.error("Error rendering response sentence: %s", e)
+                    path = None
+                if not path:
+                    response.failed.append(sentence)
+                    continue
+                if not response.clips:
+                    self.first_clip_latency.observe((time.perf_counter() - start_time) * 1000)
+                response.clips.append(path)
+                self.enqueue(path)
+
+        def submit(sentence):
+            if not response.sentences:
+                self.first_sentence_latency.observe((time.perf_counter() - start_time) * 1000)
+            response.sentences.append(sentence)
+            # Run the render in this call's context so its spans and logs carry the call id
+            render = loop.run_in_executor(self._executor, contextvars.copy_context().run, self.render, sentence)
+            renders.put_nowait((sentence, render))
+
+        delivery = asyncio.ensure_future(deliver())
+        chunker = self.chunker()
+        try:
+            async for token in tokens:
+                response.text += token
+                for sentence in chunker.feed(token):
+                    submit(sentence)
+            last = chunker.flush()
+            if last:
+                submit(last)
+        finally:
+            renders.put_nowait(None)
+            await delivery
+        return response
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
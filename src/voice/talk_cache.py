@@ -0,0 +1,240 @@
+"""
+Content-addressed on-disk cache of rendered D-ID talk videos.
+
+Most of the pitch is said word for word on every call, so a rendered clip is
+keyed by a hash of everything that affects the render (normalized script,
+voice provider, voice id, avatar source and config) and reused until it is
+evicted. Eviction is least-recently-used once the cache exceeds its size or
+entry budget.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_DIR = os.path.join('output', 'talk_cache')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+# Hits only refresh access times in memory; the index is written at most this often
+INDEX_SAVE_INTERVAL = 30.0
+
+# Staged downloads older than this are left over from earlier runs
+STAGING_MAX_AGE = 24 * 3600
+
+
+def normalize_script(text: str) -> str:
+    """Normalize script text so cosmetic differences map to the same render"""
+    text = text.replace('’', "'").replace('‘', "'")
+    text = text.replace('“', '"').replace('”', '"')
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def talk_key(script_text: str, provider: str, voice_id: str, source_url: str,
+             config: Optional[Dict[str, Any]] = None) -> str:
+    """Cache key for a talk render"""
+    payload = json.dumps({
+        "script": normalize_script(script_text),
+        "provider": provider,
+        "voice_id": voice_id,
+        "source_url": source_url,
+        "config": config or {}
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TalkCache:
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES, max_entries: Optional[int] = None):
+        """
+        Args:
+            cache_dir: Directory holding the cached MP4s and index
+            max_bytes: Evict least recently used clips above this total size
+            max_entries: Optional cap on the number of cached clips
+        """
+        self.cache_dir = cache_dir or os.getenv('TALK_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.index_path = os.path.join(self.cache_dir, 'index.json')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[str, Future] = {}  # Renders in flight, by key
+        self._saved_at = 0.0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+        self._clean_staging()
+
+    def _load_index(self) -> None:
+        try:
+            with open(self.index_path) as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entries = {}
+        # Oldest access first, skipping clips deleted behind our back
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]['last_access']):
+            if os.path.exists(self.path_for(key)):
+                self._entries[key] = entry
+
+    def _clean_staging(self) -> None:
+        # Linked puts leave their staged file for the player that is reading it
+        staging_dir = os.path.join(self.cache_dir, 'staging')
+        if not os.path.isdir(staging_dir):
+            return
+        cutoff = time.time() - STAGING_MAX_AGE
+        for name in os.listdir(staging_dir):
+            path = os.path.join(staging_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _save_index(self) -> None:
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.index_path)
+        self._saved_at = time.monotonic()
+
+    def flush(self) -> None:
+        """Persist access times recorded since the last save"""
+        with self._lock:
+            self._save_index()
+
+    def path_for(self, key: str) -> str:
+        """Location of the cached MP4 for a key"""
+        return os.path.join(self.cache_dir, key[:2], f'{key}.mp4')
+
+    def staging_path(self, key: str) -> str:
+        """Where to download a clip before handing it to `put`; unique, so concurrent renders of a key never share a file"""
+        return os.path.join(self.cache_dir, 'staging', f'{key}.{uuid.uuid4().hex}.mp4')
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached MP4, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not os.path.exists(self.path_for(key)):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            entry['last_access'] = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if time.monotonic() - self._saved_at > INDEX_SAVE_INTERVAL:
+                self._save_index()
+            return self.path_for(key)
+
+    def claim(self, key: str) -> Optional[Future]:
+        """Reserve the render of a key missing from the cache.
+
+        Returns None if the caller should render it, or else the future of the
+        render already in flight. Its result is that render's path, or None if
+        it failed, so a second caller never pays for the same render.
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = Future()
+            return pending
+
+    def resolve(self, key: str, path: Optional[str]) -> None:
+        """Hand the playable path of a claimed render to the callers waiting for it"""
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is not None and not pending.done():
+            pending.set_result(path)
+
+    def release(self, key: str, path: Optional[str] = None) -> None:
+        """End a claimed render; later callers look the key up in the cache again"""
+        with self._lock:
+            pending = self._pending.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(path)
+
+    def put(self, key: str, video_path: str, metadata: Optional[Dict[str, Any]] = None, link: bool = False) -> str:
+        """Move a rendered MP4 into the cache and return its cached path.
+
+        With `link`, the file is hard-linked (or copied) instead, leaving
+        `video_path` in place for a player that is already reading it.
+        """
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if link:
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            try:
+                os.link(video_path, tmp_path)
+            except OSError:
+                shutil.copyfile(video_path, tmp_path)
+            os.replace(tmp_path, path)
+        else:
+            shutil.move(video_path, path)
+        with self._lock:
+            self._entries[key] = {
+                'size': os.path.getsize(path),
+                'last_access': time.time(),
+                'metadata': metadata or {}
+            }
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+            self._save_index()
+        return path
+
+    def _evict(self, keep: str) -> None:
+        total = sum(entry['size'] for entry in self._entries.values())
+        while self._entries and (total > self.max_bytes or
+                                 (self.max_entries is not None and len(self._entries) > self.max_entries)):
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            entry = self._entries.pop(key)
+            total -= entry['size']
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': sum(entry['size'] for entry in self._entries.values())
+            }
+
+
+_default_cache: Optional[TalkCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_talk_cache() -> TalkCache:
+    """Process-wide cache so concurrent renders share one index and lock"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TalkCache()
+        return _default_cache
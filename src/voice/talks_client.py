@@ -0,0 +1,200 @@
+"""
+Shared client for the D-ID talks API.
+
+All talk requests go through one pooled keep-alive `requests.Session`, so
+rendering hundreds of clips does not pay a TLS handshake per call. Transient
+failures are retried with jittered exponential backoff, and waiting for a
+render polls on an adaptive schedule seeded from how long previous renders
+took, bounded by an overall deadline.
+"""
+
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from src.utils.metrics import LatencyStats
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_API_URL = "https://api.d-id.com"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Polling bounds, in seconds
+MIN_POLL_INTERVAL = 0.25
+MAX_POLL_INTERVAL = 5.0
+POLL_BACKOFF = 1.5
+
+
+class TalkRenderError(Exception):
+    """Raised when a talk fails to render or the API keeps refusing a request"""
+
+
+class TalksClient:
+    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None, pool_size: int = 10,
+                 max_retries: int = 3, timeout: float = 30.0, history_size: int = 200,
+                 poll_interval: float = 1.0, min_poll_interval: float = MIN_POLL_INTERVAL):
+        """
+        Args:
+            api_key: D-ID API key (defaults to D_ID_API_KEY)
+            api_url: Talks API base URL (defaults to D_ID_API_URL or the public API)
+            pool_size: Keep-alive connections kept open per host
+            max_retries: Retries per request on rate limiting, 5xx and connection errors
+            timeout: Per-request timeout in seconds
+            history_size: Number of recent render times used to seed polling
+            poll_interval: First status check of a talk before any render time is known
+            min_poll_interval: Shortest wait between status checks
+        """
+        self.api_key = api_key or os.getenv('D_ID_API_KEY')
+        if not self.api_key:
+            raise ValueError("D_ID_API_KEY not found in environment variables")
+        self.api_url = (api_url or os.getenv('D_ID_API_URL', DEFAULT_API_URL)).rstrip('/')
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.min_poll_interval = min_poll_interval
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "accept": "application/json",
+            "Authorization": f"Basic {self.api_key}"
+        })
+
+        self.render_times = deque(maxlen=history_size)
+        self.latency: Dict[str, LatencyStats] = {}
+        self.polls = 0
+        self._resume_at = 0.0  # Shared backoff: no thread sends before this time
+        self._lock = threading.Lock()
+
+    def _observe(self, endpoint: str, elapsed_ms: float) -> None:
+        if endpoint not in self.latency:
+            self.latency[endpoint] = LatencyStats(f"talks_{endpoint}_ms")
+        self.latency[endpoint].observe(elapsed_ms)
+
+    def request(self, endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying transient failures with jittered backoff"""
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            delay = self._resume_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            start_time = time.perf_counter()
+            retry_after = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+                self._observe(endpoint, (time.perf_counter() - start_time) * 1000)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                retry_after = response.headers.get('Retry-After')
+                error = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            backoff = float(retry_after) if retry_after else min(0.5 * 2 ** attempt, 10) * (0.5 + random.random())
+            # Rate limits apply to the whole account, so every caller of this client waits
+            with self._lock:
+                self._resume_at = max(self._resume_at, time.monotonic() + backoff)
+
+    def create_talk(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit a talk render"""
+        return self.request('create_talk', 'POST', f"{self.api_url}/talks", json=payload).json()
+
+    def get_talk_status(self, talk_id: str) -> Dict[str, Any]:
+        """Current status of a talk"""
+        return self.request('get_talk_status', 'GET', f"{self.api_url}/talks/{talk_id}").json()
+
+    def poll_intervals(self) -> Iterator[float]:
+        """Sleep intervals between status checks.
+
+        The first check waits for most of a typical render (from the observed
+        render times) instead of polling an unfinished talk, then intervals
+        grow geometrically.
+        """
+        if self.render_times:
+            typical = statistics.median(self.render_times)
+            first, interval = typical * 0.8, typical * 0.1
+        else:
+            first, interval = self.poll_interval, self.poll_interval / 2
+        yield max(first, self.min_poll_interval)
+        interval = min(max(interval, self.min_poll_interval), MAX_POLL_INTERVAL)
+        while True:
+            yield interval
+            interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+    def wait_for_completion(self, talk_id: str, deadline: float = 300.0, submitted_at: Optional[float] = None) -> str:
+        """Wait for a talk to finish rendering and return its result URL.
+
+        Args:
+            talk_id: Talk to wait for
+            deadline: Give up after this many seconds
+            submitted_at: time.monotonic() when the talk was created, if known
+
+        Raises:
+            TalkRenderError: If the talk fails or misses the deadline
+        """
+        submitted_at = submitted_at or time.monotonic()
+        give_up_at = submitted_at + deadline
+        for interval in self.poll_intervals():
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                raise TalkRenderError(f"Talk {talk_id} did not finish within {deadline:.0f} seconds")
+            time.sleep(min(interval, remaining))
+
+            self.polls += 1
+            status_response = self.get_talk_status(talk_id)
+            status = status_response["status"]
+            if status == "done":
+                self.render_times.append(time.monotonic() - submitted_at)
+                return status_response['result_url']
+            if status in ["error", "rejected"]:
+                raise TalkRenderError(f"Talk failed with status: {status}")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Latency summary per endpoint"""
+        return {endpoint: stats.summary() for endpoint, stats in self.latency.items()}
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_client: Optional[TalksClient] = None
+_download_session: Optional[requests.Session] = None
+_default_client_lock = threading.Lock()
+
+
+def get_talks_client() -> TalksClient:
+    """Process-wide client so every caller shares one connection pool"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = TalksClient()
+        return _default_client
+
+
+def get_download_session() -> requests.Session:
+    """Pooled session for fetching result videos.
+
+    Kept separate from the API session because result URLs are pre-signed
+    and must not receive the D-ID Authorization header.
+    """
+    global _download_session
+    with _default_client_lock:
+        if _download_session is None:
+            _download_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+            _download_session.mount('https://', adapter)
+            _download_session.mount('http://', adapter)
+        return _download_session
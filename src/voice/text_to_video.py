@@ -3,72 +3,124 @@ from dotenv import load_dotenv
 import requests
 import time
 
+from src.utils.logger import configure, get_logger, span
+from src.voice.talk_cache import get_talk_cache, talk_key
+from src.voice.talks_client import get_talks_client
+from src.voice.video_to_voice import download_video, get_talk_status, stream_video, wait_for_talk_completion
+
 # Load environment variables
 load_dotenv()
 
-def create_talk():
-    url = "https://api.d-id.com/talks"
+log = get_logger(__name__)
+
+DEFAULT_SOURCE_URL = "https://d-id-public-bucket.s3.us-west-2.amazonaws.com/alice.jpg"
+DEFAULT_PROVIDER = "microsoft"
+DEFAULT_VOICE_ID = "Sara"
+DEFAULT_CONFIG = {"fluent": False}
+DEFAULT_SCRIPT = "Hey, thanks for taking the time to speak with me. I'm Ed Chambers account executive. How are you today?"
 
+def create_talk(script_text=DEFAULT_SCRIPT, provider=DEFAULT_PROVIDER, voice_id=DEFAULT_VOICE_ID,
+                source_url=DEFAULT_SOURCE_URL, config=None):
     payload = {
-        "source_url": "https://d-id-public-bucket.s3.us-west-2.amazonaws.com/alice.jpg",
+        "source_url": source_url,
         "script": {
             "type": "text",
             "subtitles": False,
             "provider": {
-                "type": "microsoft",
-                "voice_id": "Sara"
+                "type": provider,
+                "voice_id": voice_id
             },
-            "input": "Hey, thanks for taking the time to speak with me. I'm Ed Chambers account executive. How are you today?"
+            "input": script_text
         },
-        "config": { "fluent": False }
+        "config": config if config is not None else DEFAULT_CONFIG
     }
 
     # Get API keys
     eleven_api_key = os.getenv('e11even_API_KEY')
-    d_id_api_key = os.getenv('D_ID_API_KEY')
 
     if not eleven_api_key:
         raise ValueError("e11even_API_KEY not found in environment variables")
-    if not d_id_api_key:
-        raise ValueError("D_ID_API_KEY not found in environment variables")
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "Authorization": f"Basic {d_id_api_key}"
-    }
 
     try:
         start_time = time.time()
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
+        response = get_talks_client().create_talk(payload)
         elapsed_time = time.time() - start_time
-        print(f"Response received in {elapsed_time:.2f} seconds:")
-        return response.json()
+        log.debug("Talk created in %.2f seconds", elapsed_time, extra={'talk_id': response.get('id')})
+        return response
     except requests.exceptions.RequestException as e:
-        print(f"Error making request: {e}")
+        log.error("Error creating talk: %s", e)
         return None
 
-def get_talk_status(talk_id):
-    d_id_api_key = os.getenv('D_ID_API_KEY')
-    if not d_id_api_key:
-        raise ValueError("D_ID_API_KEY not found in environment variables")
+def render_talk(script_text, provider=DEFAULT_PROVIDER, voice_id=DEFAULT_VOICE_ID,
+                source_url=DEFAULT_SOURCE_URL, config=None, cache=None, ready_bytes=None):
+    """Return a local MP4 of the script, only rendering through D-ID on a cache miss.
+
+    With `ready_bytes`, a fresh render is returned as soon as that much of it
+    is on disk, so playback starts while the rest downloads. The returned path
+    is never renamed; the clip is added to the cache once it is complete.
+    """
+    config = config if config is not None else DEFAULT_CONFIG
+    if cache is None:
+        cache = get_talk_cache()
+    key = talk_key(script_text, provider, voice_id, source_url, config)
+
+    with span("render", chars=len(script_text)) as timing:
+        cached_path = cache.get(key)
+        timing.annotate(cached=bool(cached_path))
+        if cached_path:
+            return cached_path
 
-    url = f"https://api.d-id.com/talks/{talk_id}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Basic {d_id_api_key}"
+        # A render of the same text already in flight, e.g. a speculative one, is shared rather than paid for twice
+        in_flight = cache.claim(key)
+        if in_flight is not None:
+            timing.annotate(shared=True)
+            return in_flight.result()
+        if key in cache:
+            # Finished by another caller between the lookup and the claim
+            cache.release(key)
+            return cache.get(key)
+
+        try:
+            # The client's poll schedule learns from render times, which count from submission
+            submitted_at = time.monotonic()
+            talk_response = create_talk(script_text, provider, voice_id, source_url, config)
+            result_url = wait_for_talk_completion(talk_response["id"], submitted_at=submitted_at) if talk_response else None
+        except BaseException:
+            cache.release(key)
+            raise
+        if not result_url:
+            cache.release(key)
+            return None
+
+    staging_path = cache.staging_path(key)
+    metadata = {
+        "talk_id": talk_response["id"],
+        "script": script_text,
+        "voice_id": voice_id
     }
+    if ready_bytes is not None:
+        def complete(path):
+            # The player keeps the staged path, so the cache links to it rather than moving it
+            cache.put(key, path, metadata=metadata, link=True)
+            cache.release(key)
+
+        download = stream_video(result_url, staging_path, ready_bytes=ready_bytes, on_complete=complete,
+                                on_failed=lambda error: cache.release(key))
+        playable = download.wait_ready()
+        # Callers waiting on this render play the same growing file
+        cache.resolve(key, playable)
+        return playable
 
+    path = None
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error getting talk status: {e}")
-        return None
+        if download_video(result_url, staging_path):
+            path = cache.put(key, staging_path, metadata=metadata)
+    finally:
+        cache.release(key, path)
+    return path
 
 if __name__ == "__main__":
+    configure()
     # Create the talk
     talk_response = create_talk()
     if not talk_response:
@@ -77,21 +129,7 @@ if __name__ == "__main__":
     talk_id = talk_response["id"]
     print(f"\nCreated talk with ID: {talk_id}")
     
-    # Poll for the talk status until it's done
-    while True:
-        status_response = get_talk_status(talk_id)
-        if not status_response:
-            break
-            
-        status = status_response["status"]
-        print(f"Status: {status}")
-        
-        if status == "done":
-            print(f"\nTalk completed!")
-            print(f"Result URL: {status_response['result_url']}")
-            break
-        elif status in ["error", "rejected"]:
-            print(f"Talk failed with status: {status}")
-            break
-            
-        time.sleep(1)  # Wait before checking again
\ No newline at end of file
+    # Wait for the talk to finish rendering
+    result_url = wait_for_talk_completion(talk_id)
+    if result_url:
+        print(f"Result URL: {result_url}")
@@ -1,68 +1,54 @@
 import os
 from dotenv import load_dotenv
 import requests
-import time
+
+from src.utils.logger import configure, get_logger
+from src.voice.download import DEFAULT_READY_BYTES, StreamingDownload
+from src.voice.talks_client import TalkRenderError, get_talks_client
 
 # Load environment variables
 load_dotenv()
 
-def get_talk_status(talk_id):
-    d_id_api_key = os.getenv('D_ID_API_KEY')
-    if not d_id_api_key:
-        raise ValueError("D_ID_API_KEY not found in environment variables")
-
-    url = f"https://api.d-id.com/talks/{talk_id}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Basic {d_id_api_key}"
-    }
+log = get_logger(__name__)
 
+def get_talk_status(talk_id):
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return get_talks_client().get_talk_status(talk_id)
     except requests.exceptions.RequestException as e:
-        print(f"Error getting talk status: {e}")
+        log.error("Error getting status of talk %s: %s", talk_id, e)
         return None
 
 def download_video(url, output_path):
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        # Create output directory if it doesn't exist
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Save the video file
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        print(f"Video saved to: {output_path}")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading video: {e}")
+    download = StreamingDownload(url, output_path)
+    if not download.run():
         return False
+    log.info("Video saved to %s", output_path)
+    return True
 
-def wait_for_talk_completion(talk_id):
-    while True:
-        status_response = get_talk_status(talk_id)
-        if not status_response:
-            return None
-            
-        status = status_response["status"]
-        print(f"Status: {status}")
-        
-        if status == "done":
-            print(f"\nTalk completed!")
-            return status_response['result_url']
-        elif status in ["error", "rejected"]:
-            print(f"Talk failed with status: {status}")
-            return None
-            
-        time.sleep(1)  # Wait before checking again
+def stream_video(url, output_path, ready_bytes=DEFAULT_READY_BYTES, on_ready=None, on_complete=None, on_failed=None):
+    '''Start downloading in the background; `wait_ready()` on the result gives a playable path early.
+
+    The file is written at `output_path` from the first byte and never renamed,
+    so a player can keep the path it was handed while the rest streams in.
+    '''
+    return StreamingDownload(url, output_path, ready_bytes=ready_bytes, on_ready=on_ready,
+                             on_complete=on_complete, on_failed=on_failed, atomic=False).start()
+
+def wait_for_talk_completion(talk_id, deadline=300, submitted_at=None):
+    '''Result URL of a talk, or None if it failed; `submitted_at` is the time.monotonic() it was created at'''
+    try:
+        result_url = get_talks_client().wait_for_completion(talk_id, deadline=deadline, submitted_at=submitted_at)
+        log.info("Talk %s completed", talk_id)
+        return result_url
+    except TalkRenderError as e:
+        log.error("%s", e, extra={'talk_id': talk_id})
+        return None
+    except requests.exceptions.RequestException as e:
+        log.error("Error getting status of talk %s: %s", talk_id, e)
+        return None
 
 if __name__ == "__main__":
+    configure()
     # Example usage
     talk_id = input("Enter talk ID: ")
     result_url = wait_for_talk_completion(talk_id)
@@ -0,0 +1,55 @@
+"""
+Deterministic local chat model.
+
+Answers are picked by keyword from the latest human message and streamed
+word by word, with an optional per-token delay to stand in for generation
+time. Tools can be bound but are never called, so the ReAct agent answers
+in one step without a network or API key.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+DEFAULT_ANSWER = "Good question. Let me explain how that works for teams like yours."
+
+
+class FakeChatModel(BaseChatModel):
+    answers: Dict[str, str] = {}  # Keyword in the prospect's words -> answer
+    token_delay: float = 0.0  # Seconds per streamed word
+    prompts: List[List[BaseMessage]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> 'FakeChatModel':
+        return self
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        self.prompts.append(list(messages))
+        text = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), '').lower()
+        return next((answer for keyword, answer in self.answers.items() if keyword in text), DEFAULT_ANSWER)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for word in self._answer(messages).split(' '):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + ' '))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for word in self._answer(messages).split(' '):
+            await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + ' '))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,23 @@
+"""
+Local notifier that records escalations instead of sending them.
+"""
+
+import asyncio
+import time
+from typing import List, Tuple
+
+from src.hitl.hitl_service import Escalation
+
+
+class FakeNotifier:
+    def __init__(self, name: str = 'fake', delay: float = 0.0, fail: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.sent: List[Tuple[Escalation, float]] = []  # With time.time() of delivery
+
+    async def send(self, escalation: Escalation) -> None:
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(f"{self.name} is unreachable")
+        self.sent.append((escalation, time.time()))
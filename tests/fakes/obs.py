@@ -0,0 +1,214 @@
+"""In-process stand-in for OBS used by the video tests.
+
+`FakeOBS` mimics the parts of obs-websocket the players use: media inputs
+"play" on timers, and media started/ended events are delivered to callbacks
+registered through the `EventClient` the same way obsws_python does it.
+"""
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+
+def _snake(name):
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+class FakeMediaInput:
+    def __init__(self, name):
+        self.name = name
+        self.settings = {}
+        self.state = "OBS_MEDIA_STATE_NONE"
+        self.cursor = 0.0  # Seconds into the current file
+        self.resumed_at = None
+        self.timer = None
+        self.enabled = True
+        self.volume = 1.0
+        self.scene = 'Scene'
+
+
+class FakeOBS:
+    def __init__(self, clip_duration=0.05, durations=None, load_delay=0.0):
+        """
+        Args:
+            clip_duration: Default playback length of every clip, in seconds
+            durations: Optional mapping of file basename to playback length
+            load_delay: Time between a play request and the started event
+        """
+        self.clip_duration = clip_duration
+        self.durations = durations or {}
+        self.load_delay = load_delay
+        self.inputs = {}
+        self.scenes = ['Scene']
+        self.scene_items = []
+        self.callbacks = []
+        self.calls = []
+        self.lock = threading.RLock()
+
+    # Factories patched over obs.ReqClient / obs.EventClient
+
+    def req_client(self, **kwargs):
+        return FakeReqClient(self)
+
+    def event_client(self, **kwargs):
+        return FakeEventClient(self)
+
+    # Helpers
+
+    def emit(self, event_type, **data):
+        name = f"on_{_snake(event_type)}"
+        for fn in list(self.callbacks):
+            if fn.__name__ == name:
+                fn(SimpleNamespace(**data))
+
+    def media_input(self, name):
+        with self.lock:
+            if name not in self.inputs:
+                self.inputs[name] = FakeMediaInput(name)
+                self.scene_items.append(name)
+            return self.inputs[name]
+
+    def duration_of(self, media):
+        path = media.settings.get('local_file', '')
+        return self.durations.get(os.path.basename(path), self.clip_duration)
+
+    def position(self, media):
+        if media.state == "OBS_MEDIA_STATE_PLAYING" and media.resumed_at is not None:
+            return media.cursor + (time.perf_counter() - media.resumed_at)
+        return media.cursor
+
+    def _cancel(self, media):
+        if media.timer is not None:
+            media.timer.cancel()
+            media.timer = None
+
+    def _schedule_end(self, media):
+        """(Re)arm the end-of-media timer from the current cursor; caller holds the lock"""
+        def ended():
+            with self.lock:
+                if media.timer is not timer:
+                    return
+                media.state = "OBS_MEDIA_STATE_ENDED"
+                media.cursor = self.duration_of(media)
+                media.timer = None
+            self.emit("MediaInputPlaybackEnded", input_name=media.name)
+
+        self._cancel(media)
+        media.resumed_at = time.perf_counter()
+        remaining = max(self.duration_of(media) - media.cursor, 0)
+        timer = media.timer = threading.Timer(remaining, ended)
+        timer.daemon = True
+        timer.start()
+
+    def _start(self, media):
+        self._cancel(media)
+
+        def started():
+            with self.lock:
+                if self.load_delay and media.timer is not timer:
+                    return
+                media.state = "OBS_MEDIA_STATE_PLAYING"
+                self._schedule_end(media)
+            self.emit("MediaInputPlaybackStarted", input_name=media.name)
+
+        timer = None
+        if self.load_delay:
+            timer = media.timer = threading.Timer(self.load_delay, started)
+            timer.daemon = True
+            timer.start()
+        else:
+            threading.Thread(target=started, daemon=True).start()
+
+    def media_action(self, name, action):
+        with self.lock:
+            media = self.media_input(name)
+            if action in ("OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY", "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_RESTART"):
+                if action.endswith("RESTART") or media.state in ("OBS_MEDIA_STATE_ENDED", "OBS_MEDIA_STATE_STOPPED"):
+                    media.cursor = 0.0
+                if action.endswith("RESTART") or media.state != "OBS_MEDIA_STATE_PLAYING":
+                    self._start(media)
+            elif action == "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PAUSE":
+                media.cursor = self.position(media)
+                self._cancel(media)
+                media.state = "OBS_MEDIA_STATE_PAUSED"
+            elif action == "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_STOP":
+                self._cancel(media)
+                media.cursor = 0.0
+                media.state = "OBS_MEDIA_STATE_STOPPED"
+
+
+class FakeReqClient:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def _record(self, name, *args):
+        self.fake.calls.append((name, args))
+
+    def create_scene(self, name):
+        self._record('create_scene', name)
+        self.fake.scenes.append(name)
+
+    def create_input(self, sceneName, inputName, inputKind, inputSettings, sceneItemEnabled):
+        self._record('create_input', inputName)
+        media = self.fake.media_input(inputName)
+        media.settings = dict(inputSettings)
+        media.enabled = sceneItemEnabled
+        media.scene = sceneName
+
+    def get_scene_item_id(self, scene_name, source_name, offset=None):
+        self._record('get_scene_item_id', source_name)
+        self.fake.media_input(source_name)
+        return SimpleNamespace(scene_item_id=self.fake.scene_items.index(source_name) + 1)
+
+    def set_scene_item_transform(self, scene_name, item_id, transform):
+        self._record('set_scene_item_transform', item_id)
+
+    def set_scene_item_enabled(self, scene_name, item_id, enabled):
+        self._record('set_scene_item_enabled', item_id, enabled)
+        self.fake.inputs[self.fake.scene_items[item_id - 1]].enabled = enabled
+
+    def set_input_settings(self, name, settings, overlay):
+        self._record('set_input_settings', name, settings.get('local_file'))
+        with self.fake.lock:
+            media = self.fake.media_input(name)
+            self.fake._cancel(media)
+            media.settings.update(settings)
+            media.cursor = 0.0
+            media.state = "OBS_MEDIA_STATE_STOPPED"
+
+    def set_input_volume(self, name, vol_mul=None, vol_db=None):
+        self._record('set_input_volume', name, vol_mul)
+        self.fake.media_input(name).volume = vol_mul
+
+    def trigger_media_input_action(self, name, action):
+        self._record('trigger_media_input_action', name, action)
+        self.fake.media_action(name, action)
+
+    def get_media_input_status(self, name):
+        self._record('get_media_input_status', name)
+        with self.fake.lock:
+            media = self.fake.media_input(name)
+            return SimpleNamespace(
+                media_state=media.state,
+                media_cursor=int(self.fake.position(media) * 1000),
+                media_duration=int(self.fake.duration_of(media) * 1000)
+            )
+
+    def set_media_input_cursor(self, name, cursor):
+        self._record('set_media_input_cursor', name, cursor)
+        with self.fake.lock:
+            media = self.fake.media_input(name)
+            media.cursor = cursor / 1000
+            if media.state == "OBS_MEDIA_STATE_PLAYING":
+                self.fake._schedule_end(media)
+
+
+class FakeEventClient:
+    def __init__(self, fake):
+        self.fake = fake
+        self.callback = SimpleNamespace(register=self.register)
+
+    def register(self, fns):
+        for fn in fns if isinstance(fns, (list, tuple)) else [fns]:
+            self.fake.callbacks.append(fn)
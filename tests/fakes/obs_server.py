@@ -0,0 +1,180 @@
+"""Local fake obs-websocket v5 server for testing the asyncio OBS client.
+
+Requests are served by the same `FakeOBS` model the synchronous tests use,
+and its media events are forwarded to connected clients as Event messages.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+
+from aiohttp import web
+
+from tests.fakes.obs import FakeOBS
+
+UNKNOWN_REQUEST_TYPE = 204
+RESOURCE_NOT_FOUND = 600
+RESOURCE_ALREADY_EXISTS = 601
+
+
+class FakeOBSWebSocketServer:
+    def __init__(self, fake=None, password=None, request_delay=0.0):
+        """
+        Args:
+            fake: FakeOBS model to serve (a new one by default)
+            password: Require authentication with this password
+            request_delay: Simulated processing time per request, in seconds
+        """
+        self.fake = fake or FakeOBS()
+        self.password = password
+        self.request_delay = request_delay
+        self.requests = []  # Request types in the order received
+        self.batches = []  # Request types of each batch received
+        self.port = None
+        self._clients = set()
+        self._runner = None
+        self._loop = None
+        self.fake.callbacks.extend([self.on_media_input_playback_started, self.on_media_input_playback_ended])
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        app = web.Application()
+        app.router.add_get('/', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        for ws in list(self._clients):
+            await ws.close()
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    async def send_raw(self, text):
+        """Send a raw text frame to every client, e.g. a malformed message"""
+        for ws in list(self._clients):
+            await ws.send_str(text)
+
+    async def drop_clients(self):
+        """Close every client connection without stopping the server"""
+        for ws in list(self._clients):
+            await ws.close()
+
+    # Events from the FakeOBS timers arrive on other threads
+
+    def _broadcast(self, event_type, event_data):
+        message = {"op": 5, "d": {"eventType": event_type, "eventIntent": 1 << 8, "eventData": event_data}}
+
+        def send():
+            for ws in list(self._clients):
+                asyncio.ensure_future(ws.send_json(message))
+        try:
+            self._loop.call_soon_threadsafe(send)
+        except RuntimeError:
+            pass  # A media timer outlived the server; there is nobody left to tell
+
+    def on_media_input_playback_started(self, data):
+        self._broadcast("MediaInputPlaybackStarted", {"inputName": data.input_name})
+
+    def on_media_input_playback_ended(self, data):
+        self._broadcast("MediaInputPlaybackEnded", {"inputName": data.input_name})
+
+    # Protocol
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        hello = {"obsWebSocketVersion": "5.0.0", "rpcVersion": 1}
+        if self.password:
+            hello["authentication"] = {"challenge": "fake-challenge", "salt": "fake-salt"}
+        await ws.send_json({"op": 0, "d": hello})
+
+        identify = await ws.receive_json()
+        if self.password and identify["d"].get("authentication") != self._expected_auth():
+            await ws.close(code=4009, message=b'Authentication failed')
+            return ws
+        await ws.send_json({"op": 2, "d": {"negotiatedRpcVersion": 1}})
+        self._clients.add(ws)
+
+        try:
+            async for msg in ws:
+                message = json.loads(msg.data)
+                asyncio.ensure_future(self._serve(ws, message["op"], message["d"]))
+        finally:
+            self._clients.discard(ws)
+        return ws
+
+    def _expected_auth(self):
+        secret = base64.b64encode(hashlib.sha256((self.password + "fake-salt").encode()).digest()).decode()
+        return base64.b64encode(hashlib.sha256((secret + "fake-challenge").encode()).digest()).decode()
+
+    async def _serve(self, ws, op, data):
+        if self.request_delay:
+            await asyncio.sleep(self.request_delay)
+        if op == 6:
+            result = self._execute(data["requestType"], data.get("requestData", {}))
+            await ws.send_json({"op": 7, "d": dict(result, requestId=data["requestId"])})
+        elif op == 8:
+            self.batches.append([r["requestType"] for r in data["requests"]])
+            results = []
+            for r in data["requests"]:
+                result = self._execute(r["requestType"], r.get("requestData", {}))
+                results.append(result)
+                if data.get("haltOnFailure") and not result["requestStatus"]["result"]:
+                    break
+            await ws.send_json({"op": 9, "d": {"requestId": data["requestId"], "results": results}})
+
+    def _execute(self, request_type, d):
+        self.requests.append(request_type)
+        client = self.fake.req_client()
+        response = None
+        ok = {"result": True, "code": 100}
+
+        if request_type == "CreateScene":
+            if d["sceneName"] in self.fake.scenes:
+                return self._failure(request_type, RESOURCE_ALREADY_EXISTS, "Scene already exists")
+            client.create_scene(d["sceneName"])
+        elif request_type == "CreateInput":
+            if d["inputName"] in self.fake.inputs:
+                return self._failure(request_type, RESOURCE_ALREADY_EXISTS, "Input already exists")
+            if d["sceneName"] not in self.fake.scenes:
+                return self._failure(request_type, RESOURCE_NOT_FOUND, "No scene by that name")
+            client.create_input(d["sceneName"], d["inputName"], d["inputKind"], d.get("inputSettings", {}),
+                                d.get("sceneItemEnabled", True))
+        elif request_type == "GetSceneItemId":
+            response = {"sceneItemId": client.get_scene_item_id(d["sceneName"], d["sourceName"]).scene_item_id}
+        elif request_type == "SetSceneItemTransform":
+            client.set_scene_item_transform(d["sceneName"], d["sceneItemId"], d["sceneItemTransform"])
+        elif request_type == "SetSceneItemEnabled":
+            client.set_scene_item_enabled(d["sceneName"], d["sceneItemId"], d["sceneItemEnabled"])
+        elif request_type == "SetInputSettings":
+            client.set_input_settings(d["inputName"], d["inputSettings"], d.get("overlay", True))
+        elif request_type == "SetInputVolume":
+            client.set_input_volume(d["inputName"], vol_mul=d.get("inputVolumeMul"))
+        elif request_type == "TriggerMediaInputAction":
+            client.trigger_media_input_action(d["inputName"], d["mediaAction"])
+        elif request_type == "SetMediaInputCursor":
+            client.set_media_input_cursor(d["inputName"], d["mediaCursor"])
+        elif request_type == "GetMediaInputStatus":
+            status = client.get_media_input_status(d["inputName"])
+            response = {"mediaState": status.media_state, "mediaCursor": status.media_cursor,
+                        "mediaDuration": status.media_duration}
+        else:
+            return self._failure(request_type, UNKNOWN_REQUEST_TYPE, "Unknown request type")
+
+        result = {"requestType": request_type, "requestStatus": ok}
+        if response is not None:
+            result["responseData"] = response
+        return result
+
+    @staticmethod
+    def _failure(request_type, code, comment):
+        return {"requestType": request_type, "requestStatus": {"result": False, "code": code, "comment": comment}}
@@ -0,0 +1,159 @@
+"""Local fake of the D-ID talks API.
+
+POST /talks starts a "render" that finishes after `render_delay` seconds,
+GET /talks/{id} reports its status and GET /results/{id}.mp4 serves the
+rendered bytes. Rate limiting can be simulated with `rate_limit_first`.
+"""
+import asyncio
+import contextlib
+import itertools
+import threading
+import time
+
+from aiohttp import web
+
+
+class FakeTalksServer:
+    def __init__(self, render_delay=0.05, rate_limit_first=0, retry_after=0.05, fail_scripts=(),
+                 result_size=None, chunk_delay=0.0, drop_after=None):
+        """
+        Args:
+            render_delay: Seconds between creating a talk and it being done
+            rate_limit_first: Answer this many POST /talks requests with 429
+            retry_after: Retry-After value sent with a 429, in seconds
+            fail_scripts: Script inputs whose render ends in status "error"
+            result_size: Size of each result video in bytes (small by default)
+            chunk_delay: Pause between 64 KB chunks of a result download
+            drop_after: Cut the first result download after this many bytes
+        """
+        self.render_delay = render_delay
+        self.rate_limit_first = rate_limit_first
+        self.retry_after = retry_after
+        self.fail_scripts = set(fail_scripts)
+        self.result_size = result_size
+        self.chunk_delay = chunk_delay
+        self.drop_after = drop_after
+        self.range_requests = []  # Range headers of result downloads
+        self.talks = {}
+        self.created = []  # Script inputs in the order they were accepted
+        self.rate_limited = 0
+        self.status_polls = 0
+        self.max_in_flight = 0
+        self.peers = set()  # Client (host, port) pairs, i.e. distinct connections
+        self.port = None
+        self._ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        app = web.Application(middlewares=[self._track_peer])
+        app.router.add_post('/talks', self._create)
+        app.router.add_get('/talks/{talk_id}', self._status)
+        app.router.add_get('/results/{talk_id}.mp4', self._result)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    @contextlib.contextmanager
+    def running_in_thread(self):
+        """Serve from a background event loop, for tests of blocking clients"""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+        try:
+            yield self
+        finally:
+            asyncio.run_coroutine_threadsafe(self.stop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    @web.middleware
+    async def _track_peer(self, request, handler):
+        self.peers.add(request.transport.get_extra_info('peername'))
+        return await handler(request)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    def in_flight(self):
+        now = time.monotonic()
+        return sum(1 for talk in self.talks.values() if talk['done_at'] > now)
+
+    def result_bytes(self, talk_id):
+        pattern = f"MP4 for {self.talks[talk_id]['script']}".encode()
+        if self.result_size is None:
+            return pattern * 100
+        return (pattern * (self.result_size // len(pattern) + 1))[:self.result_size]
+
+    async def _create(self, request):
+        if self.rate_limited < self.rate_limit_first:
+            self.rate_limited += 1
+            return web.json_response({"kind": "TooManyRequests"}, status=429,
+                                     headers={"Retry-After": str(self.retry_after)})
+        body = await request.json()
+        script = body["script"]["input"]
+        talk_id = f"tlk_{next(self._ids)}"
+        self.talks[talk_id] = {'script': script, 'done_at': time.monotonic() + self.render_delay}
+        self.created.append(script)
+        self.max_in_flight = max(self.max_in_flight, self.in_flight())
+        return web.json_response({"id": talk_id, "status": "created"}, status=201)
+
+    async def _status(self, request):
+        self.status_polls += 1
+        talk_id = request.match_info['talk_id']
+        talk = self.talks.get(talk_id)
+        if talk is None:
+            return web.json_response({"kind": "NotFoundError"}, status=404)
+        if time.monotonic() < talk['done_at']:
+            return web.json_response({"id": talk_id, "status": "started"})
+        if talk['script'] in self.fail_scripts:
+            return web.json_response({"id": talk_id, "status": "error"})
+        return web.json_response({
+            "id": talk_id,
+            "status": "done",
+            "result_url": f"{self.url}/results/{talk_id}.mp4"
+        })
+
+    async def _result(self, request):
+        body = self.result_bytes(request.match_info['talk_id'])
+        start, status, headers = 0, 200, {'Content-Type': 'video/mp4', 'Accept-Ranges': 'bytes'}
+        range_header = request.headers.get('Range')
+        self.range_requests.append(range_header)
+        if range_header:
+            start = int(range_header.split('=')[1].split('-')[0])
+            status = 206
+            headers['Content-Range'] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+        headers['Content-Length'] = str(len(body) - start)
+
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+        drop_at = None
+        if self.drop_after is not None:
+            drop_at, self.drop_after = self.drop_after, None
+        position = start
+        while position < len(body):
+            end = min(position + 64 * 1024, len(body))
+            if drop_at is not None and end > drop_at:
+                await response.write(body[position:drop_at])
+                request.transport.close()
+                return response
+            await response.write(body[position:end])
+            position = end
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        await response.write_eof()
+        return response
@@ -0,0 +1,76 @@
+"""
+Regenerates the WAV fixtures used by the barge-in tests.
+
+The clips are synthetic so they can be rebuilt exactly: a voiced harmonic
+signal with syllable-rate modulation stands in for speech, over a bed of
+room noise, alongside mains hum, a hiss burst and a door knock that must not
+be taken for speech. Labels (speech onsets in seconds) are written next to
+them in audio_fixtures.json. Recorded clips can be added the same way.
+
+Usage:
+    python tests/fixtures/make_audio_fixtures.py
+"""
+
+import json
+import os
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def room_noise(rng, seconds, level=0.002):
+    return level * rng.standard_normal(int(seconds * SAMPLE_RATE))
+
+
+def speech(rng, seconds, f0=120.0, level=0.15):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = f0 * (1 + 0.05 * np.sin(2 * np.pi * 1.5 * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    # Harmonics weighted around two formants
+    voiced = sum(np.sin(k * phase) * (np.exp(-((k * f0 - 700) / 300) ** 2) + 0.5 * np.exp(-((k * f0 - 1500) / 400) ** 2))
+                 for k in range(1, 30))
+    syllables = 0.6 + 0.4 * np.abs(np.sin(2 * np.pi * 2.0 * t))
+    attack = np.minimum(t / 0.01, 1.0)
+    signal = voiced * syllables * attack
+    return level * signal / np.max(np.abs(signal)) + room_noise(rng, seconds)
+
+
+def hum(seconds, level=0.1):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return level * np.sin(2 * np.pi * 50 * t)
+
+
+def write(name, samples):
+    with wave.open(os.path.join(FIXTURE_DIR, name), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def main():
+    rng = np.random.default_rng(7)
+    labels = {}
+
+    write('barge_in_speech.wav', np.concatenate([
+        room_noise(rng, 0.8), speech(rng, 1.0), room_noise(rng, 0.8), speech(rng, 0.6, f0=180), room_noise(rng, 0.6)
+    ]))
+    labels['barge_in_speech.wav'] = [0.8, 2.6]
+
+    knock = np.zeros(int(0.02 * SAMPLE_RATE))
+    knock[::2] = 0.5
+    write('barge_in_noise.wav', np.concatenate([
+        room_noise(rng, 0.5), hum(0.6) + room_noise(rng, 0.6), room_noise(rng, 0.4),
+        0.3 * rng.standard_normal(int(0.5 * SAMPLE_RATE)), room_noise(rng, 0.4), knock, room_noise(rng, 0.5)
+    ]))
+    labels['barge_in_noise.wav'] = []
+
+    with open(os.path.join(FIXTURE_DIR, 'audio_fixtures.json'), 'w') as f:
+        json.dump(labels, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,424 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import aiohttp
+import numpy as np
+
+from src.agents.session_manager import AdmissionError, SessionManager
+from src.hitl.hitl_service import HITLService
+from src.interrupt.barge_in import BargeInDetector
+from src.interrupt.speculative import ObjectionPredictor, SpeculativeRenderer
+from src.memory.memory_service import MemoryService
+from src.transcription.audio_bridge import AudioBridge
+from src.utils.metrics import LatencyStats
+from src.utils.startup import measure, parse_importtime
+from src.video.obs_async import AsyncOBSClient
+from tests.fakes.embeddings import FakeEmbeddings
+from tests.fakes.llm import FakeChatModel
+from tests.fakes.obs import FakeOBS
+from tests.fakes.obs_server import FakeOBSWebSocketServer
+
+
+class FakePlayer:
+    def __init__(self):
+        self.volumes = []
+        self.interrupt_latency = LatencyStats('interrupt_to_first_frame_ms')
+
+    async def duck(self, volume=0.2):
+        self.volumes.append(volume)
+
+    async def unduck(self):
+        await self.duck(1.0)
+
+
+class FakeAgent:
+    """Records the turns of one call on a shared memory store"""
+
+    def __init__(self, session_id, memory, delay=0.01):
+        self.session_id = session_id
+        self.memory = memory
+        self.delay = delay
+        self.media_player = FakePlayer()
+        self.prompt_latency = LatencyStats('prompt_build_ms')
+        self.heard = []
+        self.closed = False
+
+    async def start_sales_pitch(self, video_folder):
+        await self.memory.add(f'Started sales pitch with videos from: {video_folder}', 'session',
+                              {'video_folder': video_folder, 'session_id': self.session_id})
+
+    async def handle_user_interruption(self, text):
+        self.heard.append(text)
+        await asyncio.sleep(self.delay)
+        await self.memory.add(text, 'interruption', {'session_id': self.session_id, 'interrupt_type': 2})
+
+    async def close(self):
+        self.closed = True
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.created = 0
+
+    def manager(self, **kwargs):
+        def factory(session_id, manager):
+            def create_memory():
+                self.created += 1
+                return MemoryService(FakeEmbeddings(dims=16), dims=16, directory=self.tmp.name)
+            return FakeAgent(session_id, manager.shared('memory', create_memory))
+        return SessionManager(agent_factory=factory, **kwargs)
+
+    def test_sessions_are_isolated_on_shared_resources(self):
+        hitl = HITLService([])
+
+        async def scenario():
+            manager = self.manager(max_sessions=10, hitl=hitl)
+            sessions = [await manager.open(f'call-{i}') for i in range(10)]
+            await asyncio.gather(*(s.start('src/assets/base') for s in sessions))
+            start_time = time.perf_counter()
+            await asyncio.gather(*(s.handle_interruption(f'question from call {i}')
+                                   for i, s in enumerate(sessions) for _ in range(3)))
+            elapsed = time.perf_counter() - start_time
+            stats = manager.stats()
+            await manager.shutdown()
+            return manager, sessions, stats, elapsed
+
+        manager, sessions, stats, elapsed = asyncio.run(scenario())
+        self.assertEqual(self.created, 1)
+        self.assertEqual(sessions[3].agent.heard, ['question from call 3'] * 3)
+        # Calls run concurrently; turns within one call are serialized
+        self.assertLess(elapsed, 0.2)
+        self.assertEqual(stats['active'], 10)
+        self.assertEqual(stats['sessions']['call-3']['turns'], 3)
+        self.assertIn('prompt_ms', stats['sessions']['call-3'])
+        self.assertIn('Interruptions: 3', hitl.summaries['call-3'].text)
+        self.assertNotIn('call 4', hitl.summaries['call-3'].text)
+        self.assertTrue(all(s.agent.closed for s in sessions))
+        self.assertEqual(manager.finished['call-3']['turns'], 3)
+
+    def test_admission_control(self):
+        async def scenario():
+            manager = self.manager(max_sessions=2)
+            await manager.open('a')
+            await manager.open('b')
+            with self.assertRaises(AdmissionError):
+                await manager.open('c')
+            with self.assertRaises(ValueError):
+                await manager.open('a', timeout=0.1)
+            # A waiting call gets the slot freed by a finished one
+            asyncio.get_running_loop().call_later(0.05, lambda: asyncio.ensure_future(manager.close('a')))
+            async with manager.session('c', timeout=1.0) as session:
+                self.assertEqual(set(manager.sessions), {'b', 'c'})
+            return manager
+
+        manager = asyncio.run(scenario())
+        self.assertEqual((manager.admitted, manager.rejected), (3, 1))
+        self.assertEqual(set(manager.sessions), {'b'})
+
+    def test_same_id_opened_twice_at_once_is_refused(self):
+        threads = []
+
+        def factory(session_id, manager):
+            threads.append(threading.get_ident())
+            time.sleep(0.05)
+            return FakeAgent(session_id, None)
+
+        async def scenario():
+            manager = SessionManager(agent_factory=factory)
+            results = await asyncio.gather(manager.open('a'), manager.open('a'), return_exceptions=True)
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            ticker = asyncio.ensure_future(tick())
+            await manager.open('b')
+            ticker.cancel()
+            return manager, results, ticks
+
+        manager, results, ticks = asyncio.run(scenario())
+        self.assertEqual(sorted(type(r).__name__ for r in results), ['Session', 'ValueError'])
+        self.assertEqual(set(manager.sessions), {'a', 'b'})
+        # The agents were built off the event loop, which kept running meanwhile
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertGreater(ticks, 3)
+
+    def test_listens_to_its_bridge_stream(self):
+        rate = 16000
+        t = np.arange(int(0.5 * rate)) / rate
+        audio = np.concatenate([np.zeros(rate // 2), 0.3 * np.sin(2 * np.pi * 220 * t), np.zeros(rate // 2)])
+        pcm = (audio * 32767).astype('<i2')
+
+        async def scenario():
+            manager = self.manager()
+            async with AudioBridge(port=0) as bridge:
+                session = await manager.open('call-1')
+                session.listen(bridge.call('call-1'), BargeInDetector())
+                async with aiohttp.ClientSession() as client:
+                    async with client.ws_connect(f'{bridge.url}/call-1') as ws:
+                        await ws.send_json({'type': 'hello', 'sample_rate': rate, 'encoding': 'pcm_s16le'})
+                        await ws.receive_json()
+                        for start in range(0, len(pcm), 320):
+                            await ws.send_bytes(b'\0' * 8 + pcm[start:start + 320].tobytes())
+                        await ws.send_json({'type': 'transcript', 'text': 'how much', 'final': False})
+                        await ws.send_json({'type': 'transcript', 'text': 'How much is it?', 'final': True})
+                        await asyncio.sleep(0.2)
+                await manager.shutdown()
+            return session
+
+        session = asyncio.run(scenario())
+        self.assertEqual(session.agent.heard, ['How much is it?'])
+        self.assertEqual(session.agent.media_player.volumes, [0.2, 1.0])
+
+
+class TestStartup(unittest.TestCase):
+    def test_cold_start_loads_no_heavy_library(self):
+        report = measure()
+        self.assertEqual(report['loaded'], [])
+        self.assertGreater(report['importtime_ms'], 0)
+        self.assertTrue(any(name == 'src.agents.sales_agent' for name, _, _, _ in report['modules']))
+
+    def test_default_construction_writes_nothing(self):
+        from src.agents.sales_agent import SalesAgent
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        try:
+            with mock.patch.dict(os.environ, {}, clear=False):
+                for name in ('MEMORY_DIR', 'EMBEDDING_CACHE_DIR'):
+                    os.environ.pop(name, None)
+                SalesAgent('call-1')
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(os.listdir(tmp.name), [])
+
+    def test_parse_importtime(self):
+        trace = ('import time: self [us] | cumulative | imported package\n'
+                 'import time:       120 |        120 |     json.decoder\n'
+                 'import time:       300 |        420 | json\n')
+        self.assertEqual(parse_importtime(trace), [('json.decoder', 120, 120, 2), ('json', 300, 420, 0)])
+
+    def test_player_module_imports_without_obs_settings(self):
+        env = {key: value for key, value in os.environ.items() if key not in ('OBS_SERVER_PWD', 'VIDEO_FOLDER')}
+        result = subprocess.run([sys.executable, '-c', 'import src.video.OBS_media_player_loop'],
+                                capture_output=True, text=True, env=env)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class TestSalesAgentWarmup(unittest.TestCase):
+    def test_warmup_then_streamed_answer(self):
+        from src.agents.sales_agent import SalesAgent
+
+        clips = []
+
+        async def scenario():
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            embeddings = FakeEmbeddings(dims=16)
+            llm = FakeChatModel(answers={'price': 'It is fifty dollars a month. That includes support.'})
+            async with FakeOBSWebSocketServer() as server:
+                client = AsyncOBSClient(port=server.port)
+                agent = SalesAgent('call-1', llm=llm, embeddings=embeddings, obs_client=client,
+                                   memory=MemoryService(embeddings, dims=16, directory=tmp.name))
+                agent.responder.render = lambda sentence: clips.append(sentence) or f'/clips/{len(clips)}.mp4'
+                timings = await agent.warmup()
+                created = 'VideoPlayer-call-1' in server.fake.inputs
+                await agent.handle_user_interruption('What is the price?')
+                await agent.close()
+                await client.close()
+            return agent, timings, created
+
+        agent, timings, created = asyncio.run(scenario())
+        self.assertEqual(set(timings), {'obs', 'workflow', 'classifier', 'embeddings', 'memory', 'total'})
+        self.assertTrue(created)
+        self.assertEqual(clips, ['It is fifty dollars a month.', 'That includes support.'])
+        self.assertEqual(agent.memory.records[-1].type, 'response')
+        self.assertEqual(agent.memory.records[-1].metadata['session_id'], 'call-1')
+
+    def test_calls_sharing_resources_keep_their_own_context_and_scene(self):
+        from src.agents.sales_agent import SalesAgent
+
+        async def scenario():
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            embeddings = FakeEmbeddings(dims=16)
+            memory = MemoryService(embeddings, dims=16, directory=tmp.name)
+            async with FakeOBSWebSocketServer() as server:
+                client = AsyncOBSClient(port=server.port)
+                first, second = (SalesAgent(call, llm=FakeChatModel(), embeddings=embeddings, obs_client=client,
+                                            memory=memory) for call in ('call-1', 'call-2'))
+                await client.connect()
+                await asyncio.gather(first.media_player.setup_media_source(), second.media_player.setup_media_source())
+                await first.add_memory('Is this secure?', 'interruption')
+                await second.add_memory('Is this secure for banks?', 'interruption')
+
+                builds = []
+                build_context = first._build_context
+                first._build_context = lambda query: builds.append(query) or build_context(query)
+                state = {'messages': [{'role': 'user', 'content': 'Is this secure?'}]}
+                await first._create_prompt(state)
+                await second.add_memory('How much is it?', 'interruption')
+                await first._create_prompt(state)
+                found = await first.search_memories('Is this secure for banks?')
+                recent = await first.get_recent_memories('interruption')
+                for agent in (first, second):
+                    await agent.close()
+                await client.close()
+            return server.fake, builds, found, recent
+
+        fake, builds, found, recent = asyncio.run(scenario())
+        self.assertEqual([r.content for r in found], ['Is this secure?'])
+        self.assertEqual([r.content for r in recent], ['Is this secure?'])
+        # Another call's write leaves this call's cached context in place
+        self.assertEqual(len(builds), 1)
+        self.assertEqual({name: fake.inputs[name].scene for name in fake.inputs}, {
+            'VideoPlayer-call-1': 'Scene-call-1', 'VideoPlayer-call-1-B': 'Scene-call-1',
+            'VideoPlayer-call-2': 'Scene-call-2', 'VideoPlayer-call-2-B': 'Scene-call-2'})
+
+    def test_answer_tokens_stream_from_the_real_graph(self):
+        from src.agents.sales_agent import SalesAgent
+
+        answer = 'It is fifty dollars a month. That includes support.'
+
+        async def scenario():
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            embeddings = FakeEmbeddings(dims=16)
+            llm = FakeChatModel(answers={'price': answer}, token_delay=0.02)
+            async with FakeOBSWebSocketServer() as server:
+                client = AsyncOBSClient(port=server.port)
+                agent = SalesAgent('call-1', llm=llm, embeddings=embeddings, obs_client=client,
+                                   memory=MemoryService(embeddings, dims=16, directory=tmp.name))
+                state = {'messages': [{'role': 'user', 'content': 'Interruption detected: What is the price?'}]}
+                start = time.perf_counter()
+                arrivals = []
+                async for token in agent._response_tokens(state):
+                    arrivals.append((time.perf_counter() - start, token))
+                await agent.close()
+                await client.close()
+            return arrivals
+
+        arrivals = asyncio.run(scenario())
+        tokens = [token for _, token in arrivals]
+        # One token per word from the agent subgraph's model, none of them tool calls or the prompt
+        self.assertEqual(len(tokens), len(answer.split(' ')))
+        self.assertEqual(''.join(tokens).strip(), answer)
+        # The first word surfaces while the rest are still being generated
+        self.assertLess(arrivals[0][0], arrivals[-1][0] - 0.1)
+
+    def test_pitch_cuts_to_a_transition_when_interrupted(self):
+        from src.agents.sales_agent import SalesAgent
+        from src.video.video_queue import TRANSITION_KEYS
+
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        for key in ('base1', 'base2') + TRANSITION_KEYS:
+            open(os.path.join(folder.name, f'{key}.mp4'), 'a').close()
+        started = []
+
+        async def scenario():
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            embeddings = FakeEmbeddings(dims=16)
+            async with FakeOBSWebSocketServer(FakeOBS(durations={'base1.mp4': 1.0})) as server:
+                client = AsyncOBSClient(port=server.port)
+                agent = SalesAgent('call-1', llm=FakeChatModel(), embeddings=embeddings, obs_client=client,
+                                   memory=MemoryService(embeddings, dims=16, directory=tmp.name))
+                agent.media_player.clip_listeners.append(lambda clip: started.append(os.path.basename(clip)))
+                await agent.start_sales_pitch(folder.name)
+                deadline = time.monotonic() + 5
+                while 'base1.mp4' not in started and time.monotonic() < deadline:
+                    await asyncio.sleep(0.01)
+                interrupt_type = agent.start_transition('how much is it')
+                while started.count('base1.mp4') < 2 and time.monotonic() < deadline:
+                    await asyncio.sleep(0.01)
+                await agent.media_player.stop()
+                await asyncio.gather(agent.playback_task, return_exceptions=True)
+                await agent.close()
+                await client.close()
+            return interrupt_type
+
+        self.assertEqual(asyncio.run(scenario()), 2)
+        # The pitch was cut for the type 2 transitions and then carried on with the interrupted clip
+        self.assertEqual(started[:4], ['base1.mp4', 'transition2.mp4', 'transition1.mp4', 'base1.mp4'])
+
+    def test_predicted_objection_plays_its_prerendered_answer_only(self):
+        from src.agents.sales_agent import SalesAgent
+
+        clips, enqueued = [], []
+        answer = 'We are SOC II and GDPR compliant.'
+        predictor = ObjectionPredictor.from_memories([
+            {'type': 'response', 'content': answer,
+             'metadata': {'interruption': 'Is this secure?', 'pitch_position': 'base5.mp4'}}])
+
+        async def scenario():
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            embeddings = FakeEmbeddings(dims=16)
+            async with FakeOBSWebSocketServer() as server:
+                client = AsyncOBSClient(port=server.port)
+                agent = SalesAgent('call-1', llm=FakeChatModel(), embeddings=embeddings, obs_client=client,
+                                   memory=MemoryService(embeddings, dims=16, directory=tmp.name))
+                agent.responder.render = lambda sentence: clips.append(sentence) or f'/clips/{len(clips)}.mp4'
+                agent.media_player.enqueue = enqueued.append
+                agent.speculator = SpeculativeRenderer(predictor, render=lambda text: '/cache/secure.mp4')
+                agent.speculator.prefetch('base5.mp4')
+                while not agent.speculator.report()['completed']:
+                    await asyncio.sleep(0.01)
+                await agent.handle_user_interruption('Is this secure?')
+                await agent.close()
+                await client.close()
+            return agent
+
+        agent = asyncio.run(scenario())
+        self.assertEqual(enqueued, ['/cache/secure.mp4'])
+        self.assertEqual(clips, [])
+        self.assertEqual(agent.memory.records[-1].content, answer)
+
+
+    def test_each_utterance_is_looked_up_once(self):
+        from src.agents.sales_agent import SalesAgent
+
+        tool_results = []
+
+        async def scenario():
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            embeddings = FakeEmbeddings(dims=16)
+            async with FakeOBSWebSocketServer() as server:
+                client = AsyncOBSClient(port=server.port)
+                agent = SalesAgent('call-1', llm=FakeChatModel(), embeddings=embeddings, obs_client=client,
+                                   memory=MemoryService(embeddings, dims=16, directory=tmp.name))
+                agent.responder.render = lambda sentence: '/clips/1.mp4'
+                agent.speculator = SpeculativeRenderer(ObjectionPredictor.from_memories([]), render=lambda text: None)
+
+                async def tokens_calling_the_tool(state):
+                    # As when the model picks the handle_interruption tool before answering
+                    tool_results.append(await agent.handle_interruption('Can I bring my team?'))
+                    yield 'Of course you can.'
+                agent._response_tokens = tokens_calling_the_tool
+                await agent.handle_user_interruption('Can I bring my team?')
+                await agent.close()
+                await client.close()
+            return agent.speculator.report()
+
+        report = asyncio.run(scenario())
+        self.assertEqual((report['hits'], report['misses']), (0, 1))
+        self.assertTrue(tool_results[0].startswith('No pre-rendered answer'))
+
+if __name__ == '__main__':
+    unittest.main()
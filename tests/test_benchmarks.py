@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks.latency import BenchmarkConfig, LatencyBenchmark, compare, load_baseline, save_baseline
+
+
+def report_with(**p50s):
+    return {'config': {}, 'metrics': {name: {'count': 10, 'p50': value, 'p95': value, 'p99': value}
+                                      for name, value in p50s.items()}}
+
+
+class TestBaselines(unittest.TestCase):
+    def test_regression_beyond_tolerance_and_slack(self):
+        baseline = {'tolerance': 0.5, 'slack_ms': 10, 'metrics': {'clip_gap_ms': {'p50': 20.0}}}
+        self.assertEqual(compare(report_with(clip_gap_ms=40.0), baseline), [])
+        regressions = compare(report_with(clip_gap_ms=41.0), baseline)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('clip_gap_ms p50', regressions[0])
+        self.assertEqual(compare(report_with(clip_gap_ms=41.0), baseline, tolerance=1.0), [])
+
+    def test_metrics_without_samples_are_not_compared(self):
+        baseline = {'metrics': {'cold_start_ms': {'p50': 500.0}}}
+        report = {'metrics': {'cold_start_ms': {'count': 0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}}}
+        self.assertEqual(compare(report, baseline), [])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baselines.json')
+            self.assertIsNone(load_baseline(path))
+            report = report_with(clip_gap_ms=3.14159, prompt_build_ms=0.0)
+            report['metrics']['prompt_build_ms']['count'] = 0
+            save_baseline(report, path)
+            baseline = load_baseline(path)
+        self.assertEqual(baseline['metrics'], {'clip_gap_ms': {'p50': 3.14, 'p95': 3.14, 'p99': 3.14}})
+
+    def test_stored_baseline_covers_every_metric(self):
+        baseline = load_baseline()
+        self.assertEqual(set(baseline['metrics']), {'interrupt_to_transition_ms', 'interrupt_to_answer_ms',
+                                                    'clip_gap_ms', 'prompt_build_ms', 'cold_start_ms'})
+
+
+class TestLatencyBenchmark(unittest.TestCase):
+    def test_scripted_call(self):
+        config = BenchmarkConfig(calls=2, interruptions=2, render_delay=0.05, token_delay=0.0,
+                                 base_duration=0.4, clip_duration=0.05, cold_starts=0)
+        cwd = os.getcwd()
+        report = asyncio.run(LatencyBenchmark(config).run())
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(report['failures'], [])
+        metrics = report['metrics']
+        self.assertEqual(metrics['interrupt_to_transition_ms']['count'], 4)
+        self.assertEqual(metrics['interrupt_to_answer_ms']['count'], 4)
+        self.assertGreater(metrics['clip_gap_ms']['count'], 0)
+        self.assertGreater(metrics['prompt_build_ms']['count'], 0)
+        self.assertEqual(metrics['cold_start_ms']['count'], 0)
+        # The transition starts before the answer can have rendered
+        self.assertLess(metrics['interrupt_to_transition_ms']['p99'], metrics['interrupt_to_answer_ms']['p50'])
+        json.dumps(report)
+
+
+if __name__ == '__main__':
+    unittest.main()
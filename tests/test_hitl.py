@@ -0,0 +1,156 @@
+import asyncio
+import tempfile
+import time
+import unittest
+
+from aiohttp import web
+
+from src.hitl.hitl_service import CallSummary, HITLService
+from src.integrations.email_service import EmailNotifier
+from src.integrations.sms_service import SMSNotifier
+from src.memory.memory_service import MemoryService
+from src.models.sentiment_analysis import Sentiment, SentimentEngine
+from tests.fakes.embeddings import FakeEmbeddings
+from tests.fakes.notifier import FakeNotifier
+
+
+def angry_model(texts):
+    return [Sentiment('negative', 0.99) if 'waste' in text else Sentiment('positive', 0.02) for text in texts]
+
+
+class TestHITLService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.memory = MemoryService(FakeEmbeddings(dims=16), dims=16, directory=self.tmp.name)
+
+    async def turn(self, text, interrupt_type, response=None):
+        await self.memory.add(text, 'interruption', {'pitch_position': 'base3.mp4', 'interrupt_type': interrupt_type})
+        if response:
+            await self.memory.add(response, 'response', {'interruption': text, 'handled': True})
+
+    def test_summary_is_kept_current_from_memories(self):
+        async def scenario():
+            await self.memory.add('Earlier call', 'session', {'video_folder': 'old'})
+            hitl = HITLService([])
+            summary = hitl.track('call-1', self.memory)
+            await self.memory.add('Started sales pitch', 'session', {'video_folder': 'src/assets/base'})
+            await self.turn('Is this secure?', 2, 'Yes, we are SOC II compliant.')
+            await self.turn('We already use a competitor', 3)
+            hitl.untrack('call-1')
+            await self.turn('ignored after untrack', 1)
+            return summary
+
+        text = asyncio.run(scenario()).text
+        self.assertIn('Pitch: src/assets/base', text)
+        self.assertIn('Stopped at: base3.mp4', text)
+        self.assertIn('Interruptions: 2 (1 questions, 1 objections)', text)
+        self.assertIn('Prospect: "Is this secure?"\nAgent: "Yes, we are SOC II compliant."', text)
+        self.assertIn('Unanswered: "We already use a competitor"', text)
+        self.assertNotIn('ignored', text)
+
+    def test_long_exchanges_are_quoted_briefly(self):
+        summary = CallSummary('call-1')
+        for i in range(5):
+            summary.exchanges.append((f'question {i}', 'answer ' * 100))
+        text = summary.render()
+        self.assertNotIn('question 0', text)
+        self.assertTrue(all(len(line) < 200 for line in text.splitlines()))
+
+    def test_request_for_a_person_escalates_with_summary(self):
+        notifier = FakeNotifier(delay=0.01)
+
+        async def scenario():
+            hitl = HITLService([notifier, FakeNotifier('pager', fail=True)])
+            hitl.track('call-1', self.memory)
+            await self.turn('How much is it?', 2, 'It starts at fifty dollars a month.')
+            triggered = time.time()
+            await self.turn('Stop, let me talk to a real person', 4)
+            await hitl.drain()
+            # A second request inside the cooldown does not notify again
+            await self.turn('Hello? A person please', 4)
+            await hitl.drain()
+            return hitl, triggered
+
+        hitl, triggered = asyncio.run(scenario())
+        self.assertEqual(len(notifier.sent), 1)
+        escalation, delivered_at = notifier.sent[0]
+        self.assertIn('asked to stop or to speak to a person', escalation.reason)
+        self.assertIn('It starts at fifty dollars a month.', escalation.summary)
+        self.assertIn('Unanswered: "Stop, let me talk to a real person"', escalation.summary)
+        self.assertLess(delivered_at - triggered, 0.5)
+        self.assertEqual(escalation.delivered, ['fake'])
+        self.assertIn('pager', escalation.errors)
+        self.assertEqual(hitl.notify_latency.count, 1)
+        self.assertGreaterEqual(escalation.latency_ms, 10)
+
+    def test_sustained_frustration_escalates(self):
+        notifier = FakeNotifier()
+
+        async def scenario():
+            sentiment = SentimentEngine(angry_model, max_delay=0.001)
+            hitl = HITLService([notifier], sentiment=sentiment)
+            hitl.track('call-1', self.memory)
+            await self.turn('This is a waste of my time', 3)
+            await hitl.drain()
+            sent_after_one = len(notifier.sent)
+            for _ in range(3):
+                await self.turn('Honestly a waste', 3)
+                await hitl.drain()
+            await sentiment.shutdown()
+            return sent_after_one
+
+        self.assertEqual(asyncio.run(scenario()), 0)
+        self.assertEqual(len(notifier.sent), 1)
+        self.assertIn('Prospect frustration at', notifier.sent[0][0].reason)
+        self.assertIn('Frustration: 6', notifier.sent[0][0].summary)
+
+
+class TestNotifiers(unittest.TestCase):
+    def test_sms_posts_to_twilio(self):
+        received = []
+
+        async def messages(request):
+            received.append((request.match_info['sid'], dict(await request.post()), request.headers['Authorization']))
+            return web.json_response({'sid': 'SM1'}, status=201)
+
+        async def scenario():
+            app = web.Application()
+            app.router.add_post('/2010-04-01/Accounts/{sid}/Messages.json', messages)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            notifier = SMSNotifier(['+15550001', '+15550002'], '+15559999', 'AC123', 'token',
+                                   api_url=f'http://127.0.0.1:{port}')
+            hitl = HITLService([notifier])
+            try:
+                return await hitl.escalate('call-1', 'Prospect asked for a person')
+            finally:
+                await notifier.close()
+                await runner.cleanup()
+
+        escalation = asyncio.run(scenario())
+        self.assertEqual(escalation.delivered, ['sms'])
+        self.assertEqual([form['To'] for _, form, _ in received], ['+15550001', '+15550002'])
+        self.assertTrue(received[0][1]['Body'].startswith('Escalation at'))
+        self.assertEqual(received[0][0], 'AC123')
+        self.assertTrue(received[0][2].startswith('Basic '))
+
+    def test_email_message(self):
+        notifier = EmailNotifier(['ae@example.com'], 'agent@example.com', host='localhost')
+        hitl = HITLService([])
+        escalation = asyncio.run(hitl.escalate('call-1', 'Prospect asked for a person'))
+        message = notifier._message(escalation)
+        self.assertEqual(message['To'], 'ae@example.com')
+        self.assertIn('call-1', message['Subject'])
+        self.assertIn('Call call-1', message.get_content())
+
+    def test_missing_configuration(self):
+        with self.assertRaises(ValueError):
+            SMSNotifier(['+15550001'], account_sid='', auth_token='')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import unittest
+import wave
+
+import numpy as np
+
+from src.interrupt.barge_in import BargeInDetector
+from src.interrupt.classifier import InterruptClassifier, benchmark, load_cases
+from src.interrupt.interrupt_service import handle_interruption
+from src.interrupt.speculative import ObjectionPredictor, SpeculativeRenderer
+from src.transcription.transcription_service import file_frames
+from src.video.obs_async import DUCK_VOLUME, AsyncMediaPlayer, AsyncOBSClient
+from tests.fakes.obs import FakeOBS
+from tests.fakes.obs_server import FakeOBSWebSocketServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def history():
+    return [
+        {'type': 'response', 'content': 'We are SOC II and GDPR compliant.',
+         'metadata': {'interruption': 'Is this secure?', 'pitch_position': 'base5.mp4'}},
+        {'type': 'response', 'content': 'We are SOC II and GDPR compliant.',
+         'metadata': {'interruption': 'Is this secure?', 'pitch_position': 'base5.mp4'}},
+        {'type': 'response', 'content': 'Pricing depends on seats.',
+         'metadata': {'interruption': 'How much does it cost?', 'pitch_position': 'base5.mp4'}},
+        {'type': 'response', 'content': 'It sounds just like our reps.',
+         'metadata': {'interruption': 'Will it sound robotic?', 'pitch_position': 'base2.mp4'}},
+        {'type': 'interruption', 'content': 'Is this secure?', 'metadata': {}},
+    ]
+
+
+class RecordingRender:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.rendered = []
+        self.lock = threading.Lock()
+
+    def __call__(self, text):
+        time.sleep(self.delay)
+        with self.lock:
+            self.rendered.append(text)
+            return f'/cache/{len(self.rendered)}.mp4'
+
+
+class TestObjectionPredictor(unittest.TestCase):
+    def test_ranks_objections_raised_at_this_position_first(self):
+        predictor = ObjectionPredictor.from_memories(history())
+        ranked = predictor.rank('base5.mp4')
+        self.assertEqual([p.objection for p in ranked[:2]], ['Is this secure?', 'How much does it cost?'])
+        self.assertEqual(predictor.rank('base2.mp4')[0].objection, 'Will it sound robotic?')
+
+    def test_unseen_position_falls_back_to_overall_frequency(self):
+        predictor = ObjectionPredictor.from_memories(history())
+        self.assertEqual(predictor.rank('base1.mp4', limit=1)[0].objection, 'Is this secure?')
+
+    def test_matches_reworded_objection(self):
+        predictor = ObjectionPredictor.from_memories(history())
+        self.assertEqual(predictor.match('how much does it cost'), predictor.match('How much does it cost?'))
+        self.assertIsNone(predictor.match('Can I bring my team?'))
+
+
+class TestSpeculativeRenderer(unittest.TestCase):
+    def wait_for(self, speculator, count):
+        deadline = time.monotonic() + 2
+        while speculator.report()['completed'] < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_prefetch_renders_top_answers_for_position(self):
+        render = RecordingRender()
+        speculator = SpeculativeRenderer(ObjectionPredictor.from_memories(history()), render, per_position=2)
+        speculator.prefetch('base5.mp4')
+        self.wait_for(speculator, 2)
+        self.assertEqual(sorted(render.rendered), ['Pricing depends on seats.', 'We are SOC II and GDPR compliant.'])
+
+    def test_budget_caps_total_renders(self):
+        render = RecordingRender()
+        speculator = SpeculativeRenderer(ObjectionPredictor.from_memories(history()), render, budget=2, per_position=2)
+        speculator.prefetch('base5.mp4')
+        speculator.prefetch('base2.mp4')
+        self.wait_for(speculator, 2)
+        self.assertEqual(len(render.rendered), 2)
+        self.assertEqual(speculator.report()['renders'], 2)
+
+    def test_hit_rate_and_waste_report(self):
+        speculator = SpeculativeRenderer(ObjectionPredictor.from_memories(history()), RecordingRender(), per_position=2)
+        speculator.prefetch('base5.mp4')
+        self.wait_for(speculator, 2)
+
+        self.assertIsNotNone(speculator.lookup('Is this secure?'))
+        self.assertIsNone(speculator.lookup('Can I bring my team?'))
+        report = speculator.report()
+        self.assertEqual((report['hits'], report['misses'], report['wasted']), (1, 1, 1))
+        self.assertEqual(report['hit_rate'], 0.5)
+
+    def test_in_flight_render_is_a_miss(self):
+        speculator = SpeculativeRenderer(ObjectionPredictor.from_memories(history()), RecordingRender(delay=0.5))
+        speculator.prefetch('base5.mp4')
+        self.assertIsNone(speculator.lookup('Is this secure?'))
+        speculator.shutdown()
+
+    def test_renders_cancelled_by_shutdown_are_misses(self):
+        speculator = SpeculativeRenderer(ObjectionPredictor.from_memories(history()), RecordingRender(delay=0.2),
+                                         per_position=2, max_workers=1)
+        speculator.prefetch('base5.mp4')
+        speculator.shutdown()
+        self.assertIsNone(speculator.lookup('How much does it cost?'))
+        self.assertEqual(speculator.report()['completed'], 0)
+
+
+class TestHandleInterruption(unittest.TestCase):
+    def test_plays_prerendered_answer(self):
+        speculator = SpeculativeRenderer(ObjectionPredictor.from_memories(history()), RecordingRender())
+        speculator.prefetch('base5.mp4')
+        TestSpeculativeRenderer.wait_for(self, speculator, 2)
+        played = []
+
+        answer_path = speculator.lookup('Is this secure?')
+        result = asyncio.run(handle_interruption('Is this secure?', answer_path, play=played.append))
+        self.assertTrue(result.startswith('Playing pre-rendered answer'))
+        self.assertEqual(played, [answer_path])
+
+    def test_falls_through_without_prediction(self):
+        played = []
+        result = asyncio.run(handle_interruption('Can I bring my team?', None, play=played.append))
+        self.assertTrue(result.startswith('No pre-rendered answer for: Can I bring my team?'))
+        self.assertEqual(played, [])
+
+
+class TestInterruptClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.classifier = InterruptClassifier.load()
+
+    def test_classifies_each_interrupt_type(self):
+        self.assertEqual(self.classifier.classify('ok sounds good').interrupt_type, 1)
+        self.assertEqual(self.classifier.classify('how much does this cost?').interrupt_type, 2)
+        self.assertEqual(self.classifier.classify("We already have a tool for that").interrupt_type, 3)
+        self.assertEqual(self.classifier.classify("I'm not interested, goodbye").interrupt_type, 4)
+
+    def test_escalates_unfamiliar_text(self):
+        result = self.classifier.classify('our warehouse in Rotterdam ships pallets overnight')
+        self.assertTrue(result.escalate)
+        self.assertIsNone(result.interrupt_type)
+
+    def test_fixture_benchmark(self):
+        cases = load_cases(os.path.join(os.path.dirname(__file__), 'fixtures', 'interrupt_cases.jsonl'))
+        report = benchmark(self.classifier, cases, repeat=5)
+        self.assertEqual(report['cases'], len(cases))
+        self.assertGreaterEqual(report['accuracy'], 0.9, report['errors'])
+        self.assertLess(report['latency_ms']['p95'], 10)
+
+
+class TestBargeInDetector(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        with open(os.path.join(FIXTURE_DIR, 'audio_fixtures.json')) as f:
+            self.labels = json.load(f)
+
+    async def detect(self, name, **kwargs):
+        detector = BargeInDetector(**kwargs)
+        return [e async for e in detector.run(file_frames(os.path.join(FIXTURE_DIR, name)))]
+
+    async def test_detects_each_labelled_onset_within_150ms(self):
+        for name, onsets in self.labels.items():
+            with self.subTest(fixture=name):
+                starts = [e for e in await self.detect(name) if e.kind == 'start']
+                self.assertEqual(len(starts), len(onsets))
+                for event, onset in zip(starts, onsets):
+                    self.assertGreaterEqual(event.detected_time, onset)
+                    self.assertLessEqual(event.detected_time - onset, 0.15)
+
+    async def test_speech_end_uses_hysteresis(self):
+        events = await self.detect('barge_in_speech.wav')
+        self.assertEqual([e.kind for e in events], ['start', 'end', 'start', 'end'])
+        # Syllable dips inside an utterance do not end it
+        self.assertGreater(events[1].audio_time - events[0].audio_time, 0.9)
+
+    def test_chunk_size_does_not_change_events(self):
+        with wave.open(os.path.join(FIXTURE_DIR, 'barge_in_speech.wav')) as f:
+            samples = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2').astype(np.float32) / 32768
+        whole = [(e.kind, e.audio_time) for e in BargeInDetector().process(samples)]
+        detector = BargeInDetector()
+        chunked = [(e.kind, e.audio_time) for i in range(0, len(samples), 333) for e in detector.process(samples[i:i + 333])]
+        self.assertEqual(whole, chunked)
+        self.assertLess(detector.processing_latency.percentile(95), 5)
+
+    async def test_ducks_playing_clip_within_150ms_of_speech(self):
+        fake = FakeOBS()
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                await player.setup_media_source()
+                ducked = []
+
+                async def duck(event):
+                    await player.duck()
+                    ducked.append(event.detected_time - self.labels['barge_in_speech.wav'][0]
+                                  + time.perf_counter() - event.detected_at)
+
+                detector = BargeInDetector(on_start=duck)
+                frames = file_frames(os.path.join(FIXTURE_DIR, 'barge_in_speech.wav'), realtime=True)
+                async for event in detector.run(frames):
+                    if event.kind == 'start':
+                        break
+                await asyncio.sleep(0.05)
+
+        self.assertEqual(fake.inputs[player.source_name].volume, DUCK_VOLUME)
+        self.assertLess(ducked[0], 0.15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,261 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+from langgraph.store.memory import InMemoryStore
+
+from src.memory.embeddings import CachedEmbeddings, DiskVectorStore, text_key
+from src.memory.memory_service import IVFIndex, MemoryService
+from tests.fakes.embeddings import FakeEmbeddings
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fake = FakeEmbeddings(dims=16)
+
+    def cached(self, **kwargs):
+        kwargs.setdefault('cache_dir', self.tmp.name)
+        return CachedEmbeddings(self.fake, dims=16, **kwargs)
+
+    def test_repeated_text_is_embedded_once(self):
+        embeddings = self.cached()
+        first = embeddings.embed_query('Is this secure?')
+        second = embeddings.embed_documents(['Is this secure?', 'Is this secure?'])
+        self.assertEqual(len(self.fake.calls), 1)
+        np.testing.assert_allclose(second[0], first, rtol=1e-6)
+        np.testing.assert_allclose(first, self.fake.vector('Is this secure?'), rtol=1e-6)
+        self.assertEqual(embeddings.stats()['hits'], 1)
+
+    def test_matrix_is_contiguous_float32(self):
+        matrix = self.cached().embed_matrix(['a', 'b', 'a'])
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertEqual(matrix.shape, (3, 16))
+        self.assertTrue(matrix.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_equal(matrix[0], matrix[2])
+
+    def test_concurrent_requests_are_batched(self):
+        embeddings = self.cached()
+
+        async def run():
+            return await asyncio.gather(*(embeddings.aembed_query(f'objection {i % 5}') for i in range(20)))
+
+        vectors = asyncio.run(run())
+        self.assertEqual(len(self.fake.calls), 1)
+        self.assertEqual(sorted(self.fake.calls[0]), [f'objection {i}' for i in range(5)])
+        self.assertEqual(vectors[0], vectors[5])
+
+    def test_batches_are_capped(self):
+        embeddings = self.cached(max_batch_size=4)
+
+        async def run():
+            await asyncio.gather(*(embeddings.aembed_query(str(i)) for i in range(10)))
+
+        asyncio.run(run())
+        self.assertEqual([len(call) for call in self.fake.calls], [4, 4, 2])
+
+    def test_lru_evicts_least_recently_used(self):
+        embeddings = self.cached(cache_dir='', max_entries=2)
+        embeddings.embed_query('a')
+        embeddings.embed_query('b')
+        embeddings.embed_query('a')
+        embeddings.embed_query('c')  # evicts b
+        embeddings.embed_query('a')
+        embeddings.embed_query('b')
+        self.assertEqual(self.fake.calls, [['a'], ['b'], ['c'], ['b']])
+
+    def test_vectors_survive_restart(self):
+        self.cached().embed_documents(['a', 'b'])
+        restarted = self.cached()
+        vector = restarted.embed_query('b')
+        self.assertEqual(len(self.fake.calls), 1)
+        self.assertEqual(restarted.stats()['disk_hits'], 1)
+        np.testing.assert_allclose(vector, self.fake.vector('b'), rtol=1e-6)
+
+    def test_disk_store_keeps_the_most_recently_used(self):
+        path = os.path.join(self.tmp.name, 'bounded.f32')
+        store = DiskVectorStore(path, 16, max_entries=4)
+        keys = [text_key(str(i)) for i in range(6)]
+        vectors = np.arange(6 * 16, dtype=np.float32).reshape(6, 16)
+        store.put_many(keys[:4], vectors[:4])
+        store.get(keys[0])  # now the most recent
+        store.put_many(keys[4:], vectors[4:])
+
+        # Compacted to three quarters of the cap, keeping the newest and the one just read
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.evictions, 3)
+        self.assertEqual(os.path.getsize(path), 3 * store.record.itemsize)
+        restarted = DiskVectorStore(path, 16, max_entries=4)
+        for i in (0, 4, 5):
+            np.testing.assert_array_equal(restarted.get(keys[i]), vectors[i])
+        self.assertIsNone(restarted.get(keys[1]))
+
+    def test_torn_record_is_dropped(self):
+        embeddings = self.cached()
+        embeddings.embed_documents(['a', 'b'])
+        with open(embeddings.disk.path, 'ab') as f:
+            f.write(b'partial')
+        restarted = self.cached()
+        self.assertEqual(len(restarted.disk), 2)
+        restarted.embed_query('c')
+        self.assertEqual(len(self.cached().disk), 3)
+
+    def test_backs_langgraph_store_search(self):
+        store = InMemoryStore(index={'dims': 16, 'embed': self.cached(), 'fields': ['text']})
+        store.put(('memories',), '1', {'text': 'We are SOC II compliant'})
+        store.put(('memories',), '2', {'text': 'Pricing depends on seats'})
+        results = store.search(('memories',), query='Pricing depends on seats')
+        self.assertEqual(results[0].key, '2')
+
+
+class TestMemoryService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fake = FakeEmbeddings(dims=16)
+
+    def service(self, **kwargs):
+        return MemoryService(self.fake, dims=16, directory=self.tmp.name, **kwargs)
+
+    def populate(self, service):
+        async def run():
+            await service.add('Started sales pitch', 'session')
+            await service.add('Is this secure?', 'interruption', {'pitch_position': 'base5.mp4'})
+            await service.add('We are SOC II compliant', 'response', {'interruption': 'Is this secure?'})
+            await service.add('How much does it cost?', 'interruption')
+        asyncio.run(run())
+
+    def test_search_ranks_by_similarity(self):
+        service = self.service()
+        self.populate(service)
+        results = asyncio.run(service.search('Is this secure?', k=2))
+        self.assertEqual(results[0].content, 'Is this secure?')
+        self.assertAlmostEqual(results[0].score, 1.0, places=5)
+        self.assertEqual(len(results), 2)
+
+    def test_filtered_search_uses_type(self):
+        service = self.service()
+        self.populate(service)
+        results = asyncio.run(service.search('Is this secure?', k=5, memory_type='interruption'))
+        self.assertEqual({r.type for r in results}, {'interruption'})
+        self.assertEqual(len(results), 2)
+        self.assertEqual(asyncio.run(service.search('anything', memory_type='unknown')), [])
+
+    def test_restart_maps_existing_store(self):
+        self.populate(self.service())
+        restarted = self.service()
+        self.assertEqual(len(restarted), 4)
+        self.assertIsInstance(restarted.vectors, np.memmap)
+        self.assertEqual(restarted.by_type('response')[0].metadata, {'interruption': 'Is this secure?'})
+        results = restarted.search_vector(np.array(self.fake.vector('How much does it cost?')), k=1)
+        self.assertEqual(results[0].content, 'How much does it cost?')
+        self.assertEqual(len(self.fake.calls), 4)  # Nothing re-embedded
+
+    def test_recovers_from_partial_write(self):
+        service = self.service()
+        self.populate(service)
+        with open(service.vectors_path, 'ab') as f:
+            f.write(b'\0' * 20)
+        with open(service.records_path, 'a') as f:
+            f.write('{"id": 4, "type"')
+        restarted = self.service()
+        self.assertEqual(len(restarted), 4)
+        asyncio.run(restarted.add('Another objection', 'interruption'))
+        self.assertEqual(len(self.service()), 5)
+
+    def test_recent_by_type_newest_first(self):
+        service = self.service()
+        self.populate(service)
+        version = service.version
+        self.assertEqual([r.content for r in service.recent('interruption', limit=5)],
+                         ['How much does it cost?', 'Is this secure?'])
+        self.assertEqual(service.recent(limit=1)[0].content, 'How much does it cost?')
+        self.assertEqual(service.recent('unknown'), [])
+
+        asyncio.run(service.add('Too expensive', 'interruption'))
+        self.assertEqual(service.version, version + 1)
+        self.assertEqual(service.recent('interruption', limit=1)[0].content, 'Too expensive')
+        self.assertEqual(self.service().recent('interruption', limit=1)[0].content, 'Too expensive')
+
+    def test_search_and_recent_by_session(self):
+        service = self.service()
+
+        async def run():
+            await service.add('Is this secure?', 'interruption', {'session_id': 'call-1'})
+            await service.add('Is this secure for banks?', 'interruption', {'session_id': 'call-2'})
+            await service.add('We are SOC II compliant', 'response', {'session_id': 'call-1'})
+            return await service.search('Is this secure for banks?', k=5, memory_type='interruption',
+                                        session_id='call-1')
+        results = asyncio.run(run())
+        self.assertEqual([r.content for r in results], ['Is this secure?'])
+        self.assertEqual([r.content for r in service.recent(session_id='call-2')], ['Is this secure for banks?'])
+        self.assertEqual((service.session_version('call-1'), service.session_version('call-2')), (2, 1))
+        restarted = self.service()
+        self.assertEqual(len(restarted.search_vector(np.ones(16), k=5, session_id='call-1')), 2)
+        self.assertEqual(restarted.search_vector(np.ones(16), k=5, session_id='call-3'), [])
+
+    def test_ivf_index_above_threshold(self):
+        rng = np.random.default_rng(1)
+        vectors = rng.standard_normal((400, 16)).astype(np.float32)
+        service = self.service(ivf_threshold=300, ivf_probes=4)
+        service.add_vectors(vectors[:200], [str(i) for i in range(200)], 'response')
+        self.assertIsNone(service.ivf)
+        service.add_vectors(vectors[200:], [str(i) for i in range(200, 400)], 'interruption')
+        service.wait_for_index()
+        self.assertIsNotNone(service.ivf)
+
+        # Queries near stored rows find them through the partitions
+        for row in (5, 250, 399):
+            query = vectors[row] + 0.01 * rng.standard_normal(16).astype(np.float32)
+            self.assertEqual(service.search_vector(query, k=1)[0].id, row)
+        self.assertEqual(service.search_vector(vectors[250], k=1, memory_type='interruption')[0].id, 250)
+
+        restarted = self.service(ivf_threshold=300, ivf_probes=4)
+        np.testing.assert_array_equal(restarted.ivf.centroids, service.ivf.centroids)
+        self.assertEqual(restarted.search_vector(vectors[42], k=1)[0].id, 42)
+
+    def test_rare_type_above_threshold_returns_k(self):
+        rng = np.random.default_rng(2)
+        vectors = rng.standard_normal((405, 16)).astype(np.float32)
+        service = self.service(ivf_threshold=300, ivf_probes=1)
+        service.add_vectors(vectors[:400], [str(i) for i in range(400)], 'response')
+        service.add_vectors(vectors[400:], [str(i) for i in range(400, 405)], 'session')
+        service.wait_for_index()
+        self.assertIsNotNone(service.ivf)
+        results = service.search_vector(vectors[0], k=5, memory_type='session')
+        self.assertEqual(sorted(r.id for r in results), list(range(400, 405)))
+
+    def test_add_does_not_wait_for_the_index_build(self):
+        release = threading.Event()
+        build = IVFIndex.build
+
+        def slow_build(vectors):
+            release.wait(5)
+            return build(vectors)
+
+        service = self.service(ivf_threshold=300)
+        loop_threads = []
+        service.listeners.append(lambda records: loop_threads.append(asyncio.get_running_loop()))
+
+        async def run():
+            await service.add_many([str(i) for i in range(300)], 'response')
+
+        with mock.patch.object(IVFIndex, 'build', side_effect=slow_build):
+            asyncio.run(run())
+            # Stored, searchable and announced on the event loop while k-means is still running
+            self.assertIsNone(service.ivf)
+            self.assertEqual(len(loop_threads), 1)
+            self.assertEqual(service.search_vector(self.fake.vector('7'), k=1)[0].content, '7')
+            release.set()
+            service.wait_for_index()
+        self.assertIsNotNone(service.ivf)
+        self.assertEqual(service.search_vector(self.fake.vector('7'), k=1)[0].content, '7')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import sys
+import time
+import unittest
+
+from src.models.sentiment_analysis import Sentiment, SentimentEngine, TransformersSentimentModel
+
+NEGATIVE_WORDS = {'waste', 'annoying', 'stop', 'no'}
+
+
+class KeywordModel:
+    """Scores texts by negative keywords, recording each batch"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        results = []
+        for text in texts:
+            negative = 0.95 if NEGATIVE_WORDS & set(text.lower().replace(',', '').split()) else 0.05
+            results.append(Sentiment('negative' if negative >= 0.5 else 'positive', negative))
+        return results
+
+
+class TestSentimentEngine(unittest.TestCase):
+    def setUp(self):
+        self.model = KeywordModel(delay=0.01)
+        self.engine = SentimentEngine(self.model, max_batch_size=8, max_delay=0.02)
+
+    def run_async(self, coroutine):
+        async def run():
+            try:
+                return await coroutine
+            finally:
+                await self.engine.shutdown()
+        return asyncio.run(run())
+
+    def test_concurrent_calls_share_batches(self):
+        texts = [f'caller {i} says this is a waste' if i % 2 else f'caller {i} sounds great' for i in range(20)]
+
+        async def scenario():
+            return await asyncio.gather(*(self.engine.analyze(text, f'call-{i}') for i, text in enumerate(texts)))
+
+        results = self.run_async(scenario())
+        self.assertEqual([r.label for r in results], ['positive', 'negative'] * 10)
+        self.assertEqual([len(batch) for batch in self.model.batches], [8, 8, 4])
+        self.assertEqual(len(self.engine.calls), 20)
+
+    def test_lone_utterance_waits_at_most_the_deadline(self):
+        async def scenario():
+            start_time = time.perf_counter()
+            await self.engine.analyze('sounds good')
+            return time.perf_counter() - start_time
+
+        self.assertLess(self.run_async(scenario()), 0.02 + 0.01 + 0.05)
+        self.assertEqual(self.model.batches, [['sounds good']])
+
+    def test_repeated_phrases_are_cached(self):
+        async def scenario():
+            await self.engine.analyze('No thanks.')
+            await asyncio.gather(self.engine.analyze('no thanks'), self.engine.analyze('  NO   thanks!'))
+            # Identical utterances in flight together are scored once
+            await asyncio.gather(self.engine.analyze('maybe later'), self.engine.analyze('Maybe later'))
+
+        self.run_async(scenario())
+        self.assertEqual(self.model.batches, [['No thanks.'], ['maybe later']])
+        self.assertEqual(self.engine.hits, 2)
+
+    def test_frustration_is_smoothed_per_call(self):
+        async def scenario():
+            await self.engine.analyze('this is annoying', 'angry')
+            after_one = self.engine.frustration('angry')
+            for _ in range(5):
+                await self.engine.analyze('stop calling me, this is a waste', 'angry')
+                await self.engine.analyze('that sounds interesting', 'happy')
+            return after_one
+
+        after_one = self.run_async(scenario())
+        self.assertFalse(after_one >= self.engine.threshold)
+        self.assertTrue(self.engine.frustrated('angry'))
+        self.assertFalse(self.engine.frustrated('happy'))
+        self.assertEqual(self.engine.end_call('angry').utterances, 6)
+        self.assertEqual(self.engine.frustration('angry'), 0.0)
+
+    def test_model_errors_reach_every_waiting_caller(self):
+        def broken(texts):
+            raise RuntimeError('model failed')
+
+        self.engine = SentimentEngine(broken, max_delay=0.01)
+
+        async def scenario():
+            return await asyncio.gather(self.engine.analyze('a'), self.engine.analyze('b'), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in self.run_async(scenario())))
+
+    def test_transformers_load_lazily(self):
+        TransformersSentimentModel()
+        self.assertNotIn('transformers', sys.modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
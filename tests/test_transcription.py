@@ -0,0 +1,240 @@
+import asyncio
+import os
+import struct
+import tempfile
+import time
+import unittest
+import wave
+
+import aiohttp
+import numpy as np
+
+from src.interrupt.barge_in import BargeInDetector
+from src.transcription.audio_bridge import AudioBridge
+
+from src.transcription.transcription_service import (SAMPLE_RATE, EnergyVAD, TranscriptionService,
+                                                     file_frames)
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds, noise=0.001):
+    return (noise * np.random.default_rng(0).standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+def write_wav(path, samples):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((samples * 32767).astype('<i2').tobytes())
+
+
+class LengthTranscriber:
+    """Transcribes audio as the number of tenths of a second of it"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, audio):
+        self.calls.append(len(audio))
+        return f'{len(audio) * 10 // SAMPLE_RATE} tenths'
+
+
+class TestEnergyVAD(unittest.TestCase):
+    def frames(self, samples):
+        return [samples[i:i + 480] for i in range(0, len(samples), 480)]
+
+    def test_onset_and_hangover(self):
+        vad = EnergyVAD(onset_frames=3, hangover_frames=5)
+        states = [vad.update(f) for f in self.frames(np.concatenate([silence(0.3), tone(0.3), silence(0.3)]))]
+        onset, end = states.index(True), len(states) - states[::-1].index(True)
+        self.assertEqual(onset, 10 + 2)  # Third loud frame
+        self.assertEqual(end, 20 + 4)  # Fifth quiet frame ends it
+
+    def test_short_click_is_not_speech(self):
+        vad = EnergyVAD(onset_frames=3)
+        states = [vad.update(f) for f in self.frames(np.concatenate([silence(0.3), tone(0.06), silence(0.3)]))]
+        self.assertFalse(any(states))
+
+
+class TestTranscriptionService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def transcribe(self, samples, suffix='.wav', realtime=False, **kwargs):
+        path = os.path.join(self.tmp.name, 'audio' + suffix)
+        if suffix == '.wav':
+            write_wav(path, samples)
+        else:
+            (samples * 32767).astype('<i2').tofile(path)
+        service = TranscriptionService(LengthTranscriber(), **kwargs)
+
+        async def run():
+            return [t async for t in service.stream(file_frames(path, realtime=realtime))]
+
+        transcripts = asyncio.run(run())
+        service.shutdown()
+        return service, transcripts
+
+    def test_partials_then_final_per_utterance(self):
+        audio = np.concatenate([silence(0.3), tone(1.2), silence(0.8), tone(0.9), silence(0.6)])
+        service, transcripts = self.transcribe(audio, realtime=True, partial_interval=0.3)
+
+        finals = [t for t in transcripts if t.is_final]
+        self.assertEqual([t.utterance for t in finals], [1, 2])
+        partials = [t for t in transcripts if not t.is_final and t.utterance == 1]
+        self.assertGreaterEqual(len(partials), 2)
+        self.assertLess(transcripts.index(partials[0]), transcripts.index(finals[0]))
+
+        # Final covers the whole utterance plus preroll and hangover
+        self.assertAlmostEqual(finals[0].audio_start, 0.3, delta=0.15)
+        self.assertGreaterEqual(int(finals[0].text.split()[0]), 12)
+        self.assertEqual(service.partial_latency.count, 2)
+        self.assertLess(service.partial_latency.percentile(50), 600)
+
+    def test_silence_is_never_transcribed(self):
+        service, transcripts = self.transcribe(silence(1.0))
+        self.assertEqual(transcripts, [])
+        self.assertEqual(service.transcriber.calls, [])
+
+    def test_raw_pcm_and_stream_ending_mid_utterance(self):
+        _, transcripts = self.transcribe(np.concatenate([silence(0.2), tone(0.6)]), suffix='.pcm')
+        self.assertTrue(transcripts[-1].is_final)
+        self.assertEqual(transcripts[-1].utterance, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+def pcm_message(samples, captured_at=None):
+    return struct.pack('<d', captured_at or time.time() * 1000) + (samples * 32767).astype('<i2').tobytes()
+
+
+class TestAudioBridge(unittest.TestCase):
+    def run_with_client(self, scenario, call_id='call-1', ring_size=64):
+        async def run():
+            async with AudioBridge(port=0, ring_size=ring_size) as bridge:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(f'{bridge.url}/{call_id}') as ws:
+                        result = await scenario(bridge, bridge.call(call_id), ws)
+                        # Release a handler still blocked on a full subscriber
+                        await bridge.call(call_id).close()
+                        return result
+        return asyncio.run(run())
+
+    async def hello(self, ws, **fields):
+        await ws.send_json({'type': 'hello', 'sample_rate': SAMPLE_RATE, 'encoding': 'pcm_s16le', **fields})
+        return await ws.receive_json()
+
+    def test_frames_are_decoded_stamped_and_fanned_out(self):
+        audio = tone(0.1)
+
+        async def scenario(bridge, call, ws):
+            first, second = call.frames(), call.frames()
+            self.assertEqual((await self.hello(ws))['type'], 'ready')
+            for start in range(0, len(audio), 320):
+                await ws.send_bytes(pcm_message(audio[start:start + 320], captured_at=1000.0 + start))
+            received = []
+            for _ in range(5):
+                frame = await first.__anext__()
+                received.append((frame.seq, frame.stream_time, frame.captured_at, frame.samples.copy()))
+                self.assertEqual((await second.__anext__()).seq, frame.seq)
+            return received
+
+        received = self.run_with_client(scenario)
+        self.assertEqual([r[0] for r in received], [0, 1, 2, 3, 4])
+        self.assertEqual([r[1] for r in received], [0.0, 0.02, 0.04, 0.06, 0.08])
+        self.assertEqual(received[1][2], 1320.0)
+        np.testing.assert_allclose(np.concatenate([r[3] for r in received]), audio, atol=1 / 16000)
+
+    def test_ring_buffers_are_reused(self):
+        async def scenario(bridge, call, ws):
+            frames = call.frames(maxsize=10)
+            await self.hello(ws)
+            for _ in range(3):
+                await ws.send_bytes(pcm_message(tone(0.02)))
+            return [(await frames.__anext__()).samples for _ in range(3)]
+
+        first, second, third = self.run_with_client(scenario, ring_size=2)
+        self.assertTrue(np.shares_memory(first, third))
+        self.assertFalse(np.shares_memory(first, second))
+
+    def test_blocking_subscriber_pushes_back_and_lossy_one_drops(self):
+        async def scenario(bridge, call, ws):
+            blocking = call.frames(maxsize=2, policy='block')
+            lossy = call.frames(maxsize=2, policy='drop_oldest')
+            await self.hello(ws)
+            for _ in range(6):
+                await ws.send_bytes(pcm_message(tone(0.02)))
+            await asyncio.sleep(0.1)
+            # The blocked reader holds the bridge at the third frame
+            stalled = call.frames_received
+            blocking_seqs = [(await blocking.__anext__()).seq for _ in range(6)]
+            await asyncio.sleep(0.05)
+            lossy_seqs = [(await lossy.__anext__()).seq for _ in range(2)]
+            return stalled, lossy_seqs, blocking_seqs, lossy.dropped
+
+        stalled, lossy_seqs, blocking_seqs, dropped = self.run_with_client(scenario)
+        self.assertEqual(stalled, 3)
+        self.assertEqual(lossy_seqs, [4, 5])
+        self.assertEqual(dropped, 4)
+        self.assertEqual(blocking_seqs, list(range(6)))
+
+    def test_transcript_events(self):
+        async def scenario(bridge, call, ws):
+            transcripts = call.transcripts()
+            await self.hello(ws)
+            await ws.send_json({'type': 'transcript', 'text': 'how much ', 'final': False, 'timestamp': time.time() * 1000})
+            await ws.send_json({'type': 'transcript', 'text': 'how much is it', 'final': True})
+            await ws.send_json({'type': 'transcript', 'text': 'hm', 'final': False})
+            return [await transcripts.__anext__() for _ in range(3)]
+
+        partial, final, next_partial = self.run_with_client(scenario)
+        self.assertEqual((partial.text, partial.is_final, partial.utterance), ('how much', False, 1))
+        self.assertEqual((final.text, final.is_final, final.utterance), ('how much is it', True, 1))
+        self.assertEqual(next_partial.utterance, 2)
+        self.assertLess(partial.latency_ms, 1000)
+
+    def test_unsupported_encoding_is_rejected(self):
+        async def scenario(bridge, call, ws):
+            return await self.hello(ws, encoding='mp3')
+
+        self.assertEqual(self.run_with_client(scenario)['type'], 'error')
+
+    def test_bad_messages_are_reported_without_dropping_the_call(self):
+        async def scenario(bridge, call, ws):
+            frames = call.frames()
+            await self.hello(ws)
+            await ws.send_str('{not json')
+            invalid_json = await ws.receive_json()
+            await ws.send_bytes(pcm_message(tone(0.02))[:-1])  # Odd number of PCM bytes
+            odd_frame = await ws.receive_json()
+            await ws.send_bytes(pcm_message(tone(0.02)))
+            return invalid_json, odd_frame, (await frames.__anext__()).seq
+
+        invalid_json, odd_frame, seq = self.run_with_client(scenario)
+        self.assertEqual((invalid_json['type'], odd_frame['type']), ('error', 'error'))
+        self.assertEqual(seq, 0)
+
+    def test_barge_in_from_bridged_audio(self):
+        audio = np.concatenate([silence(0.5), tone(0.5)])
+
+        async def scenario(bridge, call, ws):
+            frames = call.frames()
+            await self.hello(ws)
+            for start in range(0, len(audio), 320):
+                await ws.send_bytes(pcm_message(audio[start:start + 320]))
+            await ws.close()
+            await asyncio.sleep(0.05)
+            await call.close()
+            return [event async for event in BargeInDetector().run(frames.samples())]
+
+        events = self.run_with_client(scenario)
+        self.assertEqual(events[0].kind, 'start')
+        self.assertAlmostEqual(events[0].audio_time, 0.5, delta=0.03)
@@ -0,0 +1,172 @@
+import asyncio
+import io
+import json
+import subprocess
+import sys
+import time
+import unittest
+
+import aiohttp
+
+from src.utils import logger
+from src.utils.logger import (NOOP_SPAN, MetricsServer, Registry, call_context, configure, get_logger,
+                              recent_spans, span, traced)
+from src.utils.metrics import LatencyStats
+from src.voice.streaming_response import ResponseStreamer
+
+
+class TelemetryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        configure(enabled=True, level='debug', stream=self.stream)
+        self.addCleanup(configure, enabled=True, level='info', stream=sys.stderr)
+
+    def records(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+
+class TestLogs(TelemetryTestCase):
+    def test_json_lines_carry_call_ids(self):
+        log = get_logger('src.test')
+        with call_context('call-1', 'session-9'):
+            log.info('Playing %s', 'base1.mp4', extra={'clip': 'base1.mp4'})
+        log.warning('No call')
+        first, second = self.records()
+        self.assertEqual(first['message'], 'Playing base1.mp4')
+        self.assertEqual((first['call_id'], first['session_id'], first['clip']), ('call-1', 'session-9', 'base1.mp4'))
+        self.assertEqual(first['level'], 'info')
+        self.assertNotIn('call_id', second)
+
+    def test_call_id_follows_tasks_and_render_threads(self):
+        rendered = []
+
+        def render(sentence):
+            get_logger('src.test').info('Rendering')
+            rendered.append(logger.call_id_var.get())
+            return f'/clips/{len(rendered)}.mp4'
+
+        async def tokens():
+            for word in 'First sentence is here. Second sentence is here. '.split(' '):
+                yield word + ' '
+
+        async def scenario():
+            streamer = ResponseStreamer(enqueue=lambda path: None, render=render)
+            with call_context('call-2'):
+                await asyncio.ensure_future(streamer.stream(tokens()))
+            streamer.shutdown()
+
+        asyncio.run(scenario())
+        self.assertEqual(rendered, ['call-2', 'call-2'])
+        self.assertEqual({record['call_id'] for record in self.records()}, {'call-2'})
+
+    def test_import_installs_no_handler(self):
+        code = "import logging, src.utils.logger; print(len(logging.getLogger('src').handlers))"
+        self.assertEqual(subprocess.check_output([sys.executable, '-c', code], text=True).strip(), '0')
+
+    def test_scripts_log_through_the_json_handler(self):
+        self.assertEqual(get_logger('__main__').name, 'src.__main__')
+        get_logger('__main__').info('From a script')
+        self.assertEqual(self.records()[0]['message'], 'From a script')
+
+
+class TestSpans(TelemetryTestCase):
+    def test_span_feeds_histogram_and_recent_spans(self):
+        before = logger.STAGE_DURATION.count(stage='render')
+        with call_context('call-3'):
+            with span('render', chars=12) as timing:
+                time.sleep(0.01)
+                timing.annotate(cached=False)
+        self.assertEqual(logger.STAGE_DURATION.count(stage='render'), before + 1)
+        self.assertGreaterEqual(timing.duration_ms, 10)
+        entry = recent_spans('call-3')[-1]
+        self.assertEqual((entry['stage'], entry['chars'], entry['cached']), ('render', 12, False))
+        self.assertEqual(self.records()[-1]['stage'], 'render')
+
+    def test_errors_are_counted_and_raised(self):
+        before = logger.STAGE_ERRORS.get(stage='download')
+        with self.assertRaises(OSError):
+            with span('download'):
+                raise OSError('disk full')
+        self.assertEqual(logger.STAGE_ERRORS.get(stage='download'), before + 1)
+        self.assertEqual(recent_spans()[-1]['error'], 'OSError')
+
+    def test_traced_sync_and_async(self):
+        @traced('classification')
+        def classify(text):
+            return len(text)
+
+        @traced('llm')
+        async def answer():
+            return 'ok'
+
+        before = logger.STAGE_DURATION.count(stage='llm')
+        self.assertEqual(classify('abc'), 3)
+        self.assertEqual(asyncio.run(answer()), 'ok')
+        self.assertEqual(logger.STAGE_DURATION.count(stage='llm'), before + 1)
+
+    def test_switched_off(self):
+        configure(enabled=False, level='debug')
+        before = logger.STAGE_DURATION.count(stage='obs_switch')
+        with span('obs_switch') as timing:
+            timing.annotate(clip='base1.mp4')
+        self.assertIs(timing, NOOP_SPAN)
+        self.assertEqual(logger.STAGE_DURATION.count(stage='obs_switch'), before)
+        log = get_logger('src.test')
+        log.info('Dropped')
+        log.error('Kept')
+        self.assertEqual([record['message'] for record in self.records()], ['Kept'])
+
+
+class TestMetrics(unittest.TestCase):
+    def test_prometheus_text(self):
+        registry = Registry()
+        counter = registry.counter('calls_total', 'Calls', ('outcome',))
+        histogram = registry.histogram('turn_ms', 'Turns', buckets=(10, 100))
+        counter.inc(outcome='won')
+        counter.inc(2, outcome='lost "late"')
+        for value in (5, 50, 500):
+            histogram.observe(value)
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP calls_total Calls',
+            '# TYPE calls_total counter',
+            'calls_total{outcome="lost \\"late\\""} 2',
+            'calls_total{outcome="won"} 1',
+            '# HELP turn_ms Turns',
+            '# TYPE turn_ms histogram',
+            'turn_ms_bucket{le="10"} 1',
+            'turn_ms_bucket{le="100"} 2',
+            'turn_ms_bucket{le="+Inf"} 3',
+            'turn_ms_sum 555',
+            'turn_ms_count 3',
+        ])
+        with self.assertRaises(ValueError):
+            registry.histogram('calls_total', 'Not a histogram')
+
+    def test_latency_stats_feed_the_registry(self):
+        registry = Registry()
+        for value in (5, 50):
+            # Every player, agent or client of a kind adds to the one histogram
+            LatencyStats('clip_gap_ms', registry=registry).observe(value)
+        self.assertIn('edchambers_clip_gap_ms_count 2', registry.render().splitlines())
+        local = LatencyStats('clip_gap_ms', registry=None)
+        local.observe(1)
+        self.assertIsNone(local.histogram)
+
+    def test_endpoint(self):
+        async def scenario():
+            with span('memory_search'):
+                pass
+            LatencyStats('hitl_notify_ms').observe(12)
+            async with MetricsServer(port=0) as server:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(server.url) as response:
+                        return response.headers['Content-Type'], await response.text()
+
+        content_type, text = asyncio.run(scenario())
+        self.assertTrue(content_type.startswith('text/plain; version=0.0.4'))
+        self.assertIn('edchambers_stage_duration_ms_count{stage="memory_search"}', text)
+        self.assertIn('edchambers_hitl_notify_ms_count', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
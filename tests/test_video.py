@@ -0,0 +1,574 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+os.environ.setdefault('OBS_SERVER_PWD', 'test')
+os.environ.setdefault('VIDEO_FOLDER', 'src/assets/base')
+
+from src.video import OBS_media_player_loop
+from src.video.OBS_media_player_loop import MediaEventTracker, MediaPlayer
+from src.video.asset_manifest import AssetManifest, ClipInfo, MP4ParseError, classify_clip, probe_mp4
+from src.video.video_queue import TRANSITION_KEYS
+from src.video.obs_async import AsyncMediaPlayer, AsyncOBSClient, OBSRequestError
+from src.video.video_queue import VideoQueue
+from tests.fakes.obs import FakeOBS
+from tests.fakes.obs_server import FakeOBSWebSocketServer
+
+
+def make_player(fake, **kwargs):
+    with mock.patch.object(OBS_media_player_loop.obs, 'ReqClient', fake.req_client), \
+            mock.patch.object(OBS_media_player_loop.obs, 'EventClient', fake.event_client):
+        return MediaPlayer(**kwargs)
+
+
+def scripted_manifest(folder, durations, sentences):
+    """Manifest of clips that need not exist on disk, with the transitions VideoQueue needs"""
+    clips = {}
+    for name in [f'{key}.mp4' for key in TRANSITION_KEYS] + list(durations):
+        kind, key = classify_clip(name)
+        clips[name] = ClipInfo(name, 0, 0, '', kind, key, duration=durations.get(name, 0.05),
+                               sentences=sentences.get(name, []))
+    return AssetManifest(folder, clips)
+
+
+def cursor_seeks(fake):
+    return [args[1] for name, args in fake.calls if name == 'set_media_input_cursor' and args[1] > 0]
+
+
+class TestMediaEventTracker(unittest.TestCase):
+    def test_wait_returns_after_event(self):
+        tracker = MediaEventTracker()
+        threading.Timer(0.01, tracker.record, args=('VideoPlayer', 'ended')).start()
+        self.assertIsNotNone(tracker.wait('VideoPlayer', 'ended', after=0, timeout=1))
+
+    def test_wait_times_out(self):
+        tracker = MediaEventTracker()
+        self.assertIsNone(tracker.wait('VideoPlayer', 'ended', after=0, timeout=0.01))
+
+    def test_wait_can_be_aborted(self):
+        tracker = MediaEventTracker()
+        stop = threading.Event()
+        threading.Timer(0.01, lambda: (stop.set(), tracker.wake())).start()
+        self.assertIsNone(tracker.wait('VideoPlayer', 'ended', after=0, timeout=1, abort=stop.is_set))
+
+
+class TestEventDrivenPlayback(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        for name in ('base1.mp4', 'base2.mp4', 'base3.mp4'):
+            open(os.path.join(self.folder.name, name), 'a').close()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_plays_each_clip_once_without_polling(self):
+        fake = FakeOBS(clip_duration=0.05)
+        player = make_player(fake)
+        self.assertTrue(player.event_driven)
+
+        start = time.perf_counter()
+        player.play_videos(self.folder.name, loop=False)
+        elapsed = time.perf_counter() - start
+
+        played = [args[1] for name, args in fake.calls if name == 'set_input_settings']
+        self.assertEqual(sorted(os.path.basename(p) for p in played), ['base1.mp4', 'base2.mp4', 'base3.mp4'])
+        self.assertNotIn('get_media_input_status', [name for name, _ in fake.calls])
+        # Three 50 ms clips: no fixed one-second sleeps between them
+        self.assertLess(elapsed, 1.0)
+
+    def test_gap_reported_per_clip(self):
+        fake = FakeOBS(clip_duration=0.03)
+        player = make_player(fake)
+        player.play_videos(self.folder.name, loop=False)
+
+        self.assertEqual(len(player.clip_gaps), 3)
+        for gap in player.clip_gaps:
+            self.assertLess(gap['gap_ms'], 100)
+
+    def test_falls_back_to_polling_without_events(self):
+        fake = FakeOBS()
+        player = make_player(fake, event_driven=False)
+        self.assertFalse(player.event_driven)
+
+
+class TestGaplessPlayback(unittest.TestCase):
+    clips = ['base1.mp4', 'transition1.mp4', 'base2.mp4', 'transition2.mp4']
+
+    def test_alternates_sources_in_order(self):
+        fake = FakeOBS(clip_duration=0.05)
+        player = make_player(fake)
+        player.play_gapless(self.clips)
+
+        loads = [args for name, args in fake.calls if name == 'set_input_settings']
+        self.assertEqual([f for _, f in loads], self.clips)
+        self.assertEqual([s for s, _ in loads], ['VideoPlayerA', 'VideoPlayerB'] * 2)
+
+    def test_next_clip_is_loaded_before_current_ends(self):
+        fake = FakeOBS(clip_duration=0.05)
+        player = make_player(fake)
+        ends = []
+
+        def on_media_input_playback_ended(data):
+            ends.append(len(fake.calls))
+
+        fake.callbacks.append(on_media_input_playback_ended)
+        player.play_gapless(self.clips)
+
+        load_positions = [i for i, (name, _) in enumerate(fake.calls) if name == 'set_input_settings']
+        # Clip n+1 is loaded before clip n's end-of-media event
+        for clip_index, end_position in enumerate(ends[:len(self.clips) - 1]):
+            self.assertLess(load_positions[clip_index + 1], end_position)
+
+    def test_switch_gap_is_small(self):
+        fake = FakeOBS(clip_duration=0.05, load_delay=0.02)
+        player = make_player(fake)
+        player.play_gapless(self.clips)
+
+        self.assertEqual(len(player.clip_gaps), len(self.clips) - 1)
+        for gap in player.clip_gaps:
+            self.assertLess(gap['gap_ms'], 20)
+
+
+class TestAssetManifest(unittest.TestCase):
+    assets = os.path.join('src', 'assets', 'base')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.manifest_path = os.path.join(self.tmp.name, 'manifest.json')
+
+    def copy_assets(self, *names):
+        folder = os.path.join(self.tmp.name, 'assets')
+        os.makedirs(folder, exist_ok=True)
+        for name in names:
+            shutil.copy(os.path.join(self.assets, name), folder)
+        return folder
+
+    def test_probe_reads_the_movie_boxes(self):
+        info = probe_mp4(os.path.join(self.assets, 'transition1.mp4'))
+        self.assertEqual(info['duration'], 1.556)
+        self.assertEqual((info['width'], info['height'], info['fps']), (1920, 1080, 24.0))
+        self.assertEqual((info['video_codec'], info['audio_codec']), ('avc1', 'mp4a'))
+        self.assertEqual(info['keyframes'][0], 0.0)
+        # base3 is long enough to carry keyframes after the first
+        self.assertGreater(len(probe_mp4(os.path.join(self.assets, 'base3.mp4'))['keyframes']), 1)
+
+    def test_clip_names(self):
+        self.assertEqual(classify_clip('base3.mp4'), ('base', 'base3'))
+        self.assertEqual(classify_clip('transntion4_1.mp4'), ('transition', 'transition4_1'))
+        self.assertEqual(classify_clip('answer.mp4'), ('other', None))
+
+    def test_builds_every_clip_and_resolves_transitions(self):
+        manifest = AssetManifest.load(self.assets, manifest_path=self.manifest_path)
+        self.assertEqual(len(manifest), 11)
+        self.assertEqual(os.path.basename(manifest.path('transition4_1')), 'transntion4_1.mp4')
+        self.assertEqual([os.path.basename(p) for p in manifest.base_clips],
+                         ['base1.mp4', 'base2.mp4', 'base3.mp4', 'base4.mp4', 'base5.mp4'])
+        clip = os.path.join(self.assets, 'transition2.mp4')
+        self.assertIn(clip, manifest)
+        self.assertEqual(manifest.ends_at(clip, 100.0), 103.414)
+        self.assertTrue(os.path.exists(self.manifest_path))
+
+    def test_cached_entries_are_reused_until_the_content_changes(self):
+        folder = self.copy_assets('transition1.mp4', 'transition2.mp4')
+        AssetManifest.load(folder, manifest_path=self.manifest_path)
+        with mock.patch('src.video.asset_manifest.probe_mp4', wraps=probe_mp4) as probe:
+            AssetManifest.load(folder, manifest_path=self.manifest_path)
+            # A touched file is hashed, not re-probed
+            os.utime(os.path.join(folder, 'transition1.mp4'), ns=(0, 0))
+            AssetManifest.load(folder, manifest_path=self.manifest_path)
+            self.assertEqual(probe.call_count, 0)
+            shutil.copy(os.path.join(self.assets, 'transition3.mp4'), os.path.join(folder, 'transition1.mp4'))
+            manifest = AssetManifest.load(folder, manifest_path=self.manifest_path)
+            self.assertEqual(probe.call_count, 1)
+        self.assertEqual(manifest.duration(os.path.join(folder, 'transition1.mp4')), 6.014)
+
+    def test_maps_tagged_script_paragraphs(self):
+        folder = self.copy_assets('transition1.mp4', 'transntion4_1.mp4')
+        script = os.path.join(self.tmp.name, 'script.txt')
+        with open(script, 'w') as f:
+            f.write("[transition1]\nGood question. Let me explain.\n\n[transition4_1]\nLet me come back\nto that.\n")
+        manifest = AssetManifest.load(folder, script, manifest_path=self.manifest_path)
+        first = manifest.get(os.path.join(folder, 'transition1.mp4'))
+        second = manifest.get(os.path.join(folder, 'transntion4_1.mp4'))
+        self.assertEqual((first.script_index, first.script_line), (0, 1))
+        self.assertEqual(first.script_text, 'Good question. Let me explain.')
+        self.assertEqual((second.script_index, second.script_line, second.script_text), (1, 4, 'Let me come back to that.'))
+        # Sentences are spread over the clip by their length
+        self.assertEqual(first.sentences, [0.0, 0.778])
+        self.assertEqual(second.sentences, [0.0])
+
+    def test_shipped_base_clips_map_to_the_script(self):
+        manifest = AssetManifest.load(self.assets, manifest_path=self.manifest_path)
+        base = [manifest.get(manifest.path(f'base{n}')) for n in range(1, 6)]
+        self.assertEqual([(clip.script_index, clip.script_line) for clip in base],
+                         [(0, 1), (1, 3), (2, 5), (4, 11), (5, 13)])
+        self.assertTrue(all(clip.sentences for clip in base))
+        # Transition dialogue is tagged, so it is spoken by its transition clip rather than a base clip
+        self.assertEqual(manifest.get(manifest.path('transition2')).script_line, 8)
+        self.assertEqual(manifest.get(manifest.path('objection1')).script_line, 21)
+
+    def test_shipped_clips_resume_mid_clip(self):
+        manifest = AssetManifest.load(self.assets, manifest_path=self.manifest_path)
+        clip = manifest.path('base1')
+        sentences = manifest.get(clip).sentences
+        self.assertEqual(manifest.resume_point(clip, sentences[1] + 0.5), sentences[1])
+        self.assertGreater(sentences[1], 0.0)
+
+    def test_base_clips_fall_back_to_script_order(self):
+        folder = self.copy_assets('base1.mp4', 'base2.mp4', 'transition1.mp4')
+        script = os.path.join(self.tmp.name, 'script.txt')
+        with open(script, 'w') as f:
+            f.write("[intro]\nHello there.\n\n[transition1]\nGood question.\n\n[pitch]\nHere is how it works.\n")
+        manifest = AssetManifest.load(folder, script, manifest_path=self.manifest_path)
+        self.assertEqual(manifest.get(os.path.join(folder, 'base1.mp4')).script_text, 'Hello there.')
+        self.assertEqual(manifest.get(os.path.join(folder, 'base2.mp4')).script_text, 'Here is how it works.')
+        self.assertEqual(manifest.get(os.path.join(folder, 'transition1.mp4')).script_index, 1)
+
+    def test_resume_point_is_the_start_of_the_cut_off_sentence(self):
+        manifest = scripted_manifest('assets', {'base3.mp4': 4.5, 'base4.mp4': 2.0}, {'base3.mp4': [0.0, 1.5, 3.0]})
+        clip = manifest.path('base3')
+        self.assertEqual(manifest.resume_point(clip, 2.9), 1.5)
+        self.assertEqual(manifest.resume_point(clip, 3.0), 3.0)
+        self.assertEqual(manifest.resume_point(manifest.path('base4'), 1.0), 0.0)
+        self.assertEqual(manifest.resume_point('elsewhere.mp4', 1.0), 0.0)
+
+        queue = VideoQueue.from_manifest(manifest)
+        queue.get_next_video()
+        self.assertEqual(queue.resume_later(clip, 3.7), 3.0)
+        self.assertEqual(queue.start_offset(clip), 3.0)
+        self.assertEqual(queue.get_next_video(), clip)
+        self.assertEqual(queue.take_start_offset(clip), 3.0)
+        self.assertEqual(queue.take_start_offset(clip), 0.0)
+
+    def test_unreadable_clip_is_listed_with_its_error(self):
+        folder = self.copy_assets()
+        open(os.path.join(folder, 'base1.mp4'), 'wb').close()
+        with self.assertRaises(MP4ParseError):
+            probe_mp4(os.path.join(folder, 'base1.mp4'))
+        clip = AssetManifest.load(folder, manifest_path=self.manifest_path).clips['base1.mp4']
+        self.assertIsNone(clip.duration)
+        self.assertIn('moov', clip.error)
+
+    def test_queue_validates_and_plans_from_the_manifest(self):
+        manifest = AssetManifest.load(self.assets, manifest_path=self.manifest_path)
+        queue = VideoQueue.from_manifest(manifest)
+        queue.handle_interrupt(4)
+        self.assertEqual(os.path.basename(queue.get_next_video()), 'transition4.mp4')
+        self.assertEqual(os.path.basename(queue.get_next_video()), 'transntion4_1.mp4')
+        with mock.patch('os.path.exists', side_effect=AssertionError('stat')):
+            queue.add_response(manifest.path('base2'))
+        self.assertAlmostEqual(queue.expected_duration(), 2.667 + 8.22 * 2 + 30.042 + 6.549 + 5.713)
+        queue.add_video(__file__)
+        self.assertIsNone(queue.expected_duration())
+
+
+class TestAsyncOBSClient(unittest.IsolatedAsyncioTestCase):
+    async def test_authenticates_with_password(self):
+        async with FakeOBSWebSocketServer(password='secret') as server:
+            async with AsyncOBSClient(port=server.port, password='secret') as client:
+                status = await client.call("GetMediaInputStatus", {"inputName": "VideoPlayer"})
+        self.assertIn("mediaState", status)
+
+    async def test_requests_are_pipelined(self):
+        async with FakeOBSWebSocketServer(request_delay=0.1) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                start = time.perf_counter()
+                await asyncio.gather(*[
+                    client.call("GetMediaInputStatus", {"inputName": f"Input{i}"}) for i in range(5)
+                ])
+                elapsed = time.perf_counter() - start
+        # Five 100 ms requests overlap instead of taking half a second
+        self.assertLess(elapsed, 0.3)
+
+    async def test_batch_returns_results_in_order(self):
+        async with FakeOBSWebSocketServer() as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                results = await client.call_batch([
+                    ("GetSceneItemId", {"sceneName": "Scene", "sourceName": "A"}),
+                    ("GetSceneItemId", {"sceneName": "Scene", "sourceName": "B"})
+                ])
+        self.assertEqual([r["sceneItemId"] for r in results], [1, 2])
+        self.assertEqual(len(server.batches), 1)
+
+    async def test_failed_request_raises(self):
+        async with FakeOBSWebSocketServer() as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                with self.assertRaises(OBSRequestError):
+                    await client.call("NotARealRequest")
+
+    async def test_bad_message_or_listener_does_not_stop_the_reader(self):
+        async with FakeOBSWebSocketServer() as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                client.on("MediaInputPlaybackStarted", lambda data: 1 / 0)
+                await server.send_raw("not json")
+                started = client.expect_event("MediaInputPlaybackStarted")
+                ended = client.expect_event("MediaInputPlaybackEnded")
+                await client.call("TriggerMediaInputAction", {"inputName": "VideoPlayer",
+                                                              "mediaAction": "OBS_WEBSOCKET_MEDIA_INPUT_ACTION_PLAY"})
+                await asyncio.wait_for(asyncio.gather(started, ended), 2)
+                self.assertTrue(client.connected)
+                status = await client.call("GetMediaInputStatus", {"inputName": "VideoPlayer"})
+        self.assertIn("mediaState", status)
+
+    async def test_lost_connection_fails_fast(self):
+        async with FakeOBSWebSocketServer() as server:
+            async with AsyncOBSClient(port=server.port, timeout=5) as client:
+                waiting = client.expect_event("MediaInputPlaybackEnded")
+                await server.drop_clients()
+                with self.assertRaises(ConnectionError):
+                    await asyncio.wait_for(waiting, 1)
+                self.assertFalse(client.connected)
+                with self.assertRaises(ConnectionError):
+                    await asyncio.wait_for(client.call("GetMediaInputStatus", {"inputName": "VideoPlayer"}), 1)
+
+
+class TestAsyncMediaPlayer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.base_path = os.path.join('src', 'assets')
+        self.transitions = ['transition1.mp4', 'transition2.mp4', 'transition3.mp4',
+                            'transition4.mp4', 'transition4_1.mp4']
+        for t in self.transitions:
+            open(os.path.join(self.base_path, t), 'a').close()
+        self.base_videos = [os.path.join('src', 'assets', 'base', f'base{i}.mp4') for i in (1, 2)]
+
+    def tearDown(self):
+        for t in self.transitions:
+            os.remove(os.path.join(self.base_path, t))
+
+    async def test_next_clip_is_preloaded_on_the_hidden_source(self):
+        fake = FakeOBS(clip_duration=0.1)
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                await player.play_queue(VideoQueue(self.base_videos))
+        load = ["SetInputSettings", "SetSceneItemTransform", "TriggerMediaInputAction"]
+        pause = ["TriggerMediaInputAction", "SetMediaInputCursor"]
+        switch = ["TriggerMediaInputAction", "SetSceneItemEnabled", "SetSceneItemEnabled", "TriggerMediaInputAction"]
+        # base2 is loaded while base1 plays, so moving on to it is a single switch batch
+        self.assertEqual(server.batches[1:], [load, pause, switch, load, pause, switch])
+        self.assertTrue(fake.inputs['VideoPlayer-B'].settings['local_file'].endswith('base1.mp4'))
+        self.assertTrue(fake.inputs['VideoPlayer'].settings['local_file'].endswith('base2.mp4'))
+
+    async def test_playback_does_not_block_the_event_loop(self):
+        async with FakeOBSWebSocketServer(FakeOBS(clip_duration=0.2)) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                playback = asyncio.create_task(player.play_queue(VideoQueue(self.base_videos)))
+                ticks = 0
+                while not playback.done():
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+        self.assertGreater(ticks, 20)
+
+    async def test_interrupt_preempts_current_clip(self):
+        fake = FakeOBS(clip_duration=0.03, durations={'base1.mp4': 0.4})
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                playback = asyncio.create_task(player.play_queue(VideoQueue(self.base_videos)))
+                await asyncio.sleep(0.1)
+                player.handle_interrupt(1)
+                await asyncio.wait_for(playback, 5)
+
+        self.assertEqual([os.path.basename(p) for p in player.history],
+                         ['base1.mp4', 'transition1.mp4', 'base1.mp4', 'base2.mp4'])
+        self.assertLess(player.interrupt_latency.last, 100)
+
+    async def test_interrupting_a_transition_does_not_replay_it(self):
+        fake = FakeOBS(clip_duration=0.03, durations={'transition3.mp4': 0.4})
+        queue = VideoQueue(self.base_videos)
+        queue.handle_interrupt(3)
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                playback = asyncio.create_task(player.play_queue(queue))
+                while not player.history:
+                    await asyncio.sleep(0.01)
+                player.handle_interrupt(1)
+                await asyncio.wait_for(playback, 5)
+
+        self.assertEqual([os.path.basename(p) for p in player.history],
+                         ['transition3.mp4', 'transition1.mp4', 'base1.mp4', 'base2.mp4'])
+
+    async def test_expected_end_comes_from_the_manifest(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        manifest = AssetManifest.load(os.path.join('src', 'assets', 'base'),
+                                      manifest_path=os.path.join(tmp.name, 'manifest.json'))
+        remaining = []
+        async with FakeOBSWebSocketServer(FakeOBS(clip_duration=0.03)) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                player.clip_listeners.append(lambda clip: remaining.append(player.expected_end - time.perf_counter()))
+                queue = VideoQueue(manifest.base_clips[:2], manifest=manifest)
+                await player.play_queue(queue)
+        self.assertAlmostEqual(remaining[0], 2.667, delta=0.05)
+        self.assertAlmostEqual(remaining[1], 8.22, delta=0.05)
+        self.assertIsNone(player.expected_end)
+
+    async def test_interrupt_while_loading_requeues_the_loading_clip(self):
+        async with FakeOBSWebSocketServer(FakeOBS(clip_duration=0.03)) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                settle_preload = player._settle_preload
+
+                async def interrupt_while_base2_loads():
+                    await settle_preload()
+                    if str(player.current).endswith('base2.mp4') and player.interrupt_latency.count == 0 and not player._preempt.is_set():
+                        player.handle_interrupt(1)
+
+                player._settle_preload = interrupt_while_base2_loads
+                await player.play_queue(VideoQueue(self.base_videos))
+        self.assertEqual([os.path.basename(p) for p in player.history], ['base1.mp4', 'transition1.mp4', 'base2.mp4'])
+
+    async def test_failed_load_leaves_no_event_waiters(self):
+        async with FakeOBSWebSocketServer(FakeOBS(clip_duration=0.03)) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                await player.setup_media_source()
+                with mock.patch.object(client, 'call_batch', side_effect=OBSRequestError("SetInputSettings", 600, "")):
+                    with self.assertRaises(OBSRequestError):
+                        await player.play_clip(self.base_videos[0])
+                self.assertTrue(all(future.done() for _, _, future in client._waiters))
+
+    async def test_interrupted_clip_resumes_at_the_cut_off_sentence(self):
+        manifest = scripted_manifest('assets', {'base1.mp4': 0.6, 'base2.mp4': 0.05},
+                                     {'base1.mp4': [0.0, 0.2, 0.4]})
+        fake = FakeOBS(clip_duration=0.03, durations={'base1.mp4': 0.6})
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                remaining = []
+                player.clip_listeners.append(lambda clip: remaining.append(player.expected_end - time.perf_counter()))
+                playback = asyncio.create_task(player.play_queue(VideoQueue.from_manifest(manifest)))
+                while not player.history:
+                    await asyncio.sleep(0.01)
+                await asyncio.sleep(0.3)
+                player.handle_interrupt(1)
+                await asyncio.wait_for(playback, 5)
+
+        self.assertEqual([os.path.basename(p) for p in player.history],
+                         ['base1.mp4', 'transition1.mp4', 'base1.mp4', 'base2.mp4'])
+        self.assertEqual(cursor_seeks(fake), [200])
+        # Only the part after the resume point is left to play
+        self.assertAlmostEqual(remaining[2], 0.4, delta=0.05)
+
+    async def test_cut_answer_is_not_replayed(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        answer, followup = (os.path.join(folder.name, name) for name in ('answer.mp4', 'followup.mp4'))
+        for path in (answer, followup):
+            open(path, 'a').close()
+        fake = FakeOBS(clip_duration=0.03, durations={'base1.mp4': 0.6, 'answer.mp4': 0.5})
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                playback = asyncio.create_task(player.play_queue(VideoQueue(self.base_videos)))
+                while not player.history:
+                    await asyncio.sleep(0.01)
+                player.play_now(answer)
+                while len(player.history) < 2:
+                    await asyncio.sleep(0.01)
+                player.play_now(followup)
+                await asyncio.wait_for(playback, 5)
+
+        self.assertEqual([os.path.basename(p) for p in player.history],
+                         ['base1.mp4', 'answer.mp4', 'followup.mp4', 'base1.mp4', 'base2.mp4'])
+        self.assertEqual(player._cut_cursors, {})
+
+    async def test_folder_playback_resumes_at_the_cut_off_sentence(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        for name in ('base1.mp4', 'base2.mp4'):
+            open(os.path.join(folder.name, name), 'a').close()
+        fake = FakeOBS(clip_duration=0.03, durations={'base1.mp4': 0.6})
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client, manifest=scripted_manifest(
+                    folder.name, {'base1.mp4': 0.6}, {'base1.mp4': [0.0, 0.2, 0.4]}))
+                playback = asyncio.create_task(player.play_folder(folder.name, loop=False))
+                while not player.history:
+                    await asyncio.sleep(0.01)
+                await asyncio.sleep(0.3)
+                player.play_now('answer.mp4')
+                await asyncio.wait_for(playback, 5)
+
+        self.assertEqual([os.path.basename(p) for p in player.history],
+                         ['base1.mp4', 'answer.mp4', 'base1.mp4', 'base2.mp4'])
+        self.assertEqual(cursor_seeks(fake), [200])
+
+    async def test_folder_clip_keeps_its_cut_when_its_answer_is_cut_too(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        for name in ('base1.mp4', 'base2.mp4'):
+            open(os.path.join(folder.name, name), 'a').close()
+        fake = FakeOBS(clip_duration=0.03, durations={'base1.mp4': 0.6, 'answer.mp4': 0.5})
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client, manifest=scripted_manifest(
+                    folder.name, {'base1.mp4': 0.6}, {'base1.mp4': [0.0, 0.2, 0.4]}))
+                playback = asyncio.create_task(player.play_folder(folder.name, loop=False))
+                while not player.history:
+                    await asyncio.sleep(0.01)
+                await asyncio.sleep(0.3)
+                player.play_now('answer.mp4')
+                while len(player.history) < 2:
+                    await asyncio.sleep(0.01)
+                player.play_now('followup.mp4')
+                await asyncio.wait_for(playback, 5)
+
+        self.assertEqual([os.path.basename(p) for p in player.history],
+                         ['base1.mp4', 'answer.mp4', 'followup.mp4', 'base1.mp4', 'base2.mp4'])
+        # base1 still resumes at its own cut-off sentence, not at the answer's cursor, however often it is preloaded
+        self.assertEqual(set(cursor_seeks(fake)), {200})
+
+    async def test_cursor_stands_still_while_paused(self):
+        fake = FakeOBS(clip_duration=1.0)
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                playback = asyncio.create_task(player.play_queue(VideoQueue(self.base_videos[:1])))
+                while not player.history:
+                    await asyncio.sleep(0.01)
+                await asyncio.sleep(0.1)
+                await player.pause()
+                paused = player.cursor()
+                await asyncio.sleep(0.2)
+                self.assertEqual(player.cursor(), paused)
+                await player.resume()
+                await asyncio.sleep(0.1)
+                front = fake.inputs[player.sources[player._front]]
+                self.assertAlmostEqual(player.cursor(), fake.position(front), delta=0.05)
+                self.assertLess(player.cursor(), paused + 0.2)
+                await player.stop()
+                await asyncio.wait_for(playback, 5)
+
+    async def test_play_now_inserts_clip_into_folder_playback(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        for name in ('base1.mp4', 'base2.mp4'):
+            open(os.path.join(folder.name, name), 'a').close()
+        fake = FakeOBS(clip_duration=0.03, durations={'base1.mp4': 0.4})
+        async with FakeOBSWebSocketServer(fake) as server:
+            async with AsyncOBSClient(port=server.port) as client:
+                player = AsyncMediaPlayer(client)
+                started = []
+                player.clip_listeners.append(lambda clip: started.append(os.path.basename(clip)))
+                playback = asyncio.create_task(player.play_folder(folder.name, loop=False))
+                while not started:
+                    await asyncio.sleep(0.01)
+                await asyncio.sleep(0.1)
+                player.play_now('answer.mp4')
+                await asyncio.wait_for(playback, 5)
+
+        self.assertEqual(started, ['base1.mp4', 'answer.mp4', 'base1.mp4', 'base2.mp4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
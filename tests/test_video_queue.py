@@ -99,6 +99,20 @@ class TestVideoQueue(unittest.TestCase):
             queue.get_next_video(),
             self.base_videos[1]
         )
+
+    def test_responses_follow_transitions_in_order(self):
+        queue = VideoQueue(self.base_videos)
+        queue.handle_interrupt(2)
+        queue.add_response(self.base_videos[1])
+        queue.add_response(self.base_videos[0])
+        self.assertEqual(list(queue.queue), [
+            queue.transitions['transition2'],
+            queue.transitions['transition1'],
+            self.base_videos[1],
+            self.base_videos[0],
+            self.base_videos[0],
+            self.base_videos[1]
+        ])
         
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,409 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from src.voice import text_to_video
+from src.voice.batch_render import BatchRenderer, check_base_segments, load_script_segments
+from src.voice.download import StreamingDownload
+from src.voice.streaming_response import ResponseStreamer, SentenceChunker
+from src.voice.talk_cache import TalkCache, get_talk_cache, talk_key
+from src.voice.talks_client import TalkRenderError, TalksClient
+from tests.fakes.talks_server import FakeTalksServer
+
+
+def write_clip(directory, name, size):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    return path
+
+
+class TestTalkCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_ignores_whitespace_and_quote_style(self):
+        a = talk_key("I’m Ed Chambers,  an account\nexecutive.", "microsoft", "Sara", "src.jpg")
+        b = talk_key("I'm Ed Chambers, an account executive.", "microsoft", "Sara", "src.jpg")
+        self.assertEqual(a, b)
+
+    def test_key_depends_on_voice_and_avatar(self):
+        base = talk_key("Hello", "microsoft", "Sara", "src.jpg")
+        self.assertNotEqual(base, talk_key("Hello", "microsoft", "Jenny", "src.jpg"))
+        self.assertNotEqual(base, talk_key("Hello", "microsoft", "Sara", "other.jpg"))
+        self.assertNotEqual(base, talk_key("Hello", "microsoft", "Sara", "src.jpg", {"fluent": True}))
+
+    def test_hit_and_miss_stats(self):
+        cache = TalkCache(self.cache_dir)
+        self.assertIsNone(cache.get('ab' * 32))
+        path = cache.put('ab' * 32, write_clip(self.tmp.name, 'clip.mp4', 10))
+        self.assertEqual(cache.get('ab' * 32), path)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+    def test_evicts_least_recently_used_over_size_budget(self):
+        cache = TalkCache(self.cache_dir, max_bytes=25)
+        cache.put('aa' * 32, write_clip(self.tmp.name, 'a.mp4', 10))
+        cache.put('bb' * 32, write_clip(self.tmp.name, 'b.mp4', 10))
+        cache.get('aa' * 32)  # 'bb' is now the least recently used
+        cache.put('cc' * 32, write_clip(self.tmp.name, 'c.mp4', 10))
+
+        self.assertIn('aa' * 32, cache)
+        self.assertNotIn('bb' * 32, cache)
+        self.assertFalse(os.path.exists(cache.path_for('bb' * 32)))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_index_survives_restart(self):
+        cache = TalkCache(self.cache_dir)
+        path = cache.put('aa' * 32, write_clip(self.tmp.name, 'a.mp4', 10))
+        self.assertEqual(TalkCache(self.cache_dir).get('aa' * 32), path)
+
+
+class TestRenderTalk(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = TalkCache(os.path.join(self.tmp.name, 'cache'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fake_download(self, url, output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        write_clip(os.path.dirname(output_path), os.path.basename(output_path), 10)
+        return True
+
+    def test_repeated_script_renders_once(self):
+        with mock.patch.object(text_to_video, 'create_talk', return_value={'id': 'tlk_1'}) as create, \
+                mock.patch.object(text_to_video, 'wait_for_talk_completion', return_value='https://result'), \
+                mock.patch.object(text_to_video, 'download_video', side_effect=self.fake_download):
+            first = text_to_video.render_talk("Our product is SOC II and GDPR compliant.", cache=self.cache)
+            second = text_to_video.render_talk("Our product is SOC II and GDPR  compliant.", cache=self.cache)
+
+        self.assertEqual(first, second)
+        self.assertTrue(os.path.exists(first))
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_render_time_counts_from_submission(self):
+        created_at = []
+        create = lambda *args: created_at.append(time.monotonic()) or {'id': 'tlk_1'}
+        with mock.patch.object(text_to_video, 'create_talk', side_effect=create), \
+                mock.patch.object(text_to_video, 'wait_for_talk_completion', return_value='https://result') as wait, \
+                mock.patch.object(text_to_video, 'download_video', side_effect=self.fake_download):
+            text_to_video.render_talk("Our product is SOC II and GDPR compliant.", cache=self.cache)
+        self.assertLessEqual(wait.call_args.kwargs['submitted_at'], created_at[0])
+
+    def test_concurrent_renders_share_the_default_cache(self):
+        claims = []
+
+        def slow_create(*args):
+            # The second render asks for the same text while this one is still with the API
+            while len(claims) < 2:
+                time.sleep(0.01)
+            return {'id': 'tlk_1'}
+
+        results = []
+        render = lambda: results.append(text_to_video.render_talk("Our product is SOC II and GDPR compliant."))
+        with mock.patch.dict(os.environ, {'TALK_CACHE_DIR': os.path.join(self.tmp.name, 'shared')}), \
+                mock.patch('src.voice.talk_cache._default_cache', None):
+            cache = get_talk_cache()
+            claim = cache.claim
+            with mock.patch.object(cache, 'claim', side_effect=lambda key: claims.append(key) or claim(key)), \
+                    mock.patch.object(text_to_video, 'create_talk', side_effect=slow_create) as create, \
+                    mock.patch.object(text_to_video, 'wait_for_talk_completion', return_value='https://result'), \
+                    mock.patch.object(text_to_video, 'download_video', side_effect=self.fake_download):
+                threads = [threading.Thread(target=render) for _ in range(2)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join(5)
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(results[0], results[1])
+        self.assertTrue(os.path.exists(results[0]))
+        self.assertEqual(len(cache), 1)
+
+    def test_failed_render_is_not_shared_with_later_callers(self):
+        with mock.patch.object(text_to_video, 'create_talk', side_effect=[None, {'id': 'tlk_2'}]) as create, \
+                mock.patch.object(text_to_video, 'wait_for_talk_completion', return_value='https://result'), \
+                mock.patch.object(text_to_video, 'download_video', side_effect=self.fake_download):
+            self.assertIsNone(text_to_video.render_talk("Is this secure?", cache=self.cache))
+            self.assertTrue(os.path.exists(text_to_video.render_talk("Is this secure?", cache=self.cache)))
+        self.assertEqual(create.call_count, 2)
+
+
+class TestScriptSegments(unittest.TestCase):
+    def test_base_script_splits_into_paragraphs(self):
+        segments = load_script_segments(os.path.join('src', 'assets', 'base_script.txt'))
+        self.assertEqual(len(segments), 9)
+        # Untagged paragraphs are the base clips in order; transition dialogue and the closing answer are tagged
+        self.assertEqual([s.name for s in segments],
+                         ['base1', 'base2', 'base3', 'transition2', 'base4', 'base5', 'transition3', 'transition4',
+                          'objection1'])
+        self.assertTrue(segments[3].text.startswith("Right,, we’ll get to this"))
+        self.assertTrue(segments[0].text.startswith('Hey, thanks for taking the time'))
+        # Multi-line paragraphs are joined into one segment
+        self.assertIn('what % of your time', segments[2].text)
+
+    def test_tagged_paragraphs_are_named(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write("[base1]\nHello there.\n\n[objection1]\nWe get that a lot.\n")
+        try:
+            segments = load_script_segments(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual([(s.name, s.text) for s in segments],
+                         [('base1', 'Hello there.'), ('objection1', 'We get that a lot.')])
+
+    def test_base_paragraphs_are_checked_against_the_base_clips(self):
+        segments = load_script_segments(os.path.join('src', 'assets', 'base_script.txt'))
+        self.assertTrue(check_base_segments(segments, os.path.join('src', 'assets', 'base')))
+        with self.assertLogs('src.voice.batch_render', 'WARNING'):
+            self.assertFalse(check_base_segments(segments[:2], os.path.join('src', 'assets', 'base')))
+
+
+class TestBatchRenderer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.segments = load_script_segments(os.path.join('src', 'assets', 'base_script.txt'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def renderer(self, server, **kwargs):
+        client = TalksClient(api_key='test', api_url=server.url, poll_interval=0.01, min_poll_interval=0.01)
+        return BatchRenderer(client, **kwargs)
+
+    async def test_renders_all_segments_with_bounded_concurrency(self):
+        async with FakeTalksServer(render_delay=0.1) as server:
+            start = time.perf_counter()
+            results = await self.renderer(server, concurrency=3).render_all(self.segments, self.tmp.name)
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(sorted(results), sorted(s.name for s in self.segments))
+        for path in results.values():
+            self.assertTrue(os.path.getsize(path) > 0)
+        self.assertLessEqual(server.max_in_flight, 3)
+        # Nine 100 ms renders, three at a time, instead of serially
+        self.assertLess(elapsed, 0.9)
+
+    async def test_renders_feed_the_client_stats_and_polling(self):
+        async with FakeTalksServer(render_delay=0.05) as server:
+            renderer = self.renderer(server)
+            await renderer.render_all(self.segments[:3], self.tmp.name)
+        self.assertEqual(len(renderer.client.render_times), 3)
+        self.assertEqual(renderer.client.stats()['create_talk']['count'], 3)
+
+    async def test_backs_off_on_rate_limit(self):
+        async with FakeTalksServer(rate_limit_first=3) as server:
+            results = await self.renderer(server).render_all(self.segments[:2], self.tmp.name)
+        self.assertEqual(server.rate_limited, 3)
+        self.assertEqual(len(results), 2)
+
+    async def test_completions_stream_with_failures_reported(self):
+        failing = self.segments[1].text
+        async with FakeTalksServer(fail_scripts=[failing]) as server:
+            outcomes = [o async for o in self.renderer(server).render_stream(self.segments[:3], self.tmp.name)]
+        errors = {segment.name: error for segment, _, error in outcomes if error is not None}
+        self.assertEqual(list(errors), [self.segments[1].name])
+        self.assertEqual(len(outcomes), 3)
+
+    async def test_cached_segments_are_not_rendered_again(self):
+        cache = TalkCache(os.path.join(self.tmp.name, 'cache'))
+        async with FakeTalksServer() as server:
+            await self.renderer(server, cache=cache).render_all(self.segments[:2], self.tmp.name)
+            await self.renderer(server, cache=cache).render_all(self.segments[:2], self.tmp.name)
+        self.assertEqual(len(server.created), 2)
+
+
+class TestTalksClient(unittest.TestCase):
+    payload = {"script": {"type": "text", "input": "Hello there."}}
+
+    def test_requests_reuse_one_connection(self):
+        with FakeTalksServer(render_delay=0).running_in_thread() as server:
+            client = TalksClient(api_key='test', api_url=server.url)
+            for _ in range(5):
+                talk = client.create_talk(self.payload)
+                client.get_talk_status(talk['id'])
+        self.assertEqual(len(server.peers), 1)
+        self.assertEqual(client.latency['create_talk'].count, 5)
+
+    def test_retries_rate_limited_requests(self):
+        with FakeTalksServer(rate_limit_first=2, retry_after=0.01).running_in_thread() as server:
+            client = TalksClient(api_key='test', api_url=server.url)
+            talk = client.create_talk(self.payload)
+        self.assertTrue(talk['id'])
+        self.assertEqual(server.rate_limited, 2)
+
+    def test_polling_is_seeded_from_observed_render_times(self):
+        client = TalksClient(api_key='test', api_url='http://unused')
+        client.render_times.extend([4.0, 5.0, 6.0])
+        intervals = client.poll_intervals()
+        self.assertAlmostEqual(next(intervals), 4.0)
+        self.assertAlmostEqual(next(intervals), 0.5)
+        self.assertAlmostEqual(next(intervals), 0.75)
+
+    def test_wait_for_completion_polls_few_times(self):
+        with FakeTalksServer(render_delay=0.3).running_in_thread() as server:
+            client = TalksClient(api_key='test', api_url=server.url)
+            client.render_times.extend([0.3, 0.3, 0.3])
+            talk = client.create_talk(self.payload)
+            result_url = client.wait_for_completion(talk['id'], deadline=5)
+        self.assertIn(talk['id'], result_url)
+        self.assertLessEqual(server.status_polls, 4)
+
+    def test_wait_for_completion_respects_deadline(self):
+        with FakeTalksServer(render_delay=10).running_in_thread() as server:
+            client = TalksClient(api_key='test', api_url=server.url)
+            talk = client.create_talk(self.payload)
+            start = time.monotonic()
+            with self.assertRaises(TalkRenderError):
+                client.wait_for_completion(talk['id'], deadline=0.5)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+
+class TestStreamingDownload(unittest.TestCase):
+    payload = {"script": {"type": "text", "input": "We get that a lot."}}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.tmp.name, 'videos', 'objection.mp4')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def result_url(self, server):
+        client = TalksClient(api_key='test', api_url=server.url)
+        client.render_times.append(0.0)  # Renders are instant here; poll right away
+        talk = client.create_talk(self.payload)
+        return client.wait_for_completion(talk['id'], deadline=5), server.result_bytes(talk['id'])
+
+    def test_downloads_to_final_path_atomically(self):
+        with FakeTalksServer(render_delay=0, result_size=300_000).running_in_thread() as server:
+            url, expected = self.result_url(server)
+            self.assertTrue(StreamingDownload(url, self.output_path).run())
+        with open(self.output_path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        self.assertFalse(os.path.exists(self.output_path + '.part'))
+
+    def test_resumes_with_range_after_dropped_connection(self):
+        fake = FakeTalksServer(render_delay=0, result_size=500_000, drop_after=200_000)
+        with fake.running_in_thread() as server:
+            url, expected = self.result_url(server)
+            download = StreamingDownload(url, self.output_path)
+            self.assertTrue(download.run())
+        with open(self.output_path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(download.resumes, 1)
+        self.assertTrue(server.range_requests[-1].startswith('bytes='))
+
+    def test_ready_before_download_completes(self):
+        fake = FakeTalksServer(render_delay=0, result_size=1_000_000, chunk_delay=0.02)
+        with fake.running_in_thread() as server:
+            url, _ = self.result_url(server)
+            download = StreamingDownload(url, self.output_path, ready_bytes=128 * 1024).start()
+            playable = download.wait_ready(timeout=5)
+            self.assertEqual(playable, self.output_path + '.part')
+            self.assertLess(download.bytes_written, 1_000_000)
+            self.assertTrue(download.wait(timeout=5))
+        self.assertEqual(os.path.getsize(self.output_path), 1_000_000)
+
+    def test_early_render_plays_from_a_path_that_is_never_renamed(self):
+        cache = TalkCache(os.path.join(self.tmp.name, 'cache'))
+        script = "We get that a lot."
+        key = talk_key(script, text_to_video.DEFAULT_PROVIDER, text_to_video.DEFAULT_VOICE_ID,
+                       text_to_video.DEFAULT_SOURCE_URL, text_to_video.DEFAULT_CONFIG)
+        fake = FakeTalksServer(render_delay=0, result_size=1_000_000, chunk_delay=0.02)
+        with fake.running_in_thread() as server:
+            url, expected = self.result_url(server)
+            with mock.patch.object(text_to_video, 'create_talk', return_value={'id': 'tlk_1'}), \
+                    mock.patch.object(text_to_video, 'wait_for_talk_completion', return_value=url):
+                playable = text_to_video.render_talk(script, cache=cache, ready_bytes=128 * 1024)
+            self.assertLess(os.path.getsize(playable), 1_000_000)
+            deadline = time.monotonic() + 5
+            while key not in cache and time.monotonic() < deadline:
+                time.sleep(0.01)
+        # The handed-out path holds the whole clip, and the cache shares it
+        with open(playable, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        self.assertTrue(os.path.samefile(cache.get(key), playable))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestSentenceChunker(unittest.TestCase):
+    def chunk(self, text, **kwargs):
+        chunker = SentenceChunker(**kwargs)
+        sentences = [s for token in text.split(' ') for s in chunker.feed(token + ' ')]
+        last = chunker.flush()
+        return sentences + ([last] if last else [])
+
+    def test_splits_on_sentence_ends(self):
+        self.assertEqual(
+            self.chunk("That is a fair concern. We are SOC II compliant! Does that help with security?"),
+            ["That is a fair concern.", "We are SOC II compliant!", "Does that help with security?"])
+
+    def test_merges_short_sentences_and_skips_abbreviations(self):
+        self.assertEqual(
+            self.chunk("Sure. Dr. Smith at Acme uses it daily. Great."),
+            ["Sure. Dr. Smith at Acme uses it daily.", "Great."])
+
+    def test_splits_long_runs_at_a_comma(self):
+        sentences = self.chunk("word " * 30 + ", " + "word " * 30, max_chars=200)
+        self.assertGreater(len(sentences), 1)
+        self.assertTrue(all(len(s) <= 200 for s in sentences))
+
+
+class TestResponseStreamer(unittest.IsolatedAsyncioTestCase):
+    async def test_first_sentence_renders_while_generating(self):
+        events = []
+        delays = {'First sentence is here.': 0.05, 'Second sentence is longer.': 0.01, 'Third and final one': 0.0}
+
+        def render(text):
+            time.sleep(delays[text])
+            return f'/clips/{text}.mp4'
+
+        async def tokens():
+            for token in ['First sentence ', 'is here. ', 'Second sentence ', 'is longer. ', 'Third and final one']:
+                await asyncio.sleep(0.03)
+                events.append(('token', token))
+                yield token
+
+        streamer = ResponseStreamer(enqueue=lambda path: events.append(('clip', path)), render=render)
+        response = await streamer.stream(tokens())
+
+        clips = [value for kind, value in events if kind == 'clip']
+        self.assertEqual(clips, [f'/clips/{s}.mp4' for s in delays])
+        self.assertEqual(response.clips, clips)
+        self.assertEqual(response.text, 'First sentence is here. Second sentence is longer. Third and final one')
+        # The first clip was queued before generation finished
+        self.assertLess(events.index(('clip', clips[0])), events.index(('token', 'Third and final one')))
+        self.assertEqual(streamer.first_clip_latency.count, 1)
+        streamer.shutdown()
+
+    async def test_failed_render_is_skipped(self):
+        queued = []
+
+        def render(text):
+            if 'broken' in text:
+                raise TalkRenderError('rejected')
+            return '/clips/fine.mp4'
+
+        async def tokens():
+            yield 'This sentence is broken. This one renders fine.'
+
+        streamer = ResponseStreamer(enqueue=queued.append, render=render)
+        response = await streamer.stream(tokens())
+        self.assertEqual(response.failed, ['This sentence is broken.'])
+        self.assertEqual(queued, ['/clips/fine.mp4'])
+        streamer.shutdown()